@@ -0,0 +1,375 @@
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+import os
+import threading
+import time
+
+from ..processors.dag import DAGExecutor, Node
+
+
+SCOPES = ("session", "mouse", "dataset")
+
+
+@dataclass
+class Stage:
+    """
+    One step of the export.
+
+    The function is called once per (mouse, session) as func(mouse_dir,
+    session) for 'session' stages, once per mouse as func(mouse_dir) for
+    'mouse' stages and once as func(mouse_dirs) for 'dataset' stages. It runs
+    in a worker process, so it must be picklable (a module level function or
+    an instance of one of the stage classes below).
+
+    Args:
+        name (str): Unique name of the stage.
+        func (Callable[..., Any]): Function run by the stage.
+        scope (str): Granularity of the stage {'session', 'mouse', 'dataset'}.
+        depends_on (Sequence[str]): Stages that must have finished first. A stage waits only for the work of its own mouse and session on a finer grained stage, and for all of it on a coarser one.
+    """
+
+    name: str
+    func: Callable[..., Any]
+    scope: str = "session"
+    depends_on: Sequence[str] = field(default_factory=tuple)
+
+
+@dataclass
+class StageTiming:
+    """
+    Timing of one stage.
+
+    Args:
+        n_jobs (int): Number of jobs of the stage that finished.
+        busy_seconds (float): Run time summed over the jobs.
+        start (float): Start time of the first job.
+        end (float): End time of the last job.
+    """
+
+    n_jobs: int = 0
+    busy_seconds: float = 0.0
+    start: float = float("inf")
+    end: float = float("-inf")
+
+    @property
+    def wall_seconds(self) -> float:
+        return max(self.end - self.start, 0.0)
+
+
+def _timed(func: Callable[..., Any], *args) -> Tuple[Any, float, float]:
+    start = time.time()
+    result = func(*args)
+    return result, start, time.time()
+
+
+class ExportDriver:
+    def __init__(
+        self,
+        stages: Sequence[Stage],
+        sessions: Sequence[str] = ("ret_behavior_dir", "ext_behavior_dir"),
+        max_workers: Optional[int] = None,
+        raise_on_error: bool = True,
+    ):
+        """
+        Runs the export stages of every mouse over a process pool.
+
+        Each stage is expanded into one job per (mouse, session), per mouse
+        or per dataset according to its scope, and the jobs are run as a DAG
+        (see DAGExecutor): a job starts as soon as the jobs it depends on
+        have finished, so e.g. one mouse can be registered while another is
+        still being tidied. Per stage timings are kept in self.timings.
+
+        Args:
+            stages (Sequence[Stage]): Stages to run.
+            sessions (Sequence[str], optional): Session attributes of each mouse dir to export. Defaults to ("ret_behavior_dir", "ext_behavior_dir").
+            max_workers (Optional[int], optional): Number of worker processes. Defaults to None (number of cpus).
+            raise_on_error (bool, optional): Re-raise the first failure once all other jobs finished. Jobs depending on a failed job are never run. Defaults to True.
+        """
+        for stage in stages:
+            if stage.scope not in SCOPES:
+                raise ValueError(f"Unknown scope of {stage.name}: {stage.scope}")
+        self.stages = list(stages)
+        self.sessions = tuple(sessions)
+        self.max_workers = max_workers
+        self.raise_on_error = raise_on_error
+        self.timings: Dict[str, StageTiming] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def node_name(stage: str, mouse_name: Optional[str] = None, session: Optional[str] = None) -> str:
+        return "/".join(part for part in (stage, mouse_name, session) if part is not None)
+
+    def _dependencies(self, stage: Stage, mouse_dirs: Sequence[Any], mouse_name=None, session=None) -> List[str]:
+        by_name = {s.name: s for s in self.stages}
+        depends_on: List[str] = []
+        for dep in stage.depends_on:
+            dep_stage = by_name[dep]
+            mice = [mouse_name] if mouse_name is not None else [m.mouse_name for m in mouse_dirs]
+            if dep_stage.scope == "dataset":
+                depends_on.append(dep)
+            elif dep_stage.scope == "mouse":
+                depends_on.extend(self.node_name(dep, m) for m in mice)
+            else:
+                sessions = [session] if session is not None else self.sessions
+                depends_on.extend(self.node_name(dep, m, s) for m in mice for s in sessions)
+        return depends_on
+
+    def _submit(self, pool: Executor, stage: Stage, *args) -> Any:
+        result, start, end = pool.submit(_timed, stage.func, *args).result()
+        with self._lock:
+            timing = self.timings.setdefault(stage.name, StageTiming())
+            timing.n_jobs += 1
+            timing.busy_seconds += end - start
+            timing.start = min(timing.start, start)
+            timing.end = max(timing.end, end)
+        return result
+
+    def nodes(self, mouse_dirs: Sequence[Any], pool: Executor) -> List[Node]:
+        """Jobs of every stage, in the order they should be favoured."""
+        names = [s.name for s in self.stages]
+        if len(set(names)) != len(names):
+            raise ValueError("Stage names must be unique.")
+        unknown = {d for s in self.stages for d in s.depends_on} - set(names)
+        if unknown:
+            raise ValueError(f"Unknown stages in depends_on: {sorted(unknown)}")
+
+        nodes: List[Node] = []
+        for stage in self.stages:
+            if stage.scope == "dataset":
+                nodes.append(
+                    Node(
+                        name=stage.name,
+                        func=partial(self._submit, pool, stage, list(mouse_dirs)),
+                        depends_on=self._dependencies(stage, mouse_dirs),
+                    )
+                )
+                continue
+            for mouse_dir in mouse_dirs:
+                if stage.scope == "mouse":
+                    nodes.append(
+                        Node(
+                            name=self.node_name(stage.name, mouse_dir.mouse_name),
+                            func=partial(self._submit, pool, stage, mouse_dir),
+                            depends_on=self._dependencies(stage, mouse_dirs, mouse_dir.mouse_name),
+                        )
+                    )
+                    continue
+                for session in self.sessions:
+                    nodes.append(
+                        Node(
+                            name=self.node_name(stage.name, mouse_dir.mouse_name, session),
+                            func=partial(self._submit, pool, stage, mouse_dir, session),
+                            depends_on=self._dependencies(
+                                stage, mouse_dirs, mouse_dir.mouse_name, session
+                            ),
+                        )
+                    )
+        return nodes
+
+    def __call__(self, root_parser: Any) -> Dict[str, Any]:
+        """Run every stage.
+
+        Args:
+            root_parser (Any): A parsed output root, e.g. OutputRootParserAstrocyte.
+
+        Returns:
+            Dict[str, Any]: Output of each job, keyed by stage/mouse/session. Failed jobs map to their exception.
+        """
+        mouse_dirs = list(root_parser.mouse_dirs)
+        self.timings = {}
+        n_workers = self.max_workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            return DAGExecutor(limits={"cpu": n_workers}, raise_on_error=self.raise_on_error)(
+                self.nodes(mouse_dirs, pool)
+            )
+
+    def report(self) -> str:
+        """Per stage timings of the last run."""
+        lines = [f"{'stage':<24}{'jobs':>6}{'wall (s)':>12}{'busy (s)':>12}"]
+        for stage in self.stages:
+            timing = self.timings.get(stage.name)
+            if timing is None:
+                continue
+            lines.append(
+                f"{stage.name:<24}{timing.n_jobs:>6}{timing.wall_seconds:>12.1f}{timing.busy_seconds:>12.1f}"
+            )
+        return "\n".join(lines)
+
+
+class ExportCellsetStage:
+    def __init__(self, exporter: Any, source_mouse_dirs: Sequence[Any]):
+        """
+        Session stage exporting the CNMFe cellset of the matching raw session (script 02).
+
+        Args:
+            exporter (Any): An IsxExporter.
+            source_mouse_dirs (Sequence[Any]): Parsed raw data mouse dirs, matched to output mouse dirs by name.
+        """
+        self.exporter = exporter
+        self.source_mouse_dirs = {m.mouse_name: m for m in source_mouse_dirs}
+
+    def __call__(self, mouse_dir: Any, session: str):
+        source = getattr(self.source_mouse_dirs[mouse_dir.mouse_name], session)
+        self.exporter(
+            cellset_file=source.cnmfe_cellset,
+            output_dir=getattr(mouse_dir, session).session_dir,
+        )
+
+
+class NativeExportStage:
+    def __init__(self, exporter: Any, source_mouse_dirs: Sequence[Any]):
+        """
+        Session stage writing the tidy traces, props and footprints of the matching raw session
+        straight from its cellset. Replaces ExportCellsetStage followed by TidyStage.
+
+        Args:
+            exporter (Any): A NativeCellsetExporter.
+            source_mouse_dirs (Sequence[Any]): Parsed raw data mouse dirs, matched to output mouse dirs by name.
+        """
+        self.exporter = exporter
+        self.source_mouse_dirs = {m.mouse_name: m for m in source_mouse_dirs}
+
+    def __call__(self, mouse_dir: Any, session: str):
+        source = getattr(self.source_mouse_dirs[mouse_dir.mouse_name], session)
+        session_dir = getattr(mouse_dir, session)
+        self.exporter(
+            cellset_file=source.cnmfe_cellset,
+            output_trace_file=session_dir.traces_tidy,
+            output_props_file=session_dir.props_tidy,
+            output_footprints_file=session_dir.footprints,
+        )
+
+
+class NativeEventStage:
+    def __init__(self, exporter: Any, source_mouse_dirs: Sequence[Any]):
+        """
+        Session stage detecting the events of the matching raw session's cellset.
+
+        Args:
+            exporter (Any): A NativeEventExporter.
+            source_mouse_dirs (Sequence[Any]): Parsed raw data mouse dirs, matched to output mouse dirs by name.
+        """
+        self.exporter = exporter
+        self.source_mouse_dirs = {m.mouse_name: m for m in source_mouse_dirs}
+
+    def __call__(self, mouse_dir: Any, session: str):
+        source = getattr(self.source_mouse_dirs[mouse_dir.mouse_name], session)
+        self.exporter(
+            cellset_file=source.cnmfe_cellset,
+            output_events_file=getattr(mouse_dir, session).events,
+        )
+
+
+class TidyStage:
+    def __init__(self, trace_tidier: Any, props_tidier: Any):
+        """
+        Session stage converting the exported traces and props to tidy tables (script 03).
+
+        Args:
+            trace_tidier (Any): A TraceTidier.
+            props_tidier (Any): A PropsTidier.
+        """
+        self.trace_tidier = trace_tidier
+        self.props_tidier = props_tidier
+
+    def __call__(self, mouse_dir: Any, session: str):
+        session_dir = getattr(mouse_dir, session)
+        self.trace_tidier(
+            source_trace_file=session_dir.traces, output_trace_file=session_dir.traces_tidy
+        )
+        self.props_tidier(
+            source_props_file=session_dir.props, output_props_file=session_dir.props_tidy
+        )
+
+
+class LongRegStage:
+    def __init__(self, long_reg: Any, source_mouse_dirs: Sequence[Any], sessions: Sequence[str]):
+        """
+        Mouse stage registering the cellsets of the sessions of a mouse (script 04).
+
+        Args:
+            long_reg (Any): An IsxLongtitudinalRegistration.
+            source_mouse_dirs (Sequence[Any]): Parsed raw data mouse dirs, matched to output mouse dirs by name.
+            sessions (Sequence[str]): Session attributes to register, in the order of the long-reg session index.
+        """
+        self.long_reg = long_reg
+        self.source_mouse_dirs = {m.mouse_name: m for m in source_mouse_dirs}
+        self.sessions = tuple(sessions)
+
+    def __call__(self, mouse_dir: Any):
+        source = self.source_mouse_dirs[mouse_dir.mouse_name]
+        self.long_reg(
+            cellset_files=[getattr(source, s).cnmfe_cellset for s in self.sessions],
+            output_csv_file=mouse_dir.long_reg_csv,
+            transform_csv_file=mouse_dir.long_reg_translation_csv,
+            crop_csv_file=mouse_dir.long_reg_crop_csv,
+        )
+
+
+class LongRegTidyStage:
+    def __init__(self, tidier: Any):
+        """
+        Mouse stage tidying the long-reg table of a mouse (script 05).
+
+        Args:
+            tidier (Any): A LongRegTidier.
+        """
+        self.tidier = tidier
+
+    def __call__(self, mouse_dir: Any):
+        self.tidier(
+            source_long_reg_file=mouse_dir.long_reg_csv,
+            output_long_reg_file=mouse_dir.long_reg_tidy_csv,
+        )
+
+
+class MouseIDStage:
+    def __init__(self, id_updater: Any, session_names: Mapping[str, str]):
+        """
+        Session stage writing the session -> mouse cell id lookup of a session (script 06).
+
+        Args:
+            id_updater (Any): An IDUpdaterMouse.
+            session_names (Mapping[str, str]): Name of each session attribute in the tidy long-reg table, e.g. {"ret_behavior_dir": "ret"}.
+        """
+        self.id_updater = id_updater
+        self.session_names = dict(session_names)
+
+    def __call__(self, mouse_dir: Any, session: str):
+        self.id_updater.write_lookup(
+            longreg_file=mouse_dir.long_reg_tidy_csv,
+            lookup_file=getattr(mouse_dir, session).cell_id_lookup,
+            session=self.session_names[session],
+        )
+
+
+class DatasetIDStage:
+    def __init__(self, id_updater: Any, master_cellset_file: Path, sessions: Sequence[str]):
+        """
+        Dataset stage creating the master cellset and adding dataset ids to every lookup (script 07).
+
+        Args:
+            id_updater (Any): An IDUpdaterDataset.
+            master_cellset_file (Path): Output master cellset table.
+            sessions (Sequence[str]): Session attributes whose lookups are updated.
+        """
+        self.id_updater = id_updater
+        self.master_cellset_file = master_cellset_file
+        self.sessions = tuple(sessions)
+
+    def __call__(self, mouse_dirs: Sequence[Any]):
+        master_cellset = self.id_updater.create_master_cellset(
+            props_files=[m.long_reg_tidy_csv for m in mouse_dirs],
+            master_cellset_file=self.master_cellset_file,
+        )
+        for mouse_dir in mouse_dirs:
+            for session in self.sessions:
+                self.id_updater.update_lookup(
+                    master_cellset=master_cellset,
+                    mouse_name=mouse_dir.mouse_name,
+                    lookup_file=getattr(mouse_dir, session).cell_id_lookup,
+                )
+        return master_cellset
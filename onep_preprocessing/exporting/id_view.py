@@ -0,0 +1,105 @@
+from pathlib import Path
+from typing import Optional, Sequence
+import pandas as pd
+from .remap import lookup_from_table, remap_column
+from .table_io import read_table
+
+
+LEVELS = ("session", "mouse", "dataset")
+
+
+class IDView:
+    def __init__(
+        self,
+        session_cell_id: str = "session_cell_id",
+        mouse_cell_id: str = "mouse_cell_id",
+        dataset_cell_id: str = "cell_id",
+        mouse_name_col: str = "mouse_name",
+    ):
+        """
+        Reads tidy session tables with their cell ids remapped on load.
+
+        Traces and props are written once with session cell ids. The mouse
+        and dataset ids live in a small per-session lookup table with one
+        row per cell (see IDUpdaterMouse.write_lookup and
+        IDUpdaterDataset.update_lookup), and are joined in when the table
+        is read: the lookup is turned into a dense integer array indexed by
+        session cell id and applied to the id column in one vectorized step.
+        Rows of cells missing from the lookup are dropped, as the merge based
+        updaters do.
+
+        Args:
+            session_cell_id (str, optional): Name of the session cell id column. Defaults to "session_cell_id".
+            mouse_cell_id (str, optional): Name of the mouse cell id column. Defaults to "mouse_cell_id".
+            dataset_cell_id (str, optional): Name of the dataset cell id column. Defaults to "cell_id".
+            mouse_name_col (str, optional): Name of the mouse name column. Defaults to "mouse_name".
+        """
+        self.session_cell_id = session_cell_id
+        self.mouse_cell_id = mouse_cell_id
+        self.dataset_cell_id = dataset_cell_id
+        self.mouse_name_col = mouse_name_col
+
+    def id_colname(self, level: str) -> str:
+        if level not in LEVELS:
+            raise ValueError(f"Unknown level: {level}. Expected one of {LEVELS}")
+        return {
+            "session": self.session_cell_id,
+            "mouse": self.mouse_cell_id,
+            "dataset": self.dataset_cell_id,
+        }[level]
+
+    def remap(self, df: pd.DataFrame, lookup: pd.DataFrame, level: str = "dataset") -> pd.DataFrame:
+        """Replace the session cell ids of df with the ids of level.
+
+        Args:
+            df (pd.DataFrame): Tidy table with a session cell id column.
+            lookup (pd.DataFrame): Lookup table of the session.
+            level (str, optional): Ids to return {'session', 'mouse', 'dataset'}. Defaults to "dataset".
+
+        Returns:
+            pd.DataFrame: df with the id column of level in place of the session cell id column.
+        """
+        target = self.id_colname(level)
+        if level == "session":
+            return df
+        if target not in lookup.columns:
+            raise ValueError(f"The lookup table has no {target} column")
+        df = remap_column(
+            df,
+            lookup_from_table(lookup, self.session_cell_id, target),
+            self.session_cell_id,
+            target,
+            dtype=lookup[target].dtype,
+        )
+        if level == "dataset" and self.mouse_name_col in lookup.columns and len(lookup):
+            # before the id column, where IDUpdaterDataset.update_table puts it
+            df.insert(len(df.columns) - 1, self.mouse_name_col, lookup[self.mouse_name_col].iloc[0])
+        return df
+
+    def read(
+        self,
+        table_file: Path,
+        lookup_file: Optional[Path] = None,
+        level: str = "dataset",
+        columns: Optional[Sequence[str]] = None,
+    ) -> pd.DataFrame:
+        """Read a tidy traces or props table with the ids of level.
+
+        Args:
+            table_file (Path): Tidy table written with session cell ids.
+            lookup_file (Optional[Path], optional): Lookup table of the session. Required unless level is 'session'. Defaults to None.
+            level (str, optional): Ids to return {'session', 'mouse', 'dataset'}. Defaults to "dataset".
+            columns (Optional[Sequence[str]], optional): Only read these columns besides the id. Defaults to None (all).
+
+        Returns:
+            pd.DataFrame: The table.
+        """
+        self.id_colname(level)
+        if columns is not None:
+            columns = [self.session_cell_id, *[c for c in columns if c != self.session_cell_id]]
+        df = read_table(table_file, columns=columns)
+        if level == "session":
+            return df
+        if lookup_file is None:
+            raise ValueError(f"A lookup file is needed to read {level} cell ids")
+        return self.remap(df, read_table(lookup_file), level)
@@ -0,0 +1,286 @@
+from pathlib import Path
+from typing import Optional, Sequence, Tuple, Union
+import numpy as np
+import pandas as pd
+from scipy import ndimage
+from ..native.dff import TraceDff
+from ..native.events import event_candidates, max_thresholds
+from ..native.isxd import CellSet, EventSet, read_cellset
+from .table_io import ID_DTYPE, TIME_DTYPE, VALUE_DTYPE, TableWriter, write_table
+from .tidy_output import TraceTidier
+
+
+class NativeCellsetExporter:
+    def __init__(
+        self,
+        round_time: Optional[int] = 3,
+        time_colname: str = "time",
+        id_colname: str = "session_cell_id",
+        value_colname: str = "value",
+        status_colname: str = "status",
+        size_colname: str = "size",
+        centroid_x_colname: str = "centroid_x",
+        centroid_y_colname: str = "centroid_y",
+        num_components_colname: str = "num_components",
+        dff: Optional[TraceDff] = None,
+        dff_colname: str = "dff",
+        on_exists: str = "overwrite",
+        chunk_frames: int = 5000,
+    ):
+        """
+        Exports a CNMFe cellset straight to tidy tables, without isx.
+
+        Replaces IsxExporter followed by TraceTidier and PropsTidier. The
+        cellset is memory mapped (see native.isxd.read_cellset) and the
+        traces are written in long format, about chunk_frames frames of
+        every cell at a time, ordered by cell, then time, with the same
+        columns and types as TraceTidier. The props table has the columns PropsTidier keeps,
+        computed from the footprints:
+
+            - centroid_x, centroid_y: footprint weighted centre of the cell in pixels
+            - size: number of pixels in the footprint
+            - num_components: number of connected regions of the footprint
+
+        These can differ slightly from the values isx reports. The
+        footprints are saved as one (cells, rows, cols) float32 .npy array
+        instead of a tiff per cell.
+
+        With dff, a dF/F column is added to the traces, normalised per cell
+        from the traces themselves, so no dF/F movie is needed.
+
+        Args:
+            round_time (Optional[int], optional): Decimals to round time to. Defaults to 3.
+            time_colname (str, optional): Name of the time column. Defaults to "time".
+            id_colname (str, optional): Name of the cell id column. Defaults to "session_cell_id".
+            value_colname (str, optional): Name of the value column. Defaults to "value".
+            status_colname (str, optional): Name of the status column. Defaults to "status".
+            size_colname (str, optional): Name of the size column. Defaults to "size".
+            centroid_x_colname (str, optional): Name of the centroid x column. Defaults to "centroid_x".
+            centroid_y_colname (str, optional): Name of the centroid y column. Defaults to "centroid_y".
+            num_components_colname (str, optional): Name of the number of components column. Defaults to "num_components".
+            dff (Optional[TraceDff], optional): Trace dF/F to add to the traces. Defaults to None (not added).
+            dff_colname (str, optional): Name of the dF/F column. Defaults to "dff".
+            on_exists (str, optional): What to do if an output file already exists {"overwrite", "raise", "skip"}. Defaults to "overwrite".
+            chunk_frames (int, optional): Block size of the traces written at a time, in frames of every cell. Defaults to 5000.
+        """
+        self.round_time = round_time
+        self.time_colname = time_colname
+        self.id_colname = id_colname
+        self.value_colname = value_colname
+        self.status_colname = status_colname
+        self.size_colname = size_colname
+        self.centroid_x_colname = centroid_x_colname
+        self.centroid_y_colname = centroid_y_colname
+        self.num_components_colname = num_components_colname
+        self.dff = dff
+        self.dff_colname = dff_colname
+        self.on_exists = on_exists
+        self.chunk_frames = chunk_frames
+
+    def if_exists(self, file: Path):
+        if file.exists():
+            if self.on_exists == "overwrite":
+                file.unlink()
+            elif self.on_exists == "raise":
+                raise FileExistsError(f"{file} already exists")
+            elif self.on_exists == "skip":
+                return True
+
+    @property
+    def trace_dtypes(self) -> dict:
+        return {
+            self.time_colname: TIME_DTYPE,
+            self.id_colname: ID_DTYPE,
+            self.value_colname: VALUE_DTYPE,
+            self.dff_colname: VALUE_DTYPE,
+        }
+
+    @property
+    def props_dtypes(self) -> dict:
+        return {
+            self.id_colname: ID_DTYPE,
+            self.size_colname: VALUE_DTYPE,
+            self.centroid_x_colname: VALUE_DTYPE,
+            self.centroid_y_colname: VALUE_DTYPE,
+            self.num_components_colname: ID_DTYPE,
+        }
+
+    def iter_tidy(self, cellset: CellSet):
+        """Yield the long format traces, ordered by cell, then time, a few cells at a time."""
+        cell_ids = TraceTidier.parse_cell_ids(cellset.names)
+        n_frames = cellset.traces.shape[1]
+        dff = self.dff(cellset.traces) if self.dff is not None else None
+        time = cellset.timestamps
+        if self.round_time is not None:
+            time = time.round(self.round_time)
+        # about as many values per block as chunk_frames frames of every cell
+        cells_per_block = max(self.chunk_frames * len(cell_ids) // max(n_frames, 1), 1)
+        for start in range(0, len(cell_ids), cells_per_block):
+            stop = start + cells_per_block
+            ids = cell_ids[start:stop]
+            block = pd.DataFrame(
+                {
+                    self.time_colname: np.tile(time, len(ids)),
+                    self.id_colname: np.repeat(ids, n_frames),
+                    self.value_colname: np.asarray(cellset.traces[start:stop]).ravel(),
+                }
+            )
+            if dff is not None:
+                block[self.dff_colname] = dff[start:stop].ravel()
+            yield block
+
+    def props(self, cellset: CellSet) -> pd.DataFrame:
+        footprints = np.asarray(cellset.footprints)
+        n_cells, rows, cols = footprints.shape
+        weights = np.clip(footprints, 0, None).reshape(n_cells, -1)
+        total = weights.sum(axis=1)
+        total[total == 0] = np.nan
+        y, x = np.divmod(np.arange(rows * cols), cols)
+        num_components = [ndimage.label(footprint > 0)[1] for footprint in footprints]
+        return pd.DataFrame(
+            {
+                self.id_colname: TraceTidier.parse_cell_ids(cellset.names),
+                self.status_colname: cellset.statuses,
+                self.centroid_x_colname: weights @ x / total,
+                self.centroid_y_colname: weights @ y / total,
+                self.num_components_colname: np.array(num_components, dtype=np.int64),
+                self.size_colname: (weights > 0).sum(axis=1),
+            }
+        )
+
+    def __call__(
+        self,
+        cellset_file: Path,
+        output_trace_file: Path,
+        output_props_file: Path,
+        output_footprints_file: Optional[Path] = None,
+    ):
+        """Export a cellset.
+
+        Args:
+            cellset_file (Path): The .isxd cellset.
+            output_trace_file (Path): Tidy traces table, e.g. traces_tidy.parquet.
+            output_props_file (Path): Tidy props table, e.g. props_tidy.parquet.
+            output_footprints_file (Optional[Path], optional): .npy file of the footprints. Defaults to None (not saved).
+        """
+        cellset = read_cellset(cellset_file)
+        if not self.if_exists(output_trace_file):
+            with TableWriter(output_trace_file, dtypes=self.trace_dtypes) as writer:
+                for block in self.iter_tidy(cellset):
+                    writer.write(block)
+        if not self.if_exists(output_props_file):
+            write_table(self.props(cellset), output_props_file, dtypes=self.props_dtypes)
+        if output_footprints_file is not None and not self.if_exists(output_footprints_file):
+            np.save(output_footprints_file, np.asarray(cellset.footprints))
+
+
+class NativeEventExporter:
+    def __init__(
+        self,
+        threshold: Union[float, Sequence[float]] = 5,
+        tau: float = 0.2,
+        event_time_ref: str = "beginning",
+        round_time: Optional[int] = 3,
+        time_colname: str = "time",
+        id_colname: str = "session_cell_id",
+        value_colname: str = "value",
+        threshold_colname: str = "threshold",
+        on_exists: str = "overwrite",
+    ):
+        """
+        Detects the events of a cellset and writes them as a sparse tidy table.
+
+        The events of all cells are detected on the memory mapped traces
+        with native.events.detect_events, which takes the parameters of
+        isx.event_detection. The table has one row per event (time, cell id,
+        amplitude), ordered by cell, then time, rather than the dense one
+        value per frame table of isx.export_event_set_to_csv.
+
+        Given several thresholds, the peaks and noise are found once and the
+        table holds the events of the lowest threshold with a threshold
+        column: the highest threshold each event passes. The events of
+        threshold t are the rows with threshold >= t, exactly those of a run
+        with threshold t alone.
+
+        Args:
+            threshold (Union[float, Sequence[float]], optional): Threshold in MADs above the median, or several to sweep. Defaults to 5.
+            tau (float, optional): Minimum time between events in seconds. Defaults to 0.2.
+            event_time_ref (str, optional): Time of an event {'beginning', 'maximum'}. Defaults to "beginning".
+            round_time (Optional[int], optional): Decimals to round time to. Defaults to 3.
+            time_colname (str, optional): Name of the time column. Defaults to "time".
+            id_colname (str, optional): Name of the cell id column. Defaults to "session_cell_id".
+            value_colname (str, optional): Name of the value column. Defaults to "value".
+            threshold_colname (str, optional): Name of the threshold column, only written when sweeping thresholds. Defaults to "threshold".
+            on_exists (str, optional): What to do if the output file already exists {"overwrite", "raise", "skip"}. Defaults to "overwrite".
+        """
+        self.threshold = threshold
+        self.tau = tau
+        self.event_time_ref = event_time_ref
+        self.round_time = round_time
+        self.time_colname = time_colname
+        self.id_colname = id_colname
+        self.value_colname = value_colname
+        self.threshold_colname = threshold_colname
+        self.on_exists = on_exists
+
+    def if_exists(self, file: Path):
+        if file.exists():
+            if self.on_exists == "overwrite":
+                file.unlink()
+            elif self.on_exists == "raise":
+                raise FileExistsError(f"{file} already exists")
+            elif self.on_exists == "skip":
+                return True
+
+    @property
+    def sweep(self) -> bool:
+        return not np.isscalar(self.threshold)
+
+    @property
+    def dtypes(self) -> dict:
+        return {
+            self.time_colname: TIME_DTYPE,
+            self.id_colname: ID_DTYPE,
+            self.value_colname: VALUE_DTYPE,
+            self.threshold_colname: VALUE_DTYPE,
+        }
+
+    def detect(self, cellset: CellSet) -> Tuple[EventSet, np.ndarray]:
+        """The events of the lowest threshold and the highest threshold each one passes."""
+        candidates, baseline, mad = event_candidates(
+            cellset.traces,
+            cellset.frame_period,
+            tau=self.tau,
+            event_time_ref=self.event_time_ref,
+            names=cellset.names,
+        )
+        thresholds = list(self.threshold) if self.sweep else [self.threshold]
+        return max_thresholds(candidates, baseline, mad, thresholds)
+
+    def tidy(self, events: EventSet, thresholds: Optional[np.ndarray] = None) -> pd.DataFrame:
+        time = events.times
+        if self.round_time is not None:
+            time = time.round(self.round_time)
+        df = pd.DataFrame(
+            {
+                self.time_colname: time,
+                self.id_colname: TraceTidier.parse_cell_ids(events.names)[events.cell],
+                self.value_colname: events.values,
+            }
+        )
+        if thresholds is not None:
+            df[self.threshold_colname] = thresholds
+        return df
+
+    def __call__(self, cellset_file: Path, output_events_file: Path):
+        """Detect and export the events of a cellset.
+
+        Args:
+            cellset_file (Path): The .isxd cellset.
+            output_events_file (Path): Tidy events table, e.g. events.parquet.
+        """
+        if self.if_exists(output_events_file):
+            return
+        events, thresholds = self.detect(read_cellset(cellset_file))
+        df = self.tidy(events, thresholds if self.sweep else None)
+        write_table(df, output_events_file, dtypes=self.dtypes)
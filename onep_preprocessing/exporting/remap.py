@@ -0,0 +1,98 @@
+from typing import Optional, Tuple
+import numpy as np
+import pandas as pd
+
+
+UNMAPPED = ("drop", "raise", "fill")
+MISSING = -1
+
+
+def build_lookup(keys: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Dense lookup array with lookup[key] = value.
+
+    Keys absent from the table hold MISSING (-1), so keys and values must be
+    non-negative integers, which cell ids are.
+
+    Args:
+        keys (np.ndarray): Ids to map from.
+        values (np.ndarray): Id each key maps to.
+
+    Returns:
+        np.ndarray: int64 array of length max(keys) + 1.
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    values = np.asarray(values, dtype=np.int64)
+    if keys.shape != values.shape:
+        raise ValueError("Expected one value per key")
+    if len(keys) and (keys.min() < 0 or values.min() < 0):
+        raise ValueError("Ids must be non-negative")
+    pairs = np.unique(np.stack([keys, values], axis=1), axis=0)
+    if len(np.unique(pairs[:, 0])) != len(pairs):
+        raise ValueError("Some ids map to more than one id")
+    lookup = np.full(int(keys.max()) + 1 if len(keys) else 0, MISSING, dtype=np.int64)
+    lookup[pairs[:, 0]] = pairs[:, 1]
+    return lookup
+
+
+def lookup_from_table(df: pd.DataFrame, key_col: str, value_col: str) -> np.ndarray:
+    """build_lookup from two columns of a table, e.g. a long-reg or master cellset table."""
+    return build_lookup(df[key_col].to_numpy(), df[value_col].to_numpy())
+
+
+def remap_ids(ids: np.ndarray, lookup: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Map ids through a dense lookup array with one fancy index.
+
+    Args:
+        ids (np.ndarray): Ids to map.
+        lookup (np.ndarray): Output of build_lookup.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The mapped ids (MISSING where unmapped) and a mask of the mapped ones.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    in_range = (ids >= 0) & (ids < len(lookup))
+    mapped = np.full(ids.shape, MISSING, dtype=np.int64)
+    mapped[in_range] = lookup[ids[in_range]]
+    return mapped, mapped != MISSING
+
+
+def remap_column(
+    df: pd.DataFrame,
+    lookup: np.ndarray,
+    column: str,
+    new_column: Optional[str] = None,
+    unmapped: str = "drop",
+    dtype: Optional[str] = None,
+) -> pd.DataFrame:
+    """Replace an id column of df with the ids it maps to.
+
+    The old column is removed and the mapped ids are appended as the last
+    column, as a merge followed by dropping the old column would leave them.
+    Row order is kept.
+
+    Args:
+        df (pd.DataFrame): Table with an id column.
+        lookup (np.ndarray): Output of build_lookup.
+        column (str): Column holding the ids to map.
+        new_column (Optional[str], optional): Name of the mapped column. Defaults to None (column).
+        unmapped (str, optional): What to do with rows whose id is not in the lookup {'drop', 'raise', 'fill'}. 'fill' keeps them with id MISSING. Defaults to "drop".
+        dtype (Optional[str], optional): dtype of the mapped column. Defaults to None (the dtype of column).
+
+    Returns:
+        pd.DataFrame: The remapped table.
+    """
+    if unmapped not in UNMAPPED:
+        raise ValueError(f"Unknown unmapped: {unmapped}. Expected one of {UNMAPPED}")
+    new_column = new_column or column
+    dtype = dtype or df[column].dtype
+    mapped, found = remap_ids(df[column].to_numpy(), lookup)
+    if not found.all():
+        if unmapped == "raise":
+            missing = np.unique(df[column].to_numpy()[~found])
+            raise KeyError(f"{len(missing)} {column} values are not in the lookup: {missing[:10]}")
+        if unmapped == "drop":
+            df = df.loc[found]
+            mapped = mapped[found]
+    df = df.drop(columns=[column]).reset_index(drop=True)
+    df[new_column] = mapped.astype(dtype, copy=False)
+    return df
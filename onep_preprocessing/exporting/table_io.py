@@ -0,0 +1,152 @@
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+import pandas as pd
+
+
+FORMATS = ("csv", "parquet", "feather")
+SUFFIXES = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather"}
+
+ID_DTYPE = "int32"
+VALUE_DTYPE = "float32"
+TIME_DTYPE = "float64"
+
+
+def check_format(fmt: str) -> str:
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}. Expected one of {FORMATS}")
+    return fmt
+
+
+def with_format(path: Path, fmt: str) -> Path:
+    """path with the suffix of fmt."""
+    return Path(path).with_suffix(SUFFIXES[check_format(fmt)])
+
+
+def format_of(path: Path) -> str:
+    """Format of a table file, from its suffix. Unknown suffixes are read as csv."""
+    suffix = Path(path).suffix.lower()
+    for fmt, fmt_suffix in SUFFIXES.items():
+        if suffix == fmt_suffix:
+            return fmt
+    if suffix in (".arrow", ".ipc"):
+        return "feather"
+    return "csv"
+
+
+def require_pyarrow() -> Any:
+    """Return the pyarrow module, raising a helpful error if it is not installed."""
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError(
+            "pyarrow is required for parquet and feather tables. "
+            "Install it with `pip install onep_preprocessing[tables]` or use the csv format."
+        ) from e
+    return pyarrow
+
+
+def cast_columns(df: pd.DataFrame, dtypes: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """Cast the columns of df present in dtypes, ignoring the others."""
+    if not dtypes:
+        return df
+    dtypes = {col: dtype for col, dtype in dtypes.items() if col in df.columns}
+    return df.astype(dtypes) if dtypes else df
+
+
+def read_table(path: Path, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Read a csv, parquet or feather table, chosen by the suffix of path.
+
+    Args:
+        path (Path): Table file.
+        columns (Optional[Sequence[str]], optional): Only read these columns. Defaults to None (all).
+
+    Returns:
+        pd.DataFrame: The table.
+    """
+    fmt = format_of(path)
+    columns = list(columns) if columns is not None else None
+    if fmt != "csv":
+        require_pyarrow()
+    if fmt == "parquet":
+        return pd.read_parquet(path, columns=columns)
+    if fmt == "feather":
+        return pd.read_feather(path, columns=columns)
+    return pd.read_csv(path, usecols=columns)
+
+
+def write_table(df: pd.DataFrame, path: Path, dtypes: Optional[Dict[str, str]] = None) -> None:
+    """Write a table in the format given by the suffix of path.
+
+    Parquet and feather tables are cast to dtypes first. Csv files are
+    written as is, since the text does not carry the types.
+
+    Args:
+        df (pd.DataFrame): Table to write.
+        path (Path): Output file.
+        dtypes (Optional[Dict[str, str]], optional): Column types of columnar outputs. Defaults to None.
+    """
+    fmt = format_of(path)
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+        return
+    require_pyarrow()
+    df = cast_columns(df, dtypes).reset_index(drop=True)
+    if fmt == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.to_feather(path)
+
+
+class TableWriter:
+    def __init__(self, path: Path, dtypes: Optional[Dict[str, str]] = None):
+        """
+        Writes a table one block at a time, in the format given by the suffix of path.
+
+        Csv blocks are appended to the file. Parquet blocks are written as
+        row groups and feather blocks as record batches, so the whole table
+        is never held in memory. All blocks must have the same columns.
+
+        Args:
+            path (Path): Output file.
+            dtypes (Optional[Dict[str, str]], optional): Column types of columnar outputs. Defaults to None.
+        """
+        self.path = Path(path)
+        self.fmt = format_of(path)
+        if self.fmt != "csv":
+            # fail before any block is computed
+            require_pyarrow()
+        self.dtypes = dtypes
+        self._writer = None
+        self._header = True
+
+    def write(self, block: pd.DataFrame) -> None:
+        if self.fmt == "csv":
+            block.to_csv(
+                self.path, index=False, header=self._header, mode="w" if self._header else "a"
+            )
+            self._header = False
+            return
+
+        pa = require_pyarrow()
+        table = pa.Table.from_pandas(cast_columns(block, self.dtypes), preserve_index=False)
+        if self._writer is None:
+            if self.fmt == "parquet":
+                import pyarrow.parquet as pq
+
+                self._writer = pq.ParquetWriter(str(self.path), table.schema)
+            else:
+                import pyarrow.ipc as ipc
+
+                self._writer = ipc.new_file(str(self.path), table.schema)
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self) -> "TableWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
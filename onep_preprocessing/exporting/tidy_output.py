@@ -1,7 +1,10 @@
-import isx
-from typing import Optional, Sequence
+from typing import Iterator, Optional, Sequence
 from pathlib import Path
+import csv
+import tempfile
+import numpy as np
 import pandas as pd
+from .table_io import ID_DTYPE, TIME_DTYPE, VALUE_DTYPE, TableWriter, read_table, write_table
 
 
 class Tidier:
@@ -26,45 +29,103 @@ class TraceTidier(Tidier):
         id_colname: str = "session_cell_id",
         value_colname: str = "value",
         on_exists: str = "overwrite",
+        chunksize: int = 5000,
     ):
+        """
+        Converts the wide trace csv exported by isx to long format.
+
+        The wide file is streamed in blocks of chunksize rows and spilled to a
+        temporary file, which is then read back a few cells at a time. The
+        C### cell names in the header are parsed to integer ids once, and each
+        block of cells is turned into long format with NumPy repeat/tile and
+        appended to the output, so memory is bounded by the block size rather
+        than the session length. Rows are ordered by cell, then time, as
+        DataFrame.melt orders them.
+
+        The output format follows the suffix of the output file (.csv,
+        .parquet or .feather). Columnar outputs are written with int32 ids,
+        float32 values and float64 time.
+
+        Args:
+            round_time (Optional[int], optional): Decimals to round time to. Defaults to 3.
+            time_colname (str, optional): Name of the time column. Defaults to "time".
+            id_colname (str, optional): Name of the cell id column. Defaults to "session_cell_id".
+            value_colname (str, optional): Name of the value column. Defaults to "value".
+            on_exists (str, optional): What to do if the output file already exists {"overwrite", "raise", "skip"}. Defaults to "overwrite".
+            chunksize (int, optional): Number of rows of the wide file read at a time. Defaults to 5000.
+        """
         self.round_time = round_time
         self.time_colname = time_colname
         self.id_colname = id_colname
         self.value_colname = value_colname
         self.on_exists = on_exists
+        self.chunksize = chunksize
 
-    def load_trace(self, trace_file: Path) -> pd.DataFrame:
-        df = pd.read_csv(trace_file, skiprows=[1])
-        df = df.rename(columns={" ": self.time_colname})
-        return df
+    @property
+    def dtypes(self) -> dict:
+        return {
+            self.time_colname: TIME_DTYPE,
+            self.id_colname: ID_DTYPE,
+            self.value_colname: VALUE_DTYPE,
+        }
 
-    def melt(self, df: pd.DataFrame) -> pd.DataFrame:
-        df = df.melt(
-            id_vars=self.time_colname,
-            var_name=self.id_colname,
-            value_name=self.value_colname,
-        )
-        return df
+    @staticmethod
+    def parse_cell_ids(names: Sequence[str]) -> np.ndarray:
+        """Integer ids of C### cell names."""
+        return np.array([int(name.split("C")[1]) for name in names], dtype=np.int64)
 
-    def update_ids(self, df) -> pd.DataFrame:
-        df[self.id_colname] = df[self.id_colname].apply(lambda x: int(x.split("C")[1]))
-        return df
+    def read_header(self, trace_file: Path) -> np.ndarray:
+        with open(trace_file, newline="") as f:
+            header = next(csv.reader(f))
+        return self.parse_cell_ids(header[1:])
 
-    def update_time(self, df) -> pd.DataFrame:
-        df[self.time_colname] = df[self.time_colname].round(self.round_time)
-        return df
+    def iter_tidy(self, trace_file: Path) -> Iterator[pd.DataFrame]:
+        """Yield the long format traces, ordered by cell, then time, one block at a time."""
+        cell_ids = self.read_header(trace_file)
+        blocks = pd.read_csv(
+            trace_file, skiprows=[1], chunksize=self.chunksize, dtype=np.float64
+        )
+        times = []
+        with tempfile.TemporaryFile() as f:
+            # spill the wide values to disk so they can be read back by column
+            for block in blocks:
+                times.append(block.iloc[:, 0].to_numpy())
+                f.write(np.ascontiguousarray(block.iloc[:, 1:].to_numpy()).tobytes())
+            f.flush()
+            time = np.concatenate(times) if times else np.zeros(0)
+            if self.round_time is not None:
+                time = time.round(self.round_time)
+            n_times, n_cells = len(time), len(cell_ids)
+            if n_times == 0 or n_cells == 0:
+                yield self._long(time, cell_ids, np.zeros((0, n_cells)))
+                return
+            values = np.memmap(f, dtype=np.float64, mode="r", shape=(n_times, n_cells))
+            # about as many values per block as chunksize rows of the wide file
+            cells_per_block = max(self.chunksize * n_cells // n_times, 1)
+            for start in range(0, n_cells, cells_per_block):
+                stop = start + cells_per_block
+                yield self._long(time, cell_ids[start:stop], values[:, start:stop])
+            del values
+
+    def _long(self, time: np.ndarray, cell_ids: np.ndarray, values: np.ndarray) -> pd.DataFrame:
+        # (times, cells) -> one row per cell and time, like DataFrame.melt
+        return pd.DataFrame(
+            {
+                self.time_colname: np.tile(time, len(cell_ids)),
+                self.id_colname: np.repeat(cell_ids, len(time)),
+                self.value_colname: np.asarray(values).T.ravel(),
+            }
+        )
 
     def tidy(self, trace_file: Path) -> pd.DataFrame:
-        df = self.load_trace(trace_file)
-        df = self.melt(df)
-        df = self.update_ids(df)
-        df = self.update_time(df)
-        return df
+        return pd.concat(list(self.iter_tidy(trace_file)), ignore_index=True)
 
     def __call__(self, source_trace_file: Path, output_trace_file: Path):
-        df = self.tidy(source_trace_file)
-        self.if_exists(output_trace_file)
-        df.to_csv(output_trace_file, index=False)
+        if self.if_exists(output_trace_file):
+            return
+        with TableWriter(output_trace_file, dtypes=self.dtypes) as writer:
+            for block in self.iter_tidy(source_trace_file):
+                writer.write(block)
 
 
 class PropsTidier(Tidier):
@@ -108,8 +169,18 @@ class PropsTidier(Tidier):
 
         self.on_exists = on_exists
 
+    @property
+    def dtypes(self) -> dict:
+        return {
+            self.id_colname: ID_DTYPE,
+            self.size_colname: VALUE_DTYPE,
+            self.centroid_x_colname: VALUE_DTYPE,
+            self.centroid_y_colname: VALUE_DTYPE,
+            self.num_components_colname: ID_DTYPE,
+        }
+
     def load_props(self, props_file: Path) -> pd.DataFrame:
-        df = pd.read_csv(props_file)
+        df = read_table(props_file)
         return df
 
     def rename_cols(self, df: pd.DataFrame) -> pd.DataFrame:
@@ -144,9 +215,10 @@ class PropsTidier(Tidier):
         return df
 
     def __call__(self, source_props_file: Path, output_props_file: Path):
+        if self.if_exists(output_props_file):
+            return
         df = self.tidy(source_props_file)
-        self.if_exists(output_props_file)
-        df.to_csv(output_props_file, index=False)
+        write_table(df, output_props_file, dtypes=self.dtypes)
 
 
 class LongRegTidier(Tidier):
@@ -172,8 +244,16 @@ class LongRegTidier(Tidier):
         self.existing_session_colname = existing_session_colname
         self.on_exists = on_exists
 
+    @property
+    def dtypes(self) -> dict:
+        return {
+            self.mouse_cell_id: ID_DTYPE,
+            self.session_cell_id: ID_DTYPE,
+            self.session_index_col: ID_DTYPE,
+        }
+
     def load_long_reg(self, long_reg_file: Path) -> pd.DataFrame:
-        df = pd.read_csv(long_reg_file)
+        df = read_table(long_reg_file)
         return df
 
     def rename_cols(self, df: pd.DataFrame) -> pd.DataFrame:
@@ -199,6 +279,7 @@ class LongRegTidier(Tidier):
         return df
 
     def __call__(self, source_long_reg_file: Path, output_long_reg_file: Path):
+        if self.if_exists(output_long_reg_file):
+            return
         df = self.tidy(source_long_reg_file)
-        self.if_exists(output_long_reg_file)
-        df.to_csv(output_long_reg_file, index=False)
+        write_table(df, output_long_reg_file, dtypes=self.dtypes)
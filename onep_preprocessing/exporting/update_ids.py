@@ -1,6 +1,9 @@
+import numpy as np
 import pandas as pd
 from pathlib import Path
-from typing import Sequence, Optional
+from typing import Dict, Optional, Sequence, Tuple
+from .remap import lookup_from_table, remap_column
+from .table_io import ID_DTYPE, read_table, write_table
 
 
 class IDUpdater:
@@ -22,58 +25,178 @@ class IDUpdater:
 
 
 class IDUpdaterMouse(IDUpdater):
+    """
+    Replaces session cell ids with the mouse cell ids of the tidy longitudinal registration.
+
+    Files are read and written in the format given by their suffix (.csv,
+    .parquet or .feather).
+
+    Instead of rewriting the traces and props with update_traces and
+    update_props, write_lookup stores the id mapping of a session in a small
+    lookup table, which IDView applies when the tidy tables are read.
+
+    Session cell ids are only unique within a session, so every method takes
+    the session whose rows of the long-reg table to use.
+    """
+
     def __init__(
         self,
         session_cell_id: str = "session_cell_id",
         mouse_cell_id: str = "mouse_cell_id",
+        session_colname: str = "session",
+        unmapped: str = "drop",
         on_exists: str = "overwrite",
     ):
-
+        """
+        Args:
+            session_cell_id (str, optional): Name of the session cell id column. Defaults to "session_cell_id".
+            mouse_cell_id (str, optional): Name of the mouse cell id column. Defaults to "mouse_cell_id".
+            session_colname (str, optional): Name of the session column of the tidy long-reg file. Defaults to "session".
+            unmapped (str, optional): What to do with cells missing from the long-reg file {'drop', 'raise', 'fill'}, see remap.remap_column. Defaults to "drop".
+            on_exists (str, optional): What to do if the output file already exists {"overwrite", "raise", "skip"}. Defaults to "overwrite".
+        """
         self.session_cell_id = session_cell_id
         self.mouse_cell_id = mouse_cell_id
+        self.session_colname = session_colname
+        self.unmapped = unmapped
         self.on_exists = on_exists
+        self._lookups: Dict[Tuple[Path, str], Tuple[int, np.ndarray]] = {}
+
+    @property
+    def dtypes(self) -> dict:
+        return {self.mouse_cell_id: ID_DTYPE}
+
+    def write_lookup(self, longreg_file: Path, lookup_file: Path, session: str) -> pd.DataFrame:
+        """Write the session_cell_id -> mouse_cell_id lookup table of a session.
+
+        Args:
+            longreg_file (Path): Tidy longitudinal registration of the mouse.
+            lookup_file (Path): Output lookup table.
+            session (str): Session name in the longreg file.
+
+        Returns:
+            pd.DataFrame: The lookup table.
+        """
+        longreg = read_table(longreg_file)
+        longreg = longreg[longreg[self.session_colname] == session]
+        lookup = (
+            longreg[[self.session_cell_id, self.mouse_cell_id]]
+            .drop_duplicates()
+            .sort_values(self.session_cell_id)
+            .reset_index(drop=True)
+        )
+        if lookup[self.session_cell_id].duplicated().any():
+            raise ValueError(f"{longreg_file} maps a session cell to more than one mouse cell")
+        if self.if_exists(lookup_file):
+            return lookup
+        write_table(
+            lookup, lookup_file, dtypes={self.session_cell_id: ID_DTYPE, **self.dtypes}
+        )
+        return lookup
+
+    def load_lookup(self, longreg_file: Path, session: str) -> np.ndarray:
+        """Dense session_cell_id -> mouse_cell_id array of one session of a tidy long-reg file.
+
+        The array of each session is built once and reused while the file is
+        unchanged.
+
+        Args:
+            longreg_file (Path): Tidy longitudinal registration of the mouse.
+            session (str): Session name in the longreg file.
+
+        Returns:
+            np.ndarray: Lookup array (see remap.build_lookup).
+        """
+        longreg_file = Path(longreg_file)
+        key = (longreg_file, session)
+        mtime = longreg_file.stat().st_mtime_ns
+        cached = self._lookups.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        longreg = read_table(
+            longreg_file, columns=[self.session_cell_id, self.mouse_cell_id, self.session_colname]
+        )
+        longreg = longreg[longreg[self.session_colname] == session]
+        try:
+            lookup = lookup_from_table(longreg, self.session_cell_id, self.mouse_cell_id)
+        except ValueError as e:
+            raise ValueError(f"{longreg_file}, session {session}: {e}") from e
+        self._lookups[key] = (mtime, lookup)
+        return lookup
 
     def update_traces(
-        self, longreg_file: Path, trace_file: Path, updated_trace_file: Path
+        self,
+        longreg_file: Path,
+        trace_file: Path,
+        updated_trace_file: Path,
+        session: str,
     ) -> None:
-        traces = pd.read_csv(trace_file)
-        longreg = pd.read_csv(longreg_file)
-
-        traces = traces.merge(
-            longreg[[self.session_cell_id, self.mouse_cell_id]].drop_duplicates(),
-            on=self.session_cell_id,
+        """Rewrite a tidy trace file of session with mouse cell ids. Cells missing from the long-reg file are handled as set by unmapped."""
+        if self.if_exists(updated_trace_file):
+            return
+        traces = remap_column(
+            read_table(trace_file),
+            self.load_lookup(longreg_file, session),
+            self.session_cell_id,
+            self.mouse_cell_id,
+            unmapped=self.unmapped,
         )
-        traces = traces.drop(columns=[self.session_cell_id])
-        self.if_exists(updated_trace_file)
-        traces.to_csv(updated_trace_file, index=False)
+        write_table(traces, updated_trace_file, dtypes=self.dtypes)
 
     def update_props(
-        self, longreg_file: Path, props_file: Path, updated_props_file: Path
+        self,
+        longreg_file: Path,
+        props_file: Path,
+        updated_props_file: Path,
+        session: str,
     ) -> None:
-        props = pd.read_csv(props_file)
-        longreg = pd.read_csv(longreg_file)
-
-        props = props.merge(
-            longreg[[self.session_cell_id, self.mouse_cell_id]].drop_duplicates(),
-            on=self.session_cell_id,
+        """Rewrite a tidy props file of session with mouse cell ids. Cells missing from the long-reg file are handled as set by unmapped."""
+        if self.if_exists(updated_props_file):
+            return
+        props = remap_column(
+            read_table(props_file),
+            self.load_lookup(longreg_file, session),
+            self.session_cell_id,
+            self.mouse_cell_id,
+            unmapped=self.unmapped,
         )
-        props = props.drop(columns=[self.session_cell_id])
-        self.if_exists(updated_props_file)
-        props.to_csv(updated_props_file, index=False)
+        write_table(props, updated_props_file, dtypes=self.dtypes)
 
 
 class IDUpdaterDataset(IDUpdater):
+    """
+    Replaces mouse cell ids with ids unique across the dataset.
+
+    Files are read and written in the format given by their suffix (.csv,
+    .parquet or .feather).
+    """
+
     def __init__(
         self,
         dataset_cell_id: str = "cell_id",
         mouse_cell_id: str = "mouse_cell_id",
         mouse_name_col: str = "mouse_name",
+        unmapped: str = "drop",
         on_exists: str = "overwrite",
     ):
+        """
+        Args:
+            dataset_cell_id (str, optional): Name of the dataset cell id column. Defaults to "cell_id".
+            mouse_cell_id (str, optional): Name of the mouse cell id column. Defaults to "mouse_cell_id".
+            mouse_name_col (str, optional): Name of the mouse name column. Defaults to "mouse_name".
+            unmapped (str, optional): What to do with cells missing from the master cellset {'drop', 'raise', 'fill'}, see remap.remap_column. Defaults to "drop".
+            on_exists (str, optional): What to do if the output file already exists {"overwrite", "raise", "skip"}. Defaults to "overwrite".
+        """
         self.dataset_cell_id = dataset_cell_id
         self.mouse_cell_id = mouse_cell_id
         self.mouse_name_col = mouse_name_col
+        self.unmapped = unmapped
         self.on_exists = on_exists
+        self._lookups: Dict[str, Tuple[pd.DataFrame, np.ndarray]] = {}
+
+    @property
+    def dtypes(self) -> dict:
+        return {self.dataset_cell_id: ID_DTYPE, self.mouse_cell_id: ID_DTYPE}
 
     def create_master_cellset(
         self,
@@ -81,22 +204,69 @@ class IDUpdaterDataset(IDUpdater):
         master_cellset_file: Optional[Path] = None,
     ) -> pd.DataFrame:
 
-        master_cellset = pd.DataFrame()
+        cellsets = []
         for props_file in props_files:
             mouse_name = props_file.parent.name
-            props = pd.read_csv(props_file)
+            props = read_table(props_file, columns=[self.mouse_cell_id])
             props[self.mouse_name_col] = mouse_name
-            master_cellset = master_cellset.append(
-                props[[self.mouse_cell_id, self.mouse_name_col]]
-            )
-        master_cellset = master_cellset.drop_duplicates().reset_index(drop=True)
+            cellsets.append(props[[self.mouse_cell_id, self.mouse_name_col]])
+        master_cellset = pd.concat(cellsets).drop_duplicates().reset_index(drop=True)
         master_cellset[self.dataset_cell_id] = range(len(master_cellset))
 
         if master_cellset_file is not None:
             self.if_exists(master_cellset_file)
-            master_cellset.to_csv(master_cellset_file, index=False)
+            write_table(master_cellset, master_cellset_file, dtypes=self.dtypes)
         return master_cellset
 
+    def update_lookup(
+        self, master_cellset: pd.DataFrame, mouse_name: str, lookup_file: Path
+    ) -> pd.DataFrame:
+        """Add the dataset cell ids and mouse name to the lookup table of a session, in place.
+
+        Args:
+            master_cellset (pd.DataFrame): Output of create_master_cellset.
+            mouse_name (str): Mouse of the session.
+            lookup_file (Path): Lookup table written by IDUpdaterMouse.write_lookup.
+
+        Returns:
+            pd.DataFrame: The updated lookup table.
+        """
+        lookup = read_table(lookup_file)
+        lookup = lookup.drop(
+            columns=[c for c in (self.dataset_cell_id, self.mouse_name_col) if c in lookup.columns]
+        )
+        lookup = lookup.merge(
+            master_cellset[master_cellset[self.mouse_name_col] == mouse_name],
+            on=self.mouse_cell_id,
+        )
+        write_table(lookup, lookup_file, dtypes=self.dtypes)
+        return lookup
+
+    def load_lookup(self, master_cellset: pd.DataFrame, mouse_name: str) -> np.ndarray:
+        """Dense mouse_cell_id -> dataset cell id array of one mouse, built once per master cellset."""
+        cached = self._lookups.get(mouse_name)
+        if cached is not None and cached[0] is master_cellset:
+            return cached[1]
+        mouse_cells = master_cellset[master_cellset[self.mouse_name_col] == mouse_name]
+        lookup = lookup_from_table(mouse_cells, self.mouse_cell_id, self.dataset_cell_id)
+        self._lookups[mouse_name] = (master_cellset, lookup)
+        return lookup
+
+    def update_table(
+        self, master_cellset: pd.DataFrame, mouse_name: str, df: pd.DataFrame
+    ) -> pd.DataFrame:
+        """Replace the mouse cell ids of df with dataset cell ids and add the mouse name."""
+        df = remap_column(
+            df,
+            self.load_lookup(master_cellset, mouse_name),
+            self.mouse_cell_id,
+            self.dataset_cell_id,
+            unmapped=self.unmapped,
+            dtype=master_cellset[self.dataset_cell_id].dtype,
+        )
+        df.insert(len(df.columns) - 1, self.mouse_name_col, mouse_name)
+        return df
+
     def update_traces(
         self,
         master_cellset: pd.DataFrame,
@@ -104,14 +274,10 @@ class IDUpdaterDataset(IDUpdater):
         trace_file: Path,
         updated_trace_file: Path,
     ) -> None:
-        self.if_exists(updated_trace_file)
-        traces = pd.read_csv(trace_file)
-        traces = traces.merge(
-            master_cellset[master_cellset[self.mouse_name_col] == mouse_name],
-            on=self.mouse_cell_id,
-        )
-        traces = traces.drop(columns=[self.mouse_cell_id])
-        traces.to_csv(updated_trace_file, index=False)
+        if self.if_exists(updated_trace_file):
+            return
+        traces = self.update_table(master_cellset, mouse_name, read_table(trace_file))
+        write_table(traces, updated_trace_file, dtypes=self.dtypes)
 
     def update_props(
         self,
@@ -120,11 +286,7 @@ class IDUpdaterDataset(IDUpdater):
         props_file: Path,
         updated_props_file: Path,
     ) -> None:
-        self.if_exists(updated_props_file)
-        props = pd.read_csv(props_file)
-        props = props.merge(
-            master_cellset[master_cellset[self.mouse_name_col] == mouse_name],
-            on=self.mouse_cell_id,
-        )
-        props = props.drop(columns=[self.mouse_cell_id])
-        props.to_csv(updated_props_file, index=False)
+        if self.if_exists(updated_props_file):
+            return
+        props = self.update_table(master_cellset, mouse_name, read_table(props_file))
+        write_table(props, updated_props_file, dtypes=self.dtypes)
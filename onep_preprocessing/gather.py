@@ -1,5 +1,5 @@
 from os import cpu_count
-from typing import Callable, Iterable, List, Optional, Dict, Union, Optional
+from typing import Callable, Iterable, List, Optional, Dict, Sequence, Union, Optional
 from dataclasses import dataclass
 from pathlib import Path
 from enum import Enum, auto
@@ -11,6 +11,8 @@ import isx
 import re
 from pathmodels.base.data_dirs import OnePDir
 from pathmodels.pfc.mouse_dir import PFCMouseDir
+from .native.events import event_candidates, max_thresholds
+from .native.isxd import read_cellset
 import tempfile
 
 
@@ -265,19 +267,52 @@ class ISXFileExporter:
             df_cell_props.to_csv(dest_props, index=False)
 
     def export_spikes(
-        self, src: Path, dest: Path, factor: float = 3, update_cellids: bool = True
+        self,
+        src: Path,
+        dest: Path,
+        factor: Union[float, Sequence[float]] = 3,
+        update_cellids: bool = True,
+        native: bool = False,
     ) -> None:
-        isx_events = tempfile.mktemp() + ".isxd"
-        isx.event_detection(str(src), isx_events, threshold=factor)
-        isx.export_event_set_to_csv(isx_events, str(dest))
-
-        if update_cellids:
-            master_cellset = pd.read_csv(self.logreg_file)
-            master_cellset = master_cellset.loc[
-                lambda x: x.session_index == self.session_index
-            ]
-            master_cellset = master_cellset[["cell_id", "session_cell_id"]]
-            (
+        """Detect the events of a cellset and export them to csv.
+
+        Args:
+            src (Path): The .isxd cellset.
+            dest (Path): Output csv file.
+            factor (Union[float, Sequence[float]], optional): Event threshold in median absolute deviations. With native, several factors can be given: the peaks are found once and a threshold column holds the highest factor each event passes. Defaults to 3.
+            update_cellids (bool, optional): Add the cell ids of the long-reg file. Defaults to True.
+            native (bool, optional): Detect the events with native.events.detect_events instead of isx. The output then has one row per event rather than one per frame and cell. Defaults to False.
+        """
+        sweep = not np.isscalar(factor)
+        if sweep and not native:
+            raise ValueError("Sweeping factors needs native=True")
+        if native:
+            cellset = read_cellset(src)
+            candidates, baseline, mad = event_candidates(
+                cellset.traces, cellset.frame_period, names=cellset.names
+            )
+            events, thresholds = max_thresholds(
+                candidates, baseline, mad, list(factor) if sweep else [factor]
+            )
+            df = pd.DataFrame(
+                {
+                    "time": np.round(events.times, 2),
+                    "session_cell_id": self.tidy_cell_ids(
+                        pd.Series(events.names, dtype=object)
+                    ).to_numpy()[events.cell],
+                    "value": events.values,
+                }
+            )
+            if sweep:
+                df["threshold"] = thresholds
+        else:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                isx_events = str(Path(tmp_dir) / "events.isxd")
+                isx.event_detection(str(src), isx_events, threshold=factor)
+                isx.export_event_set_to_csv(isx_events, str(dest))
+            if not update_cellids:
+                return
+            df = (
                 pd.read_csv(dest)
                 .rename(columns={"Time (s)": "time"})
                 .melt(id_vars="time", var_name="session_cell_id", value_name="value")
@@ -285,10 +320,17 @@ class ISXFileExporter:
                     session_cell_id=lambda x: self.tidy_cell_ids(x.session_cell_id),
                     time=lambda x: np.round(x.time, 2),
                 )
-                .merge(master_cellset[["cell_id", "session_cell_id"]])
-                .to_csv(dest, index=False)
             )
 
+        if update_cellids:
+            master_cellset = pd.read_csv(self.logreg_file)
+            master_cellset = master_cellset.loc[
+                lambda x: x.session_index == self.session_index
+            ]
+            master_cellset = master_cellset[["cell_id", "session_cell_id"]]
+            df = df.merge(master_cellset[["cell_id", "session_cell_id"]])
+        df.to_csv(dest, index=False)
+
 
 def get_excluded_session_index(session_name: str, cohort: Cohort):
     if cohort == Cohort.PFC:
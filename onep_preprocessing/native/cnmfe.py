@@ -0,0 +1,563 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+import numpy as np
+from scipy import ndimage, signal, sparse
+from .movie_io import open_movie
+
+
+PROCESSING_MODES = ("all_in_memory", "sequential_patches", "parallel_patches")
+MOVIE_BUFFERS = ("memmap", "shared_memory")
+OUTPUT_UNIT_TYPES = ("df", "df_over_noise")
+NEIGHBOUR_OFFSETS = tuple(
+    (dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if (dy, dx) != (0, 0)
+)
+
+
+@dataclass
+class CNMFeParams:
+    """
+    Parameters of the native CNMF-E, named as in isx.run_cnmfe.
+
+    Args:
+        cell_diameter (int): Expected average diameter of a neuron in pixels.
+        min_corr (float): Minimum local correlation of a seed pixel.
+        min_pnr (float): Minimum peak-to-noise ratio of a seed pixel.
+        bg_spatial_subsampling (int): Spatial downsampling factor of the background model.
+        ring_size_factor (float): Ratio of ring radius to neuron diameter used for estimating background.
+        gaussian_kernel_size (int): Width of the Gaussian kernel used to find seeds. 0 picks one from cell_diameter.
+        closing_kernel_size (int): Morphological closing kernel size applied to footprints. 0 disables it.
+        merge_threshold (float): Temporal correlation threshold for merging spatially overlapping cells.
+        n_iter (int): Number of background / NMF alternations.
+    """
+
+    cell_diameter: int = 7
+    min_corr: float = 0.8
+    min_pnr: float = 10
+    bg_spatial_subsampling: int = 2
+    ring_size_factor: float = 1.4
+    gaussian_kernel_size: int = 0
+    closing_kernel_size: int = 0
+    merge_threshold: float = 0.7
+    n_iter: int = 3
+
+
+@dataclass
+class Components:
+    """
+    Cells found in a movie or a patch of it.
+
+    Footprints are sparse, so patch workers return only the pixels of their
+    cells and merging the whole frame stays cheap.
+
+    Args:
+        footprints (sparse.csr_matrix): (cells, rows * cols) non-negative spatial footprints.
+        traces (np.ndarray): (cells, frames) non-negative temporal traces.
+        seeds (np.ndarray): (cells, 2) row, col of the seed pixel of each cell.
+        frame_shape (Tuple[int, int]): (rows, cols) of the footprints.
+    """
+
+    footprints: sparse.csr_matrix
+    traces: np.ndarray
+    seeds: np.ndarray
+    frame_shape: Tuple[int, int]
+
+    def __len__(self) -> int:
+        return len(self.traces)
+
+    @classmethod
+    def empty(cls, frame_shape: Tuple[int, int], n_frames: int) -> "Components":
+        return cls(
+            sparse.csr_matrix((0, frame_shape[0] * frame_shape[1]), dtype=np.float32),
+            np.zeros((0, n_frames), dtype=np.float32),
+            np.zeros((0, 2), dtype=int),
+            tuple(frame_shape),
+        )
+
+    def select(self, keep: np.ndarray) -> "Components":
+        return Components(self.footprints[keep], self.traces[keep], self.seeds[keep], self.frame_shape)
+
+    def dense_footprints(self) -> np.ndarray:
+        return self.footprints.toarray().reshape(len(self), *self.frame_shape)
+
+    @classmethod
+    def concatenate(cls, parts: List["Components"]) -> "Components":
+        return cls(
+            sparse.vstack([p.footprints for p in parts], format="csr"),
+            np.concatenate([p.traces for p in parts]),
+            np.concatenate([p.seeds for p in parts]),
+            parts[0].frame_shape,
+        )
+
+
+def noise_level(traces: np.ndarray, axis: int = 0) -> np.ndarray:
+    """Robust standard deviation of white noise from the MAD of first differences."""
+    diff = np.diff(traces, axis=axis)
+    return np.median(np.abs(diff), axis=axis) / (0.6745 * np.sqrt(2))
+
+
+def local_correlation(frames: np.ndarray) -> np.ndarray:
+    """Mean temporal correlation of each pixel with its 8 neighbours.
+
+    Args:
+        frames (np.ndarray): (frames, rows, cols) array.
+
+    Returns:
+        np.ndarray: (rows, cols) correlation image.
+    """
+    z = frames - frames.mean(axis=0)
+    norm = np.sqrt((z**2).sum(axis=0))
+    z = np.divide(z, norm, out=np.zeros_like(z), where=norm > 0)
+    rows, cols = z.shape[1:]
+    total = np.zeros((rows, cols), dtype=np.float64)
+    count = np.zeros((rows, cols))
+    for dy, dx in NEIGHBOUR_OFFSETS:
+        ys = slice(max(dy, 0), rows + min(dy, 0))
+        xs = slice(max(dx, 0), cols + min(dx, 0))
+        yn = slice(max(-dy, 0), rows + min(-dy, 0))
+        xn = slice(max(-dx, 0), cols + min(-dx, 0))
+        total[ys, xs] += np.einsum("tij,tij->ij", z[:, ys, xs], z[:, yn, xn])
+        count[ys, xs] += 1
+    return (total / count).astype(np.float32)
+
+
+def _seed_sigma(params: CNMFeParams) -> float:
+    if params.gaussian_kernel_size > 0:
+        return params.gaussian_kernel_size / 4
+    return params.cell_diameter / 4
+
+
+def find_seeds(frames: np.ndarray, params: CNMFeParams) -> Tuple[np.ndarray, np.ndarray]:
+    """Find seed pixels of candidate cells.
+
+    Frames are filtered with a Gaussian whose local mean (over twice the
+    cell diameter) is subtracted, a centre-surround kernel as in CNMF-E that
+    removes the smooth background, and the temporal median is removed.
+    Seeds are local maxima of correlation x PNR with local correlation of at
+    least min_corr and peak-to-noise ratio of at least min_pnr, sorted by
+    decreasing correlation x PNR. Values below 3 noise levels are zeroed
+    before computing the correlation, as in CNMF-E, so noise does not
+    correlate.
+
+    Args:
+        frames (np.ndarray): (frames, rows, cols) array.
+        params (CNMFeParams): Parameters.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (seeds, 2) row, col array and the filtered frames.
+    """
+    sigma = _seed_sigma(params)
+    filtered = ndimage.gaussian_filter(frames, sigma=(0, sigma, sigma)).astype(np.float32)
+    size = 2 * int(params.cell_diameter) + 1
+    filtered -= ndimage.uniform_filter(filtered, size=(1, size, size))
+    filtered -= np.median(filtered, axis=0)
+    noise = noise_level(filtered)
+    noise[noise == 0] = np.inf
+    pnr = filtered.max(axis=0) / noise
+    corr = local_correlation(np.where(filtered < 3 * noise, 0, filtered))
+
+    score = corr * pnr
+    peaks = score == ndimage.maximum_filter(score, size=max(int(params.cell_diameter), 1))
+    candidates = peaks & (corr >= params.min_corr) & (pnr >= params.min_pnr)
+    ys, xs = np.nonzero(candidates)
+    order = np.argsort(-score[ys, xs])
+    return np.stack([ys[order], xs[order]], axis=1), filtered
+
+
+def disk(shape: Tuple[int, int], center: Tuple[int, int], radius: float) -> np.ndarray:
+    """Boolean mask of the pixels within radius of center."""
+    y, x = np.ogrid[: shape[0], : shape[1]]
+    return (y - center[0]) ** 2 + (x - center[1]) ** 2 <= radius**2
+
+
+def ring_kernel(radius: float) -> np.ndarray:
+    """Normalised kernel that averages the pixels one pixel wide ring at radius."""
+    r = max(int(np.ceil(radius)), 1)
+    y, x = np.ogrid[-r : r + 1, -r : r + 1]
+    kernel = (np.abs(np.sqrt(y**2 + x**2) - radius) < 0.5).astype(np.float32)
+    return kernel / kernel.sum()
+
+
+def ring_background(residual: np.ndarray, params: CNMFeParams) -> np.ndarray:
+    """Ring model estimate of the fluctuating background.
+
+    The background at each pixel is the average of the residual (movie minus
+    cells minus mean) on a ring of radius ring_size_factor * cell_diameter
+    around it. The ring lies outside the cell, so neural activity does not
+    leak into the background. The estimate is computed on frames downsampled
+    by bg_spatial_subsampling and upsampled back. Uniform ring weights stand
+    in for the regressed weights of the full CNMF-E model.
+
+    Args:
+        residual (np.ndarray): (frames, rows, cols) movie minus cells minus temporal mean.
+        params (CNMFeParams): Parameters.
+
+    Returns:
+        np.ndarray: (frames, rows, cols) background.
+    """
+    ss = max(int(params.bg_spatial_subsampling), 1)
+    n, rows, cols = residual.shape
+    pad_r, pad_c = -rows % ss, -cols % ss
+    small = np.pad(residual, ((0, 0), (0, pad_r), (0, pad_c)), mode="edge")
+    small = small.reshape(n, (rows + pad_r) // ss, ss, (cols + pad_c) // ss, ss).mean(axis=(2, 4))
+    kernel = ring_kernel(params.ring_size_factor * params.cell_diameter / ss)
+    weight = signal.fftconvolve(np.ones(small.shape[1:]), kernel, mode="same")
+    background = signal.fftconvolve(small, kernel[None], mode="same", axes=(1, 2))
+    background /= np.maximum(weight, 1e-6)
+    background = background.repeat(ss, axis=1).repeat(ss, axis=2)
+    return background[:, :rows, :cols].astype(np.float32)
+
+
+def _hals(
+    data: np.ndarray, footprints: np.ndarray, traces: np.ndarray, masks: np.ndarray, n_iter: int = 2
+) -> Tuple[np.ndarray, np.ndarray]:
+    # hierarchical alternating least squares for data (frames, pixels) ~ traces.T @ footprints
+    # with non-negative footprints restricted to masks
+    for _ in range(n_iter):
+        ay = footprints @ data.T
+        aa = footprints @ footprints.T
+        for k in range(len(traces)):
+            if aa[k, k] > 0:
+                traces[k] = np.maximum(traces[k] + (ay[k] - aa[k] @ traces) / aa[k, k], 0)
+        cy = traces @ data
+        cc = traces @ traces.T
+        for k in range(len(traces)):
+            if cc[k, k] > 0:
+                update = footprints[k] + (cy[k] - cc[k] @ footprints) / cc[k, k]
+                footprints[k] = np.maximum(update, 0) * masks[k]
+    return footprints, traces
+
+
+def merge_components(components: Components, merge_threshold: float) -> Components:
+    """Merge spatially overlapping cells whose traces correlate above merge_threshold.
+
+    Each group of merged cells is replaced by a rank 1 approximation of
+    their summed activity, seeded at the brightest member. Applied once to
+    the cells of all patches, this also joins cells found by neighbouring
+    patches in their overlap.
+    """
+    n = len(components)
+    if n < 2:
+        return components
+    flat = components.footprints
+    support = (flat > 0).astype(np.float32)
+    overlap = (support @ support.T).toarray() > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = np.nan_to_num(np.corrcoef(components.traces))
+    linked = overlap & (corr > merge_threshold)
+    n_groups, labels = _connected_components(linked)
+    if n_groups == n:
+        return components
+
+    scale = flat.max(axis=1).toarray().ravel()
+    footprints, traces, seeds = [], [], []
+    for group in range(n_groups):
+        members = np.nonzero(labels == group)[0]
+        if len(members) == 1:
+            k = members[0]
+            footprints.append(flat[k])
+            traces.append(components.traces[k])
+            seeds.append(components.seeds[k])
+            continue
+        trace = (components.traces[members] * scale[members, None]).sum(axis=0)
+        weights = components.traces[members] @ trace / max(float(trace @ trace), 1e-12)
+        footprints.append(sparse.csr_matrix(weights[None, :] @ flat[members]))
+        traces.append(trace)
+        seeds.append(components.seeds[members[np.argmax(scale[members])]])
+    return Components(
+        sparse.vstack(footprints, format="csr").astype(np.float32),
+        np.stack(traces).astype(np.float32),
+        np.stack(seeds),
+        components.frame_shape,
+    )
+
+
+def _connected_components(adjacency: np.ndarray) -> Tuple[int, np.ndarray]:
+    labels = -np.ones(len(adjacency), dtype=int)
+    n_groups = 0
+    for start in range(len(adjacency)):
+        if labels[start] >= 0:
+            continue
+        stack = [start]
+        labels[start] = n_groups
+        while stack:
+            k = stack.pop()
+            for j in np.nonzero(adjacency[k] & (labels < 0))[0]:
+                labels[j] = n_groups
+                stack.append(j)
+        n_groups += 1
+    return n_groups, labels
+
+
+def fit_patch(frames: np.ndarray, params: CNMFeParams) -> Components:
+    """Find cells in a (frames, rows, cols) block of a movie.
+
+    Seeds initialise footprints within one cell diameter of the seed and
+    traces from the filtered movie at the seed. The model is then refined by
+    alternating between the ring background and non-negative HALS updates of
+    footprints and traces, and overlapping correlated cells are merged.
+
+    Args:
+        frames (np.ndarray): (frames, rows, cols) array.
+        params (CNMFeParams): Parameters.
+
+    Returns:
+        Components: Cells found, in block coordinates.
+    """
+    frames = np.asarray(frames, dtype=np.float32)
+    n_frames, rows, cols = frames.shape
+    seeds, filtered = find_seeds(frames, params)
+    if len(seeds) == 0:
+        return Components.empty((rows, cols), n_frames)
+
+    masks = np.stack([disk((rows, cols), seed, params.cell_diameter) for seed in seeds])
+    flat_masks = masks.reshape(len(seeds), -1).astype(np.float32)
+    traces = np.maximum(filtered[:, seeds[:, 0], seeds[:, 1]].T, 0).astype(np.float32)
+    flat_filtered = filtered.reshape(n_frames, -1)
+    norms = np.maximum((traces**2).sum(axis=1), 1e-12)
+    footprints = np.maximum(traces @ flat_filtered / norms[:, None], 0) * flat_masks
+
+    data = frames.reshape(n_frames, -1)
+    for _ in range(params.n_iter):
+        cells = traces.T @ footprints
+        baseline = (data - cells).mean(axis=0)
+        background = ring_background(
+            (data - cells - baseline).reshape(frames.shape), params
+        ).reshape(n_frames, -1)
+        footprints, traces = _hals(data - baseline - background, footprints, traces, flat_masks)
+
+    keep = (footprints.max(axis=1) > 0) & (traces.max(axis=1) > 0)
+    components = Components(
+        sparse.csr_matrix(footprints[keep]), traces[keep], seeds[keep], (rows, cols)
+    )
+    return merge_components(components, params.merge_threshold)
+
+
+def patch_grid(
+    frame_shape: Tuple[int, int], patch_size: int, patch_overlap: int
+) -> List[Tuple[Tuple[int, int, int, int], Tuple[int, int, int, int]]]:
+    """Overlapping patches covering a frame.
+
+    Args:
+        frame_shape (Tuple[int, int]): (rows, cols) of the frames.
+        patch_size (int): Side of each patch in pixels.
+        patch_overlap (int): Overlap between neighbouring patches in pixels.
+
+    Returns:
+        List[Tuple[Tuple[int, int, int, int], Tuple[int, int, int, int]]]: For each patch, its
+        (top, bottom, left, right) bounds and the bounds of its core, the part of the
+        patch closer to it than to any neighbour. Cores tile the frame.
+    """
+    if patch_overlap >= patch_size:
+        raise ValueError("patch_overlap must be smaller than patch_size")
+
+    def axis(n: int) -> List[Tuple[int, int, int, int]]:
+        if n <= patch_size:
+            return [(0, n, 0, n)]
+        starts = list(range(0, n - patch_size, patch_size - patch_overlap)) + [n - patch_size]
+        bounds = [(start, start + patch_size) for start in starts]
+        out = []
+        for i, (lo, hi) in enumerate(bounds):
+            core_lo = 0 if i == 0 else (lo + bounds[i - 1][1]) // 2
+            core_hi = n if i == len(bounds) - 1 else (hi + bounds[i + 1][0]) // 2
+            out.append((lo, hi, core_lo, core_hi))
+        return out
+
+    rows, cols = frame_shape
+    return [
+        ((top, bottom, left, right), (core_top, core_bottom, core_left, core_right))
+        for top, bottom, core_top, core_bottom in axis(rows)
+        for left, right, core_left, core_right in axis(cols)
+    ]
+
+
+class SharedMovie:
+    def __init__(self, in_vid: Path, frames_per_chunk: int = 200):
+        """
+        A movie loaded once into shared memory for patch workers.
+
+        Workers attach to the block by name instead of each reading their own
+        copy, so RAM does not grow with the number of workers and the movie is
+        read from disk once. Use as a context manager, the block is freed on
+        exit.
+
+        Args:
+            in_vid (Path): Movie readable by native.movie_io.
+            frames_per_chunk (int, optional): Number of frames copied at a time. Defaults to 200.
+        """
+        movie = open_movie(in_vid)
+        self.shape = movie.shape
+        self.dtype = np.dtype(movie.dtype).str
+        self._shm = shared_memory.SharedMemory(create=True, size=max(movie.nbytes, 1))
+        data = np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf)
+        for start in range(0, len(movie), frames_per_chunk):
+            data[start : start + frames_per_chunk] = movie[start : start + frames_per_chunk]
+        del data
+
+    @property
+    def spec(self) -> Tuple[str, Tuple[int, ...], str]:
+        """Picklable (name, shape, dtype) handle passed to workers."""
+        return self._shm.name, self.shape, self.dtype
+
+    def close(self) -> None:
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self) -> "SharedMovie":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+MovieSource = Union[Path, Tuple[str, Tuple[int, ...], str]]
+
+
+def _read_patch(source: MovieSource, bounds: Tuple[int, int, int, int]) -> np.ndarray:
+    top, bottom, left, right = bounds
+    if isinstance(source, tuple):
+        name, shape, dtype = source
+        # pool workers share the resource tracker of the creating process,
+        # which unlinks the block once in SharedMovie.close
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            movie = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            patch = np.array(movie[:, top:bottom, left:right], dtype=np.float32)
+            del movie
+        finally:
+            shm.close()
+        return patch
+    return np.asarray(open_movie(source)[:, top:bottom, left:right], dtype=np.float32)
+
+
+def _fit_patch_job(
+    source: MovieSource,
+    bounds: Tuple[int, int, int, int],
+    core: Tuple[int, int, int, int],
+    frame_shape: Tuple[int, int],
+    params: CNMFeParams,
+) -> Components:
+    top, bottom, left, right = bounds
+    components = fit_patch(_read_patch(source, bounds), params)
+    # cells seeded outside the core are cut by the patch edge, the
+    # neighbouring patch sees them whole
+    core_top, core_bottom, core_left, core_right = core
+    seeds = components.seeds + [top, left]
+    components = components.select(
+        (seeds[:, 0] >= core_top)
+        & (seeds[:, 0] < core_bottom)
+        & (seeds[:, 1] >= core_left)
+        & (seeds[:, 1] < core_right)
+    )
+    # move the sparse footprints from patch to frame coordinates
+    footprints = components.footprints.tocoo()
+    rows, cols = np.divmod(footprints.col, right - left)
+    frame_index = (rows + top) * frame_shape[1] + cols + left
+    footprints = sparse.csr_matrix(
+        (footprints.data, (footprints.row, frame_index)),
+        shape=(len(components), frame_shape[0] * frame_shape[1]),
+    )
+    return Components(footprints, components.traces, components.seeds + [top, left], frame_shape)
+
+
+def fit_movie(
+    in_vid: Path,
+    params: CNMFeParams,
+    processing_mode: str = "parallel_patches",
+    patch_size: int = 80,
+    patch_overlap: int = 20,
+    num_workers: int = 4,
+    movie_buffer: str = "memmap",
+) -> Components:
+    """Run CNMF-E on a movie.
+
+    In the patch modes the frame is split into overlapping patches that are
+    fitted independently, on a process pool in 'parallel_patches' mode.
+    Workers read only their patch from one shared copy of the movie, either
+    the page cache behind a memory map or a shared memory block loaded once,
+    and return sparse footprints with their traces for the cells seeded in
+    their core. A single merge step over all cells then applies
+    merge_threshold across patch borders, joining cells that straddle the
+    border between two cores.
+
+    Args:
+        in_vid (Path): Motion corrected movie.
+        params (CNMFeParams): Parameters.
+        processing_mode (str, optional): {'all_in_memory', 'sequential_patches', 'parallel_patches'}. Defaults to "parallel_patches".
+        patch_size (int, optional): Side of each patch in pixels. Defaults to 80.
+        patch_overlap (int, optional): Overlap between patches in pixels. Defaults to 20.
+        num_workers (int, optional): Number of processes in 'parallel_patches' mode. Defaults to 4.
+        movie_buffer (str, optional): How workers share the movie {'memmap', 'shared_memory'}. Defaults to "memmap".
+
+    Returns:
+        Components: Cells with full frame footprints.
+    """
+    if processing_mode not in PROCESSING_MODES:
+        raise ValueError(f"Unknown processing_mode: {processing_mode}")
+    if movie_buffer not in MOVIE_BUFFERS:
+        raise ValueError(f"Unknown movie_buffer: {movie_buffer}")
+    n_frames, rows, cols = open_movie(in_vid).shape
+    if processing_mode == "all_in_memory":
+        grid = [((0, rows, 0, cols), (0, rows, 0, cols))]
+    else:
+        grid = patch_grid((rows, cols), patch_size, patch_overlap)
+
+    parallel = processing_mode == "parallel_patches" and len(grid) > 1 and num_workers > 1
+    shared = SharedMovie(in_vid) if parallel and movie_buffer == "shared_memory" else None
+    source = shared.spec if shared is not None else Path(in_vid)
+    try:
+        if parallel:
+            with ProcessPoolExecutor(max_workers=min(num_workers, len(grid))) as pool:
+                futures = [
+                    pool.submit(_fit_patch_job, source, bounds, core, (rows, cols), params)
+                    for bounds, core in grid
+                ]
+                parts = [future.result() for future in futures]
+        else:
+            parts = [
+                _fit_patch_job(source, bounds, core, (rows, cols), params) for bounds, core in grid
+            ]
+    finally:
+        if shared is not None:
+            shared.close()
+
+    parts = [part for part in parts if len(part)]
+    if not parts:
+        return Components.empty((rows, cols), n_frames)
+    return merge_components(Components.concatenate(parts), params.merge_threshold)
+
+
+def finalize(
+    components: Components, closing_kernel_size: int = 0, output_unit_type: str = "df_over_noise"
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Scale footprints and traces for output.
+
+    Footprints are normalised to a peak of 1 (after an optional
+    morphological closing) and traces scaled to match, so 'df' traces are in
+    movie units at the brightest pixel of the cell. 'df_over_noise' further
+    divides each trace by its noise level.
+
+    Args:
+        components (Components): Cells.
+        closing_kernel_size (int, optional): Morphological closing kernel size. Defaults to 0.
+        output_unit_type (str, optional): {'df', 'df_over_noise'}. Defaults to "df_over_noise".
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (cells, rows, cols) footprints and (cells, frames) traces, float32.
+    """
+    if output_unit_type not in OUTPUT_UNIT_TYPES:
+        raise ValueError(f"Unknown output_unit_type: {output_unit_type}")
+    footprints = components.dense_footprints()
+    if closing_kernel_size > 0:
+        for i, footprint in enumerate(footprints):
+            footprints[i] = ndimage.grey_closing(footprint, size=closing_kernel_size)
+    peak = footprints.reshape(len(footprints), -1).max(axis=1) if len(footprints) else np.zeros(0)
+    peak = np.where(peak > 0, peak, 1)
+    footprints /= peak[:, None, None]
+    traces = components.traces * peak[:, None]
+    if output_unit_type == "df_over_noise" and len(traces):
+        noise = noise_level(traces, axis=1)
+        traces = traces / np.where(noise > 0, noise, 1)[:, None]
+    return footprints.astype(np.float32), traces.astype(np.float32)
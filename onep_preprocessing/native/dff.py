@@ -0,0 +1,327 @@
+from pathlib import Path
+from typing import Optional, Sequence, Union
+import numpy as np
+from .movie_io import MovieWriter, open_movie, read_metadata
+
+
+F0_TYPES = ("mean", "min", "percentile")
+
+
+class F0Accumulator:
+    def __init__(self, f0_type: str = "mean"):
+        """
+        Accumulates a per-pixel F0 one chunk at a time.
+
+        NaN pixels (e.g. the margins left by motion correction) are ignored.
+
+        Args:
+            f0_type (str, optional): Type of F0 to use {'mean', 'min'}. Defaults to "mean".
+        """
+        if f0_type not in ("mean", "min"):
+            raise ValueError(f"Unknown f0_type: {f0_type}")
+        self.f0_type = f0_type
+        self.n_frames = 0
+        self._acc: Optional[np.ndarray] = None
+        self._count: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_f0(cls, f0_type: str, f0: np.ndarray, n_frames: int) -> "F0Accumulator":
+        """Accumulator holding a previously computed F0 over n_frames frames."""
+        accumulator = cls(f0_type)
+        accumulator.n_frames = n_frames
+        if f0_type == "mean":
+            accumulator._acc = f0.astype(np.float64) * n_frames
+            accumulator._count = np.full(f0.shape, n_frames, dtype=np.int64)
+        else:
+            accumulator._acc = f0.astype(np.float64)
+        return accumulator
+
+    def update(self, frames: np.ndarray) -> None:
+        if len(frames) == 0:
+            return
+        if self.f0_type == "mean":
+            chunk = np.nansum(frames, axis=0, dtype=np.float64)
+            count = np.isfinite(frames).sum(axis=0)
+            if self._acc is None:
+                self._acc, self._count = chunk, count
+            else:
+                self._acc += chunk
+                self._count += count
+        else:
+            chunk = np.fmin.reduce(frames, axis=0).astype(np.float64)
+            self._acc = chunk if self._acc is None else np.fmin(self._acc, chunk)
+        self.n_frames += len(frames)
+
+    @property
+    def f0(self) -> np.ndarray:
+        if self._acc is None:
+            raise ValueError("No frames have been accumulated.")
+        if self.f0_type == "mean":
+            with np.errstate(divide="ignore", invalid="ignore"):
+                f0 = self._acc / self._count
+            return np.nan_to_num(f0).astype(np.float32)
+        return np.nan_to_num(self._acc).astype(np.float32)
+
+    def at(self, frame_indices: Sequence[int]) -> np.ndarray:
+        """F0 of the given frames, the same (rows, cols) image for all of them."""
+        return self.f0
+
+
+class SlidingPercentileF0:
+    def __init__(
+        self,
+        movie: np.ndarray,
+        window: int = 1000,
+        percentile: float = 8,
+        step: Optional[int] = None,
+    ):
+        """
+        Per-pixel F0 as a percentile over a sliding window of frames.
+
+        Corrects for slow drift such as photobleaching, where one F0 for the
+        whole recording is wrong. The percentile is evaluated every step
+        frames on a window centred on that frame (clamped to the movie) and
+        linearly interpolated in between, so only one window is held in memory at a time and a movie
+        costs about window / step reads instead of window.
+
+        Args:
+            movie (np.ndarray): (frames, rows, cols) movie, typically a memory map.
+            window (int, optional): Window length in frames. Defaults to 1000.
+            percentile (float, optional): Percentile in [0, 100]. Defaults to 8.
+            step (Optional[int], optional): Frames between evaluations. Defaults to None (window // 4).
+        """
+        if not 0 <= percentile <= 100:
+            raise ValueError("percentile must be between 0 and 100")
+        n = len(movie)
+        if n == 0:
+            raise ValueError("Cannot compute F0 of an empty movie")
+        window = max(min(int(window), n), 1)
+        step = max(int(step or window // 4), 1)
+        # each evaluation is placed at the centre of the window it used
+        half = window // 2
+        anchors = np.unique(np.clip(np.append(np.arange(0, n, step), n - 1), half, n - window + half))
+        values = np.empty((len(anchors), *movie.shape[1:]), dtype=np.float32)
+        for i, anchor in enumerate(anchors):
+            start = anchor - half
+            block = np.asarray(movie[start : start + window], dtype=np.float32)
+            reduce = np.nanpercentile if np.isnan(block).any() else np.percentile
+            values[i] = reduce(block, percentile, axis=0)
+        self.window = window
+        self.percentile = percentile
+        self.anchors = anchors
+        self.values = np.nan_to_num(values)
+
+    def at(self, frame_indices: Sequence[int]) -> np.ndarray:
+        """(frames, rows, cols) F0 of the given frames, constant beyond the first and last window centres."""
+        t = np.clip(np.asarray(frame_indices, dtype=float), self.anchors[0], self.anchors[-1])
+        i = np.clip(np.searchsorted(self.anchors, t, side="right") - 1, 0, len(self.anchors) - 1)
+        j = np.minimum(i + 1, len(self.anchors) - 1)
+        span = np.where(j > i, self.anchors[j] - self.anchors[i], 1)
+        frac = ((t - self.anchors[i]) / span).astype(np.float32)[:, None, None]
+        return self.values[i] * (1 - frac) + self.values[j] * frac
+
+
+def f0_path(path: Path) -> Path:
+    """Path of the F0 sidecar of a movie."""
+    path = Path(path)
+    return path.with_name(path.name + ".f0.npz")
+
+
+def save_f0(path: Path, accumulator: F0Accumulator) -> None:
+    """Store the F0 accumulated while writing a movie next to it."""
+    with open(f0_path(path), "wb") as f:
+        np.savez(
+            f, f0=accumulator.f0, f0_type=accumulator.f0_type, n_frames=accumulator.n_frames
+        )
+
+
+def load_f0(path: Path, f0_type: str) -> Optional[F0Accumulator]:
+    """Load the F0 sidecar of a movie.
+
+    Returns None if there is no sidecar, or if it is older than the movie or
+    was computed with another f0_type or number of frames.
+    """
+    sidecar = f0_path(path)
+    if not sidecar.exists() or sidecar.stat().st_mtime_ns < Path(path).stat().st_mtime_ns:
+        return None
+    n_frames = read_metadata(path).n_frames
+    with np.load(sidecar) as stored:
+        if str(stored["f0_type"]) != f0_type or int(stored["n_frames"]) != n_frames:
+            return None
+        return F0Accumulator.from_f0(f0_type, stored["f0"], n_frames)
+
+
+def apply_dff(frames: np.ndarray, f0: np.ndarray) -> np.ndarray:
+    """(F - F0) / F0, with pixels where F0 is 0 set to 0.
+
+    f0 is either one (rows, cols) image or one per frame.
+    """
+    frames = np.asarray(frames, dtype=np.float32)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = (frames - f0) / f0
+    out[np.broadcast_to(f0 == 0, out.shape)] = 0
+    return out
+
+
+def compute_f0(
+    movie: np.ndarray,
+    f0_type: str = "mean",
+    window: int = 1000,
+    percentile: float = 8,
+    frames_per_chunk: int = 200,
+) -> Union[F0Accumulator, SlidingPercentileF0]:
+    """Compute the F0 of a movie with one pass over it.
+
+    Args:
+        movie (np.ndarray): (frames, rows, cols) movie, typically a memory map.
+        f0_type (str, optional): Type of F0 to use {'mean', 'min', 'percentile'}. Defaults to "mean".
+        window (int, optional): Window length in frames for 'percentile'. Defaults to 1000.
+        percentile (float, optional): Percentile for 'percentile'. Defaults to 8.
+        frames_per_chunk (int, optional): Number of frames read at a time. Defaults to 200.
+
+    Returns:
+        Union[F0Accumulator, SlidingPercentileF0]: Object whose at(frame_indices) returns the F0.
+    """
+    if f0_type not in F0_TYPES:
+        raise ValueError(f"Unknown f0_type: {f0_type}")
+    if f0_type == "percentile":
+        return SlidingPercentileF0(movie, window=window, percentile=percentile)
+    accumulator = F0Accumulator(f0_type)
+    for start in range(0, len(movie), frames_per_chunk):
+        accumulator.update(np.asarray(movie[start : start + frames_per_chunk]))
+    return accumulator
+
+
+class LazyDff:
+    def __init__(
+        self,
+        in_vid: Path,
+        f0_type: str = "mean",
+        window: int = 1000,
+        percentile: float = 8,
+        frames_per_chunk: int = 200,
+    ):
+        """
+        dF/F view of a movie, computed on read.
+
+        Avoids writing a dF/F movie at all: frames are normalised when they
+        are indexed. A mean or min F0 is taken from the sidecar written during
+        motion correction when there is one, otherwise it is computed with one
+        pass over the movie.
+
+        Args:
+            in_vid (Path): Motion corrected movie.
+            f0_type (str, optional): Type of F0 to use {'mean', 'min', 'percentile'}. Defaults to "mean".
+            window (int, optional): Window length in frames for 'percentile'. Defaults to 1000.
+            percentile (float, optional): Percentile for 'percentile'. Defaults to 8.
+            frames_per_chunk (int, optional): Number of frames read at a time while computing F0. Defaults to 200.
+        """
+        self.movie = open_movie(in_vid)
+        self.baseline = (load_f0(in_vid, f0_type) if f0_type != "percentile" else None) or compute_f0(
+            self.movie, f0_type, window, percentile, frames_per_chunk
+        )
+
+    @property
+    def shape(self):
+        return self.movie.shape
+
+    def __len__(self) -> int:
+        return len(self.movie)
+
+    def __getitem__(self, index: Union[int, slice]) -> np.ndarray:
+        if isinstance(index, (int, np.integer)):
+            index = range(len(self.movie))[index]
+            return self[index : index + 1][0]
+        if not isinstance(index, slice):
+            raise TypeError("LazyDff only supports integer and slice indexing")
+        indices = range(len(self.movie))[index]
+        return apply_dff(self.movie[index], self.baseline.at(indices))
+
+
+def dff_movie(
+    in_vid: Path,
+    out_vid: Path,
+    f0_type: str = "mean",
+    window: int = 1000,
+    percentile: float = 8,
+    frames_per_chunk: int = 200,
+) -> int:
+    """Write the dF/F of a movie.
+
+    A mean or min F0 stored by the motion correction pass is reused, so the
+    movie is only read once, while normalising. Otherwise F0 costs one more
+    pass.
+
+    Args:
+        in_vid (Path): Input movie.
+        out_vid (Path): Output movie.
+        f0_type (str, optional): Type of F0 to use {'mean', 'min', 'percentile'}. Defaults to "mean".
+        window (int, optional): Window length in frames for 'percentile'. Defaults to 1000.
+        percentile (float, optional): Percentile for 'percentile'. Defaults to 8.
+        frames_per_chunk (int, optional): Number of frames processed at a time. Defaults to 200.
+
+    Returns:
+        int: Number of frames processed.
+    """
+    dff = LazyDff(in_vid, f0_type, window, percentile, frames_per_chunk)
+    metadata = read_metadata(in_vid)
+    with MovieWriter(
+        out_vid,
+        metadata.frame_shape,
+        n_frames=metadata.n_frames,
+        frame_period=metadata.frame_period,
+    ) as writer:
+        for start in range(0, len(dff), frames_per_chunk):
+            writer.write(dff[start : start + frames_per_chunk])
+    return metadata.n_frames
+
+
+def trace_dff(
+    traces: np.ndarray,
+    f0_type: str = "mean",
+    window: int = 1000,
+    percentile: float = 8,
+) -> np.ndarray:
+    """dF/F of cell traces, with the F0 of each cell computed like that of a pixel.
+
+    The (cells, frames) traces are viewed as a movie of one-pixel-wide
+    frames, so compute_f0 and apply_dff normalise all cells at once with
+    the same F0 types as the dF/F movie. NaN frames are ignored by the F0
+    and cells with an F0 of 0 give 0.
+
+    Args:
+        traces (np.ndarray): (cells, frames) traces, e.g. CellSet.traces.
+        f0_type (str, optional): Type of F0 to use {'mean', 'min', 'percentile'}. Defaults to "mean".
+        window (int, optional): Window length in frames for 'percentile'. Defaults to 1000.
+        percentile (float, optional): Percentile for 'percentile'. Defaults to 8.
+
+    Returns:
+        np.ndarray: (cells, frames) float32 dF/F.
+    """
+    frames = np.asarray(traces, dtype=np.float32).T[:, :, None]
+    baseline = compute_f0(frames, f0_type, window, percentile, frames_per_chunk=len(frames) or 1)
+    dff = apply_dff(frames, baseline.at(range(len(frames))))
+    return np.ascontiguousarray(dff[:, :, 0].T)
+
+
+class TraceDff:
+    def __init__(self, f0_type: str = "mean", window: int = 1000, percentile: float = 8):
+        """
+        Trace level dF/F, applied after cell extraction (see trace_dff).
+
+        Replaces the dF/F movie when only cell traces are used downstream,
+        saving one full movie read and write per session.
+
+        Args:
+            f0_type (str, optional): Type of F0 to use {'mean', 'min', 'percentile'}. Defaults to "mean".
+            window (int, optional): Window length in frames for 'percentile'. Defaults to 1000.
+            percentile (float, optional): Percentile for 'percentile'. Defaults to 8.
+        """
+        if f0_type not in F0_TYPES:
+            raise ValueError(f"Unknown f0_type: {f0_type}")
+        self.f0_type = f0_type
+        self.window = window
+        self.percentile = percentile
+
+    def __call__(self, traces: np.ndarray) -> np.ndarray:
+        return trace_dff(traces, self.f0_type, self.window, self.percentile)
@@ -0,0 +1,229 @@
+from pathlib import Path
+from typing import Optional, Sequence
+import numpy as np
+from .movie_io import MovieWriter, iter_chunks, open_movie, read_metadata
+
+
+NEIGHBOUR_OFFSETS = tuple(
+    (dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if (dy, dx) != (0, 0)
+)
+
+
+def _as_int_factor(factor: float, name: str) -> int:
+    if factor < 1 or int(factor) != factor:
+        raise ValueError(f"{name} must be a positive integer, got {factor}")
+    return int(factor)
+
+
+def crop(frames: np.ndarray, crop_rect: Optional[Sequence[int]]) -> np.ndarray:
+    """Crop frames to [top, left, bottom, right], inclusive as in isx.preprocess."""
+    if crop_rect is None:
+        return frames
+    top, left, bottom, right = crop_rect
+    return frames[:, top : bottom + 1, left : right + 1]
+
+
+def defective_pixel_mask(
+    frames: np.ndarray, threshold: float = 10, min_mad: float = 1
+) -> np.ndarray:
+    """Find stuck or hot pixels in a chunk of frames.
+
+    A pixel is defective if its temporal mean differs from the median of its 8
+    neighbours by more than threshold robust standard deviations (MAD based)
+    of that difference across the frame. The deviation is at least min_mad,
+    so a flat frame does not flag every pixel that differs at all.
+
+    Args:
+        frames (np.ndarray): (frames, rows, cols) array.
+        threshold (float, optional): Detection threshold. Defaults to 10.
+        min_mad (float, optional): Floor of the robust standard deviation, in the units of the movie. Defaults to 1.
+
+    Returns:
+        np.ndarray: (rows, cols) boolean mask of defective pixels.
+    """
+    mean = frames.mean(axis=0, dtype=np.float32)
+    rows, cols = mean.shape
+    padded = np.pad(mean, 1, mode="edge")
+    neighbours = np.stack(
+        [padded[1 + dy : rows + 1 + dy, 1 + dx : cols + 1 + dx] for dy, dx in NEIGHBOUR_OFFSETS]
+    )
+    diff = mean - np.median(neighbours, axis=0)
+    mad = max(np.median(np.abs(diff - np.median(diff))) * 1.4826, min_mad)
+    return np.abs(diff) > threshold * mad
+
+
+def movie_defective_pixel_mask(
+    in_vid: Path,
+    crop_rect: Optional[Sequence[int]] = None,
+    threshold: float = 10,
+    sample_frames: int = 1000,
+    frames_per_chunk: int = 200,
+) -> np.ndarray:
+    """defective_pixel_mask of a whole movie, from the mean of up to sample_frames evenly spaced frames.
+
+    Computing the mask once per movie and applying it to every chunk keeps
+    the same pixels fixed in all frames, whatever the chunk size.
+
+    Args:
+        in_vid (Path): Input movie.
+        crop_rect (Optional[Sequence[int]], optional): [top, left, bottom, right] crop rectangle. Defaults to None.
+        threshold (float, optional): Detection threshold. Defaults to 10.
+        sample_frames (int, optional): Maximum number of frames averaged. Defaults to 1000.
+        frames_per_chunk (int, optional): Number of sampled frames read at a time. Defaults to 200.
+
+    Returns:
+        np.ndarray: (rows, cols) boolean mask of defective pixels of the cropped frames.
+    """
+    movie = open_movie(in_vid)
+    indices = np.unique(np.linspace(0, len(movie) - 1, min(len(movie), sample_frames)).astype(int))
+    total = None
+    for start in range(0, len(indices), frames_per_chunk):
+        frames = crop(movie[indices[start : start + frames_per_chunk]], crop_rect)
+        chunk_sum = frames.sum(axis=0, dtype=np.float64)
+        total = chunk_sum if total is None else total + chunk_sum
+    if total is None:
+        raise ValueError(f"{in_vid} has no frames")
+    return defective_pixel_mask((total / len(indices)).astype(np.float32)[None], threshold)
+
+
+def fix_defective(frames: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Replace masked pixels in every frame by the median of their 8 neighbours.
+
+    Only the masked pixels are gathered, so the cost scales with the number of
+    defective pixels rather than the frame size.
+    """
+    ys, xs = np.nonzero(mask)
+    if len(ys) == 0:
+        return frames
+    rows, cols = mask.shape
+    neighbours = np.stack(
+        [
+            frames[:, np.clip(ys + dy, 0, rows - 1), np.clip(xs + dx, 0, cols - 1)]
+            for dy, dx in NEIGHBOUR_OFFSETS
+        ]
+    )
+    frames = np.array(frames, dtype=np.float32)
+    frames[:, ys, xs] = np.median(neighbours, axis=0)
+    return frames
+
+
+def temporal_bin(frames: np.ndarray, factor: int) -> np.ndarray:
+    """Mean of each group of factor consecutive frames. Trailing frames that do not fill a group are dropped."""
+    factor = _as_int_factor(factor, "temporal_factor")
+    n_out = len(frames) // factor
+    frames = frames[: n_out * factor]
+    return frames.reshape(n_out, factor, *frames.shape[1:]).mean(axis=1, dtype=np.float32)
+
+
+def spatial_bin(frames: np.ndarray, factor: int) -> np.ndarray:
+    """Mean over factor x factor pixel blocks. Edge pixels that do not fill a block are dropped."""
+    factor = _as_int_factor(factor, "spatial_factor")
+    n, rows, cols = frames.shape
+    rows_out, cols_out = rows // factor, cols // factor
+    frames = frames[:, : rows_out * factor, : cols_out * factor]
+    return frames.reshape(n, rows_out, factor, cols_out, factor).mean(
+        axis=(2, 4), dtype=np.float32
+    )
+
+
+def downsample(
+    frames: np.ndarray,
+    temporal_factor: int = 2,
+    spatial_factor: int = 4,
+    crop_rect: Optional[Sequence[int]] = None,
+    fix_defective_pixels: bool = False,
+    defective_mask: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Crop, fix defective pixels, then spatially and temporally downsample a chunk of frames.
+
+    The chunk length should be a multiple of temporal_factor so consecutive
+    chunks bin the same frames as the whole movie would. When processing a
+    movie in chunks, pass the defective_mask of the whole movie (see
+    movie_defective_pixel_mask); without it the mask is found from the chunk.
+    """
+    frames = crop(frames, crop_rect)
+    if fix_defective_pixels:
+        if defective_mask is None:
+            defective_mask = defective_pixel_mask(frames)
+        frames = fix_defective(frames, defective_mask)
+    return temporal_bin(spatial_bin(frames, spatial_factor), temporal_factor)
+
+
+def downsampled_dtype(dtype) -> np.dtype:
+    """dtype of the downsampled movie: integer movies keep their dtype, others become float32."""
+    dtype = np.dtype(dtype)
+    return dtype if np.issubdtype(dtype, np.integer) else np.dtype(np.float32)
+
+
+def cast_frames(frames: np.ndarray, dtype: np.dtype) -> np.ndarray:
+    """Cast downsampled frames to dtype, rounding to the nearest integer for integer types."""
+    if np.issubdtype(dtype, np.integer):
+        frames = np.rint(frames)
+    return frames.astype(dtype, copy=False)
+
+
+def downsample_movie(
+    in_vid: Path,
+    out_vid: Path,
+    temporal_factor: int = 2,
+    spatial_factor: int = 4,
+    crop_rect: Optional[Sequence[int]] = None,
+    fix_defective_pixels: bool = True,
+    frames_per_chunk: int = 200,
+) -> int:
+    """Downsample a movie chunk by chunk.
+
+    Integer inputs are rounded back to their dtype, so for integer factors the
+    output equals the isx block means to within 0.5 (rounding). Float inputs
+    are written as float32 and agree to float32 precision. Frames and edge
+    pixels that do not fill a bin are dropped. Defective pixels are found
+    once for the whole movie, from a sample of its frames.
+
+    Args:
+        in_vid (Path): Input movie.
+        out_vid (Path): Output movie.
+        temporal_factor (int, optional): Temporal downsample factor. Defaults to 2.
+        spatial_factor (int, optional): Spatial downsample factor. Defaults to 4.
+        crop_rect (Optional[Sequence[int]], optional): [top, left, bottom, right] crop rectangle. Defaults to None.
+        fix_defective_pixels (bool, optional): Fix defective pixels. Defaults to True.
+        frames_per_chunk (int, optional): Number of input frames processed at a time. Defaults to 200.
+
+    Returns:
+        int: Number of input frames processed.
+    """
+    metadata = read_metadata(in_vid)
+    temporal_factor = _as_int_factor(temporal_factor, "temporal_factor")
+    chunk = max(frames_per_chunk // temporal_factor, 1) * temporal_factor
+    out_dtype = downsampled_dtype(metadata.dtype)
+    frame_period = (
+        metadata.frame_period * temporal_factor if metadata.frame_period else None
+    )
+
+    defective_mask = (
+        movie_defective_pixel_mask(in_vid, crop_rect, frames_per_chunk=chunk)
+        if fix_defective_pixels and metadata.n_frames
+        else None
+    )
+
+    n_read = 0
+    writer = None
+    for frames in iter_chunks(in_vid, chunk):
+        n_read += len(frames)
+        out = downsample(
+            frames, temporal_factor, spatial_factor, crop_rect, fix_defective_pixels, defective_mask
+        )
+        if len(out) == 0:
+            continue
+        if writer is None:
+            writer = MovieWriter(
+                out_vid,
+                out.shape[1:],
+                dtype=out_dtype,
+                n_frames=metadata.n_frames // temporal_factor,
+                frame_period=frame_period,
+            )
+        writer.write(cast_frames(out, out_dtype))
+    if writer is None:
+        raise ValueError(f"{in_vid} has fewer frames than the temporal factor")
+    writer.close()
+    return n_read
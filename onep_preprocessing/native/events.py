@@ -0,0 +1,225 @@
+from typing import Dict, Optional, Sequence, Tuple
+import warnings
+import numpy as np
+from scipy.ndimage import maximum_filter1d
+from .isxd import EventSet, cell_names
+
+
+EVENT_TIME_REFS = ("beginning", "maximum")
+
+
+def mad_noise(traces: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Median and median absolute deviation of each row of traces, ignoring NaNs."""
+    with warnings.catch_warnings():
+        # all NaN rows give NaN noise and no events
+        warnings.simplefilter("ignore", RuntimeWarning)
+        baseline = np.nanmedian(traces, axis=1)
+        mad = np.nanmedian(np.abs(traces - baseline[:, None]), axis=1)
+    return baseline, mad
+
+
+def min_distance_frames(tau: float, frame_period: float) -> int:
+    """Frames an event must be clear of larger values on either side, at least 1."""
+    return max(int(round(tau / frame_period)), 1)
+
+
+def candidate_peaks(traces: np.ndarray, distance: int) -> np.ndarray:
+    """Mask of the frames of each row that are the largest value within distance frames.
+
+    A frame is a candidate if it is larger than the previous distance frames
+    and at least as large as the next distance frames, so plateaus give one
+    candidate at their first frame and two candidates of a row are always
+    more than distance frames apart. NaNs are never candidates.
+
+    Args:
+        traces (np.ndarray): (cells, frames) traces.
+        distance (int): Half width of the window in frames.
+
+    Returns:
+        np.ndarray: (cells, frames) boolean mask.
+    """
+    n_cells, n_frames = traces.shape
+    values = np.where(np.isnan(traces), -np.inf, traces)
+    pad = np.full((n_cells, distance), -np.inf, dtype=values.dtype)
+    padded = np.concatenate([pad, values, pad], axis=1)
+    # window_max[:, j] is the max of padded[:, j : j + distance]
+    window_max = maximum_filter1d(
+        padded, distance, axis=1, mode="constant", cval=-np.inf, origin=-(distance // 2)
+    )
+    before = window_max[:, :n_frames]
+    after = window_max[:, distance + 1 : distance + 1 + n_frames]
+    return (values > before) & (values >= after) & np.isfinite(values)
+
+
+def rise_onsets(traces: np.ndarray) -> np.ndarray:
+    """Frame where the rise leading to each frame started, i.e. the last frame at or before it that is not above its predecessor."""
+    n_cells, n_frames = traces.shape
+    frames = np.broadcast_to(np.arange(n_frames), (n_cells, n_frames))
+    rising = np.zeros((n_cells, n_frames), dtype=bool)
+    rising[:, 1:] = traces[:, 1:] > traces[:, :-1]
+    return np.maximum.accumulate(np.where(rising, 0, frames), axis=1)
+
+
+def event_candidates(
+    traces: np.ndarray,
+    frame_period: float,
+    tau: float = 0.2,
+    event_time_ref: str = "beginning",
+    names: Optional[Sequence[str]] = None,
+    chunk_cells: int = 256,
+) -> Tuple[EventSet, np.ndarray, np.ndarray]:
+    """Every peak that could be an event, whatever the threshold.
+
+    The peaks (see candidate_peaks) and the noise of each cell do not depend
+    on the threshold, so they are found once and any number of thresholds
+    can then be applied with threshold_events. The cells are processed
+    chunk_cells at a time, each chunk with a few whole-array NumPy passes.
+
+    Args:
+        traces (np.ndarray): (cells, frames) traces, e.g. CellSet.traces.
+        frame_period (float): Time between frames in seconds.
+        tau (float, optional): Minimum time between events in seconds. Defaults to 0.2.
+        event_time_ref (str, optional): Time of an event {'beginning', 'maximum'}: the start of its rise or its peak. Defaults to "beginning".
+        names (Optional[Sequence[str]], optional): Cell names. Defaults to None (C0, C1, ...).
+        chunk_cells (int, optional): Number of cells processed at a time. Defaults to 256.
+
+    Returns:
+        Tuple[EventSet, np.ndarray, np.ndarray]: The candidates, and the median and MAD of the trace of the cell of each.
+    """
+    if event_time_ref not in EVENT_TIME_REFS:
+        raise ValueError(f"Unknown event_time_ref: {event_time_ref}. Expected one of {EVENT_TIME_REFS}")
+    n_cells = len(traces)
+    names = list(names) if names is not None else cell_names(n_cells)
+    if len(names) != n_cells:
+        raise ValueError("Expected one name per cell")
+    distance = min_distance_frames(tau, frame_period)
+
+    cells, frames, values, baselines, mads = [], [], [], [], []
+    for start in range(0, n_cells, chunk_cells):
+        chunk = np.asarray(traces[start : start + chunk_cells], dtype=np.float32)
+        baseline, mad = mad_noise(chunk)
+        cell, peak = np.nonzero(candidate_peaks(chunk, distance))
+        values.append(chunk[cell, peak])
+        baselines.append(baseline[cell])
+        mads.append(mad[cell])
+        if event_time_ref == "beginning":
+            peak = rise_onsets(chunk)[cell, peak]
+        cells.append(cell + start)
+        frames.append(peak)
+
+    def _concat(arrays, dtype):
+        return np.concatenate(arrays).astype(dtype, copy=False) if arrays else np.zeros(0, dtype=dtype)
+
+    candidates = EventSet(
+        cell=_concat(cells, np.int64),
+        times=_concat(frames, np.int64) * float(frame_period),
+        values=_concat(values, np.float32),
+        names=names,
+    )
+    return candidates, _concat(baselines, np.float32), _concat(mads, np.float32)
+
+
+def passes_threshold(
+    candidates: EventSet, baseline: np.ndarray, mad: np.ndarray, threshold: float
+) -> np.ndarray:
+    """Mask of the candidates whose amplitude is above median + threshold * MAD of their cell."""
+    return candidates.values > baseline + threshold * mad
+
+
+def threshold_events(
+    candidates: EventSet, baseline: np.ndarray, mad: np.ndarray, threshold: float
+) -> EventSet:
+    """The events of one threshold, from the output of event_candidates."""
+    return candidates.select(passes_threshold(candidates, baseline, mad, threshold))
+
+
+def detect_events(
+    traces: np.ndarray,
+    frame_period: float,
+    threshold: float = 5,
+    tau: float = 0.2,
+    event_time_ref: str = "beginning",
+    names: Optional[Sequence[str]] = None,
+    chunk_cells: int = 256,
+) -> EventSet:
+    """Detect calcium events in the traces of all cells at once.
+
+    Follows the parameters of isx.event_detection. The noise of each cell is
+    the median absolute deviation (MAD) of its trace, and an event is a peak
+    that rises above median + threshold * MAD and is the largest value within
+    tau seconds on either side (see candidate_peaks). Only positive
+    transients are detected. The amplitude of an event is the trace value at
+    the peak.
+
+    Args:
+        traces (np.ndarray): (cells, frames) traces, e.g. CellSet.traces.
+        frame_period (float): Time between frames in seconds.
+        threshold (float, optional): Threshold in MADs above the median. Defaults to 5.
+        tau (float, optional): Minimum time between events in seconds. Defaults to 0.2.
+        event_time_ref (str, optional): Time of an event {'beginning', 'maximum'}: the start of its rise or its peak. Defaults to "beginning".
+        names (Optional[Sequence[str]], optional): Cell names. Defaults to None (C0, C1, ...).
+        chunk_cells (int, optional): Number of cells processed at a time. Defaults to 256.
+
+    Returns:
+        EventSet: The events, sorted by cell, then time.
+    """
+    candidates, baseline, mad = event_candidates(
+        traces, frame_period, tau, event_time_ref, names, chunk_cells
+    )
+    return threshold_events(candidates, baseline, mad, threshold)
+
+
+def detect_events_thresholds(
+    traces: np.ndarray,
+    frame_period: float,
+    thresholds: Sequence[float],
+    tau: float = 0.2,
+    event_time_ref: str = "beginning",
+    names: Optional[Sequence[str]] = None,
+    chunk_cells: int = 256,
+) -> Dict[float, EventSet]:
+    """detect_events for several thresholds, finding the peaks and noise once.
+
+    Each threshold only costs a comparison over the candidates, and the
+    events of each are exactly those of detect_events with that threshold.
+
+    Args:
+        traces (np.ndarray): (cells, frames) traces, e.g. CellSet.traces.
+        frame_period (float): Time between frames in seconds.
+        thresholds (Sequence[float]): Thresholds in MADs above the median.
+        tau (float, optional): Minimum time between events in seconds. Defaults to 0.2.
+        event_time_ref (str, optional): Time of an event {'beginning', 'maximum'}. Defaults to "beginning".
+        names (Optional[Sequence[str]], optional): Cell names. Defaults to None (C0, C1, ...).
+        chunk_cells (int, optional): Number of cells processed at a time. Defaults to 256.
+
+    Returns:
+        Dict[float, EventSet]: The events of each threshold.
+    """
+    candidates, baseline, mad = event_candidates(
+        traces, frame_period, tau, event_time_ref, names, chunk_cells
+    )
+    return {t: threshold_events(candidates, baseline, mad, t) for t in thresholds}
+
+
+def max_thresholds(
+    candidates: EventSet, baseline: np.ndarray, mad: np.ndarray, thresholds: Sequence[float]
+) -> Tuple[EventSet, np.ndarray]:
+    """The events of the lowest threshold, with the highest threshold each one passes.
+
+    The events of threshold t are those whose highest threshold is >= t, so
+    one table holds the events of every threshold.
+
+    Args:
+        candidates (EventSet): Output of event_candidates.
+        baseline (np.ndarray): Output of event_candidates.
+        mad (np.ndarray): Output of event_candidates.
+        thresholds (Sequence[float]): Thresholds in MADs above the median.
+
+    Returns:
+        Tuple[EventSet, np.ndarray]: The events and the highest threshold of each.
+    """
+    highest = np.full(candidates.n_events, np.nan)
+    for threshold in sorted(thresholds):
+        highest[passes_threshold(candidates, baseline, mad, threshold)] = threshold
+    passed = ~np.isnan(highest)
+    return candidates.select(passed), highest[passed]
@@ -0,0 +1,30 @@
+from typing import Tuple
+import numpy as np
+
+try:
+    from scipy import fft as _fft
+
+    # scipy.fft keeps float32 precision and can thread over the batch axis
+    _THREADED = True
+except ImportError:
+    _fft = np.fft
+    _THREADED = False
+
+
+def _kwargs(workers: int) -> dict:
+    return {"workers": workers} if _THREADED else {}
+
+
+def rfft2(frames: np.ndarray, workers: int = -1) -> np.ndarray:
+    """Real 2D FFT over the last two axes, batched over any leading axes.
+
+    Args:
+        frames (np.ndarray): Real input.
+        workers (int, optional): Threads used by scipy.fft, -1 for all cpus. Ignored by the numpy fallback. Defaults to -1.
+    """
+    return _fft.rfft2(np.asarray(frames, dtype=np.float32), **_kwargs(workers))
+
+
+def irfft2(spectra: np.ndarray, shape: Tuple[int, int], workers: int = -1) -> np.ndarray:
+    """Inverse of rfft2 for frames of the given (rows, cols), as float32."""
+    return _fft.irfft2(spectra, s=shape, **_kwargs(workers)).astype(np.float32, copy=False)
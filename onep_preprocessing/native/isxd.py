@@ -0,0 +1,441 @@
+from dataclasses import dataclass
+from fractions import Fraction
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+import json
+import struct
+import numpy as np
+
+
+# Layout shared by all .isxd files: the data, then a JSON header, a null
+# byte and the size of the JSON header in bytes as a little endian uint64.
+FOOTER_SIZE_FORMAT = "<Q"
+FOOTER_SIZE_SIZE = struct.calcsize(FOOTER_SIZE_FORMAT)
+
+TYPE_MOVIE = 0
+TYPE_CELLSET = 1
+TYPE_EVENTS = 5
+
+CELL_STATUSES = ("accepted", "undecided", "rejected")
+
+# dataType of movie headers
+DATA_TYPES = {0: "<u2", 1: "<f4", 2: "u1"}
+# one packet per event: time since the start in microseconds, cell index and value
+EVENT_PACKET = np.dtype([("offset", "<u8"), ("signal", "<u8"), ("value", "<f4")])
+# rows of metadata stored above and below each frame when hasFrameHeaderFooter is set
+FRAME_HEADER_ROWS = 2
+FRAME_FOOTER_ROWS = 2
+
+
+def _rational(value: float, max_denominator: int = 1000000) -> dict:
+    fraction = Fraction(value).limit_denominator(max_denominator)
+    return {"num": fraction.numerator, "den": fraction.denominator}
+
+
+def _from_rational(value: dict) -> float:
+    return value["num"] / value["den"]
+
+
+def timing_info(n_frames: int, frame_period: Optional[float] = None, start: float = 0) -> dict:
+    """JSON timing block of an .isxd file. An unknown frame period is stored as 1 s."""
+    return {
+        "start": {"secsSinceEpoch": _rational(start), "utcOffset": 0},
+        "period": _rational(frame_period or 1.0),
+        "numTimes": int(n_frames),
+        "dropped": [],
+        "cropped": [],
+        "blank": [],
+    }
+
+
+def spacing_info(frame_shape: Tuple[int, int], pixel_size: float = 1) -> dict:
+    """JSON spacing block of an .isxd file for (rows, cols) frames."""
+    rows, cols = frame_shape
+    return {
+        "numPixels": {"x": int(cols), "y": int(rows)},
+        "pixelSize": {"x": _rational(pixel_size), "y": _rational(pixel_size)},
+        "topLeft": {"x": _rational(0), "y": _rational(0)},
+    }
+
+
+def frame_period_from_header(header: dict) -> float:
+    return _from_rational(header["timingInfo"]["period"])
+
+
+def frame_shape_from_header(header: dict) -> Tuple[int, int]:
+    num_pixels = header["spacingInfo"]["numPixels"]
+    return num_pixels["y"], num_pixels["x"]
+
+
+def write_footer(f, header: dict) -> None:
+    """Append the JSON header of an .isxd file at the current position of f."""
+    text = json.dumps(header).encode("utf-8")
+    f.write(text)
+    f.write(b"\0")
+    f.write(struct.pack(FOOTER_SIZE_FORMAT, len(text)))
+
+
+def read_header(path: Path) -> Tuple[dict, int]:
+    """Read the JSON header of an .isxd file.
+
+    Args:
+        path (Path): Path to the .isxd file.
+
+    Returns:
+        Tuple[dict, int]: The header and its offset, which is where the data ends.
+    """
+    with open(path, "rb") as f:
+        f.seek(-FOOTER_SIZE_SIZE, 2)
+        end = f.tell()
+        (size,) = struct.unpack(FOOTER_SIZE_FORMAT, f.read(FOOTER_SIZE_SIZE))
+        # the JSON header is followed by a null byte
+        offset = end - 1 - size
+        if offset < 0:
+            raise ValueError(f"{path} does not have a valid .isxd footer")
+        f.seek(offset)
+        text = f.read(size)
+    try:
+        return json.loads(text.decode("utf-8")), offset
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError(f"{path} does not have a valid .isxd footer") from None
+
+
+def cell_names(n_cells: int) -> list:
+    """Cell names C0, C1, ... zero padded to the same width, as isx names them."""
+    width = len(str(max(n_cells - 1, 0)))
+    return [f"C{i:0{width}d}" for i in range(n_cells)]
+
+
+def write_cellset(
+    path: Path,
+    footprints: np.ndarray,
+    traces: np.ndarray,
+    frame_period: Optional[float] = None,
+    names: Optional[Sequence[str]] = None,
+    statuses: Optional[Sequence[str]] = None,
+) -> None:
+    """Write a cellset in the .isxd layout.
+
+    Each cell is stored as its float32 footprint image followed by its
+    float32 trace, then the JSON header follows the last cell.
+
+    Args:
+        path (Path): Output .isxd path.
+        footprints (np.ndarray): (cells, rows, cols) spatial footprints.
+        traces (np.ndarray): (cells, frames) traces.
+        frame_period (Optional[float], optional): Time between frames in seconds. Defaults to None.
+        names (Optional[Sequence[str]], optional): Cell names. Defaults to None (C0, C1, ...).
+        statuses (Optional[Sequence[str]], optional): Cell statuses {'accepted', 'undecided', 'rejected'}. Defaults to None (all accepted).
+    """
+    footprints = np.asarray(footprints, dtype="<f4")
+    traces = np.asarray(traces, dtype="<f4")
+    n_cells = len(footprints)
+    if footprints.ndim != 3 or traces.ndim != 2 or len(traces) != n_cells:
+        raise ValueError("Expected (cells, rows, cols) footprints and (cells, frames) traces")
+    names = list(names) if names is not None else cell_names(n_cells)
+    statuses = list(statuses) if statuses is not None else ["accepted"] * n_cells
+    if len(names) != n_cells or len(statuses) != n_cells:
+        raise ValueError("Expected one name and status per cell")
+
+    # the keys isx writes for a cellset; colors are packed RGBA, opaque white
+    header = {
+        "type": TYPE_CELLSET,
+        "dataType": "float",
+        "timingInfo": timing_info(traces.shape[1], frame_period),
+        "spacingInfo": spacing_info(footprints.shape[1:]),
+        "CellNames": names,
+        "CellStatuses": [CELL_STATUSES.index(s) for s in statuses],
+        "CellColors": [0xFFFFFFFF] * n_cells,
+        "CellActivity": [True] * n_cells,
+        "CentroidDistances": [],
+        "Matches": [],
+        "PairScores": [],
+        "SizeGlobalCS": 0,
+        "cellMetrics": None,
+        "efocusValues": [0],
+        "extraProperties": None,
+        "isRoiSet": False,
+        "producer": {"name": "onep_preprocessing"},
+        "fileVersion": 5,
+    }
+    with open(path, "wb") as f:
+        for footprint, trace in zip(footprints, traces):
+            f.write(footprint.tobytes())
+            f.write(trace.tobytes())
+        write_footer(f, header)
+
+
+def data_type_code(dtype) -> int:
+    """dataType of a movie header for a NumPy dtype."""
+    dtype = np.dtype(dtype).newbyteorder("<") if np.dtype(dtype).itemsize > 1 else np.dtype(dtype)
+    for code, name in DATA_TYPES.items():
+        if np.dtype(name) == dtype:
+            return code
+    raise ValueError(f".isxd movies store uint16, float32 or uint8 pixels, not {dtype}")
+
+
+def movie_header(
+    n_frames: int,
+    frame_shape: Tuple[int, int],
+    dtype,
+    frame_period: Optional[float] = None,
+) -> dict:
+    """JSON header of an .isxd movie of contiguous frames without frame headers."""
+    return {
+        "type": TYPE_MOVIE,
+        "mosaic": True,
+        "dataType": data_type_code(dtype),
+        "hasFrameHeaderFooter": False,
+        "timingInfo": timing_info(n_frames, frame_period),
+        "spacingInfo": spacing_info(frame_shape),
+        "producer": {"name": "onep_preprocessing"},
+        "fileVersion": 1,
+    }
+
+
+def movie_dtype(header: dict) -> np.dtype:
+    try:
+        return np.dtype(DATA_TYPES[header.get("dataType", 1)])
+    except KeyError:
+        raise ValueError(f"Unsupported .isxd dataType: {header['dataType']}") from None
+
+
+def movie_layout(path: Path) -> Tuple[dict, int, np.dtype, Tuple[int, int], int]:
+    """Where the frames of an .isxd movie are, from its header alone.
+
+    Args:
+        path (Path): Path to the .isxd movie.
+
+    Returns:
+        Tuple[dict, int, np.dtype, Tuple[int, int], int]: The header, the number of stored frames, the pixel dtype, the (rows, cols) of a frame and the rows stored per frame including any frame header and footer.
+    """
+    header, data_end = read_header(path)
+    if header.get("type", TYPE_MOVIE) != TYPE_MOVIE:
+        raise ValueError(f"{path} is not a movie")
+    dtype = movie_dtype(header)
+    rows, cols = frame_shape_from_header(header)
+    stored_rows = rows
+    if header.get("hasFrameHeaderFooter", False):
+        stored_rows += FRAME_HEADER_ROWS + FRAME_FOOTER_ROWS
+    frame_bytes = stored_rows * cols * dtype.itemsize
+    timing = header["timingInfo"]
+    n_frames = timing["numTimes"]
+    n_stored = data_end // frame_bytes if frame_bytes else 0
+    if n_stored != n_frames:
+        # dropped frames take no space in the file
+        if n_stored != n_frames - len(timing.get("dropped", [])):
+            raise ValueError(
+                f"{path} holds {n_stored} frames but its header lists {n_frames}"
+            )
+        n_frames = n_stored
+    return header, n_frames, dtype, (rows, cols), stored_rows
+
+
+def open_movie(path: Path, mode: str = "r") -> np.ndarray:
+    """Open an .isxd movie as a (frames, rows, cols) memory map without reading it.
+
+    Frame headers and footers, if present, are sliced off the view, so no
+    pixel data is copied either way.
+
+    Args:
+        path (Path): Path to the .isxd movie.
+        mode (str, optional): Memory map mode {"r", "r+"}. Defaults to "r".
+
+    Returns:
+        np.ndarray: Memory mapped view of the movie.
+    """
+    _, n_frames, dtype, (rows, cols), stored_rows = movie_layout(path)
+    if n_frames == 0:
+        return np.zeros((0, rows, cols), dtype=dtype)
+    data = np.memmap(path, dtype=dtype, mode=mode, offset=0, shape=(n_frames, stored_rows, cols))
+    if stored_rows != rows:
+        data = data[:, FRAME_HEADER_ROWS : FRAME_HEADER_ROWS + rows, :]
+    return data
+
+
+def dropped_frames(header: dict) -> list:
+    """Indices of the frames the acquisition dropped."""
+    return list(header["timingInfo"].get("dropped", []))
+
+
+@dataclass
+class CellSet:
+    """
+    Contents of an .isxd cellset.
+
+    Args:
+        traces (np.ndarray): (cells, frames) float32 traces. Dropped frames are NaN.
+        footprints (np.ndarray): (cells, rows, cols) float32 spatial footprints.
+        timestamps (np.ndarray): Time of each frame in seconds from the start of the recording.
+        names (List[str]): Name of each cell.
+        statuses (List[str]): Status of each cell {'accepted', 'undecided', 'rejected'}.
+        frame_period (float): Time between frames in seconds.
+    """
+
+    traces: np.ndarray
+    footprints: np.ndarray
+    timestamps: np.ndarray
+    names: List[str]
+    statuses: List[str]
+    frame_period: float
+
+    @property
+    def n_cells(self) -> int:
+        return len(self.names)
+
+
+def read_cellset(path: Path, mmap: bool = True) -> CellSet:
+    """Read an .isxd cellset without exporting it.
+
+    The inverse of write_cellset: each cell is read as its footprint image
+    followed by its trace. With mmap the traces and footprints are views of
+    one read only memory map, so nothing is read until it is used.
+
+    Args:
+        path (Path): Path to the .isxd cellset.
+        mmap (bool, optional): Memory map the file instead of reading it. Defaults to True.
+
+    Returns:
+        CellSet: The traces, footprints, timestamps, names and statuses.
+    """
+    header, data_end = read_header(path)
+    if header.get("type") != TYPE_CELLSET:
+        raise ValueError(f"{path} is not a cellset")
+    rows, cols = frame_shape_from_header(header)
+    n_frames = header["timingInfo"]["numTimes"]
+    names = list(header.get("CellNames", []))
+    n_cells = len(names)
+    cell_size = rows * cols + n_frames
+    if data_end != n_cells * cell_size * 4:
+        raise ValueError(
+            f"{path} holds {data_end} bytes of cells, expected {n_cells} cells of {cell_size} float32"
+        )
+    if n_cells == 0:
+        data = np.zeros((0, cell_size), dtype="<f4")
+    elif mmap:
+        data = np.memmap(path, dtype="<f4", mode="r", shape=(n_cells, cell_size))
+    else:
+        data = np.fromfile(path, dtype="<f4", count=n_cells * cell_size).reshape(n_cells, cell_size)
+    statuses = [CELL_STATUSES[s] for s in header.get("CellStatuses", [0] * n_cells)]
+    frame_period = frame_period_from_header(header)
+    return CellSet(
+        traces=data[:, rows * cols :],
+        footprints=data[:, : rows * cols].reshape(n_cells, rows, cols),
+        timestamps=np.arange(n_frames, dtype=np.float64) * frame_period,
+        names=names,
+        statuses=statuses,
+        frame_period=frame_period,
+    )
+
+
+@dataclass
+class EventSet:
+    """
+    Events of every cell, as a sparse table sorted by cell, then time.
+
+    Args:
+        cell (np.ndarray): Index of the cell of each event into names.
+        times (np.ndarray): Time of each event in seconds from the start of the recording.
+        values (np.ndarray): float32 amplitude of each event.
+        names (List[str]): Name of each cell.
+    """
+
+    cell: np.ndarray
+    times: np.ndarray
+    values: np.ndarray
+    names: List[str]
+
+    @property
+    def n_events(self) -> int:
+        return len(self.cell)
+
+    def counts(self) -> np.ndarray:
+        """Number of events of each cell."""
+        return np.bincount(self.cell, minlength=len(self.names))
+
+    def select(self, mask: np.ndarray) -> "EventSet":
+        """The events where mask is True."""
+        return EventSet(
+            cell=self.cell[mask], times=self.times[mask], values=self.values[mask], names=self.names
+        )
+
+
+def write_eventset(
+    path: Path, events: EventSet, n_frames: int, frame_period: Optional[float] = None
+) -> None:
+    """Write events in the .isxd layout of isx.EventSet.
+
+    The events are stored as EVENT_PACKET records, cell by cell and in time
+    order within a cell, followed by the JSON header, which lists the cells
+    ("channel list") with their number of events and the offset of their
+    first event.
+
+    Args:
+        path (Path): Output .isxd path.
+        events (EventSet): The events.
+        n_frames (int): Number of frames of the traces the events were detected on.
+        frame_period (Optional[float], optional): Time between frames in seconds. Defaults to None.
+    """
+    packets = np.empty(events.n_events, dtype=EVENT_PACKET)
+    packets["offset"] = np.round(np.asarray(events.times) * 1e6)
+    packets["signal"] = events.cell
+    packets["value"] = events.values
+    packets = packets[np.lexsort((packets["offset"], packets["signal"]))]
+    n_cells = len(events.names)
+    counts = np.bincount(packets["signal"].astype(np.int64), minlength=n_cells)
+    if len(counts) > n_cells:
+        raise ValueError("Events of cells missing from events.names")
+    # offset of the first event of each cell, 0 for cells without events
+    start_offsets = np.zeros(n_cells, dtype=np.uint64)
+    has_events = counts > 0
+    start_offsets[has_events] = packets["offset"][(np.cumsum(counts) - counts)[has_events]]
+    timing = timing_info(n_frames, frame_period)
+    duration = Fraction(timing["period"]["num"], timing["period"]["den"]) * int(n_frames)
+    header = {
+        "type": TYPE_EVENTS,
+        "channel list": list(events.names),
+        "extraProperties": None,
+        "fileType": 1,
+        "global times": [
+            timing["start"],
+            {"secsSinceEpoch": {"num": duration.numerator, "den": duration.denominator}, "utcOffset": 0},
+        ],
+        "metrics": None,
+        "numSamples": counts.tolist(),
+        "producer": {"name": "onep_preprocessing"},
+        "signalSteps": [timing["period"]] * n_cells,
+        "signalTypes": [0] * n_cells,
+        "startOffsets": [int(offset) for offset in start_offsets],
+        "fileVersion": 2,
+    }
+    with open(path, "wb") as f:
+        f.write(packets.tobytes())
+        write_footer(f, header)
+
+
+def read_eventset(path: Path) -> EventSet:
+    """Read an .isxd eventset, as written by isx.EventSet or write_eventset.
+
+    Args:
+        path (Path): Path to the .isxd eventset.
+
+    Returns:
+        EventSet: The events, sorted by cell, then time.
+    """
+    header, data_end = read_header(path)
+    if header.get("type") != TYPE_EVENTS:
+        raise ValueError(f"{path} is not an eventset")
+    if data_end % EVENT_PACKET.itemsize:
+        raise ValueError(f"{path} holds {data_end} bytes of events, not a whole number of packets")
+    packets = np.fromfile(path, dtype=EVENT_PACKET, count=data_end // EVENT_PACKET.itemsize)
+    names = list(header.get("channel list", []))
+    cell = packets["signal"].astype(np.int64)
+    if len(cell) and cell.max() >= len(names):
+        raise ValueError(f"{path} has events of cells missing from its header")
+    order = np.lexsort((packets["offset"], cell))
+    return EventSet(
+        cell=cell[order],
+        times=packets["offset"][order] / 1e6,
+        values=packets["value"][order],
+        names=names,
+    )
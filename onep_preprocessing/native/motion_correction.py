@@ -0,0 +1,423 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+import os
+import numpy as np
+from .fft import rfft2, irfft2
+from .movie_io import MovieWriter, iter_chunks, open_movie, read_metadata
+from .spatial_filter import bandpass_kernel
+
+
+def registration_spectrum(
+    frames: np.ndarray,
+    low_bandpass_cutoff: float,
+    high_bandpass_cutoff: float,
+    workers: int = -1,
+) -> np.ndarray:
+    """rfft2 of frames after the registration bandpass, used for phase correlation."""
+    kernel = bandpass_kernel(np.shape(frames)[-2:], low_bandpass_cutoff, high_bandpass_cutoff)
+    return rfft2(frames, workers=workers) * kernel
+
+
+def roi_mask(frame_shape: Tuple[int, int], roi: Sequence[Sequence[float]]) -> np.ndarray:
+    """Boolean mask of the pixels inside a polygon ROI.
+
+    Args:
+        frame_shape (Tuple[int, int]): (rows, cols) of the frames.
+        roi (Sequence[Sequence[float]]): Polygon vertices, one (x, y) pixel coordinate per row.
+
+    Returns:
+        np.ndarray: (rows, cols) mask, True inside the polygon.
+    """
+    vertices = np.asarray(roi, dtype=float)
+    if vertices.ndim != 2 or vertices.shape[1] != 2 or len(vertices) < 3:
+        raise ValueError("roi must have at least 3 (x, y) vertices")
+    rows, cols = frame_shape
+    y, x = np.mgrid[:rows, :cols]
+    inside = np.zeros(frame_shape, dtype=bool)
+    # even-odd rule, one vectorised pass per polygon edge
+    for (x0, y0), (x1, y1) in zip(vertices, np.roll(vertices, -1, axis=0)):
+        crosses = (y0 > y) != (y1 > y)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_cross = (x1 - x0) * (y - y0) / (y1 - y0) + x0
+        inside ^= crosses & (x < x_cross)
+    return inside
+
+
+def roi_window(mask: np.ndarray, taper: float = 4) -> np.ndarray:
+    """Smooth float32 window that is zero outside a ROI mask.
+
+    Multiplying frames by the hard mask would add a static edge that
+    dominates the phase correlation, so the mask is tapered with a Gaussian
+    of width taper pixels.
+    """
+    mask = np.asarray(mask, dtype=np.float32)
+    if taper <= 0:
+        return mask
+    lowpass = bandpass_kernel(mask.shape, 0, 1 / (2 * np.pi * taper))
+    return np.clip(irfft2(rfft2(mask) * lowpass, mask.shape) * mask, 0, 1)
+
+
+def _signed(index: np.ndarray, size: int) -> np.ndarray:
+    return np.where(index > size // 2, index - size, index)
+
+
+def _refine(
+    cross_power: np.ndarray,
+    coarse: np.ndarray,
+    frame_shape: Tuple[int, int],
+    upsample_factor: int,
+) -> np.ndarray:
+    # matrix multiply DFT of the cross power spectrum on a 1/upsample_factor
+    # grid within one pixel of the coarse peak (Guizar-Sicairos et al. 2008)
+    rows, cols = frame_shape
+    offsets = np.arange(-upsample_factor, upsample_factor + 1) / upsample_factor
+    fy = np.fft.fftfreq(rows)
+    fx = np.fft.rfftfreq(cols)
+    weights = np.full(len(fx), 2.0)
+    weights[0] = 1
+    if cols % 2 == 0:
+        weights[-1] = 1
+
+    ys = coarse[:, 0, None] + offsets[None, :]
+    xs = coarse[:, 1, None] + offsets[None, :]
+    kernel_y = np.exp(2j * np.pi * fy[None, :, None] * ys[:, None, :])
+    kernel_x = weights[None, :, None] * np.exp(2j * np.pi * fx[None, :, None] * xs[:, None, :])
+    local = np.real(kernel_y.transpose(0, 2, 1) @ cross_power @ kernel_x)
+
+    n, size = len(local), len(offsets)
+    peak_y, peak_x = np.unravel_index(local.reshape(n, -1).argmax(axis=1), (size, size))
+    return np.stack([ys[np.arange(n), peak_y], xs[np.arange(n), peak_x]], axis=1)
+
+
+def estimate_shifts(
+    frame_spectra: np.ndarray,
+    reference_spectrum: np.ndarray,
+    frame_shape: Tuple[int, int],
+    max_translation: Optional[float] = None,
+    upsample_factor: int = 10,
+    normalize: bool = True,
+    workers: int = -1,
+) -> np.ndarray:
+    """Estimate the translation of each frame relative to a reference by phase correlation.
+
+    Args:
+        frame_spectra (np.ndarray): (frames, rows, cols // 2 + 1) registration spectra of the frames.
+        reference_spectrum (np.ndarray): Registration spectrum of the reference, (rows, cols // 2 + 1) or one per frame.
+        frame_shape (Tuple[int, int]): (rows, cols) of the frames.
+        max_translation (Optional[float], optional): Maximum translation searched, in pixels. Defaults to None (unbounded).
+        upsample_factor (int, optional): Sub-pixel precision is 1 / upsample_factor. 1 disables the refinement. Defaults to 10.
+        normalize (bool, optional): Whiten the cross power spectrum (phase correlation). If False, the cross correlation of the bandpassed frames is used, which is robust to masked frames. Defaults to True.
+        workers (int, optional): FFT threads. Defaults to -1.
+
+    Returns:
+        np.ndarray: (frames, 2) float array of (dy, dx). Shifting a frame by -(dy, dx) aligns it to the reference.
+    """
+    rows, cols = frame_shape
+    cross_power = frame_spectra * np.conj(reference_spectrum)
+    if normalize:
+        cross_power /= np.abs(cross_power) + 1e-12
+    corr = irfft2(cross_power, frame_shape, workers=workers)
+
+    if max_translation is not None:
+        dy = np.fft.fftfreq(rows) * rows
+        dx = np.fft.fftfreq(cols) * cols
+        outside = (np.abs(dy)[:, None] > max_translation) | (
+            np.abs(dx)[None, :] > max_translation
+        )
+        corr[:, outside] = -np.inf
+
+    n = len(corr)
+    py, px = np.unravel_index(corr.reshape(n, -1).argmax(axis=1), frame_shape)
+    coarse = np.stack([_signed(py, rows), _signed(px, cols)], axis=1).astype(float)
+    if upsample_factor <= 1:
+        return coarse
+    shifts = _refine(cross_power, coarse, frame_shape, upsample_factor)
+    if max_translation is not None:
+        shifts = np.clip(shifts, -max_translation, max_translation)
+    return shifts
+
+
+def apply_shifts(
+    frames: np.ndarray, shifts: np.ndarray, fill_value: float = 0, workers: int = -1
+) -> np.ndarray:
+    """Translate each frame by -shift with a Fourier shift.
+
+    Pixels that wrap around the frame edge are set to fill_value.
+
+    Args:
+        frames (np.ndarray): (frames, rows, cols) array.
+        shifts (np.ndarray): (frames, 2) array of (dy, dx) as returned by estimate_shifts.
+        fill_value (float, optional): Value of pixels shifted in from outside the frame. Defaults to 0.
+        workers (int, optional): FFT threads. Defaults to -1.
+
+    Returns:
+        np.ndarray: Registered float32 frames.
+    """
+    frames = np.asarray(frames, dtype=np.float32)
+    shape = frames.shape[-2:]
+    rows, cols = shape
+    fy = np.fft.fftfreq(rows)[None, :, None]
+    fx = np.fft.rfftfreq(cols)[None, None, :]
+    sy = -shifts[:, 0][:, None, None]
+    sx = -shifts[:, 1][:, None, None]
+    phase = np.exp(-2j * np.pi * (fy * sy + fx * sx)).astype(np.complex64)
+    out = irfft2(rfft2(frames, workers=workers) * phase, shape, workers=workers)
+
+    for frame, (dy, dx) in zip(out, -shifts):
+        if dy > 0:
+            frame[: int(np.ceil(dy))] = fill_value
+        elif dy < 0:
+            frame[rows + int(np.floor(dy)) :] = fill_value
+        if dx > 0:
+            frame[:, : int(np.ceil(dx))] = fill_value
+        elif dx < 0:
+            frame[:, cols + int(np.floor(dx)) :] = fill_value
+    return out
+
+
+class RigidRegistration:
+    def __init__(
+        self,
+        reference: np.ndarray,
+        max_translation: float = 20,
+        low_bandpass_cutoff: float = 0.004,
+        high_bandpass_cutoff: float = 0.016,
+        roi: Optional[Sequence[Sequence[float]]] = None,
+        global_registration_weight: float = 1,
+        upsample_factor: int = 10,
+        num_threads: Optional[int] = None,
+    ):
+        """
+        Rigid registration of consecutive chunks of a movie against a fixed reference.
+
+        The reference spectrum is computed once. Each chunk is split across a
+        thread pool, which scales because the FFTs release the GIL.
+
+        With a ROI, frames are mean subtracted and multiplied by a tapered ROI
+        window, and plain cross correlation replaces phase correlation, which
+        would otherwise lock onto the static window.
+
+        When global_registration_weight w is below 1 the previous frame is also
+        used: each frame's shift is w * (shift to the reference) + (1 - w) *
+        (shift of the previous frame + shift relative to the previous frame).
+        Both terms are estimated in parallel; only the cheap recursion over the
+        per-frame shifts is sequential.
+
+        Args:
+            reference (np.ndarray): (rows, cols) reference frame.
+            max_translation (float, optional): Maximum translation in pixels. Defaults to 20.
+            low_bandpass_cutoff (float, optional): Low cutoff of the bandpass applied before estimating translations. Defaults to 0.004.
+            high_bandpass_cutoff (float, optional): High cutoff of the bandpass applied before estimating translations. Defaults to 0.016.
+            roi (Optional[Sequence[Sequence[float]]], optional): Polygon of (x, y) vertices to estimate motion in. Defaults to None (whole frame).
+            global_registration_weight (float, optional): Weight of the reference relative to the previous frame. Defaults to 1.
+            upsample_factor (int, optional): Sub-pixel precision is 1 / upsample_factor. Defaults to 10.
+            num_threads (Optional[int], optional): Number of threads. Defaults to None (number of cpus).
+        """
+        if not 0 <= global_registration_weight <= 1:
+            raise ValueError("global_registration_weight must be between 0 and 1")
+        reference = np.asarray(reference, dtype=np.float32)
+        self.frame_shape = reference.shape
+        self.max_translation = max_translation
+        self.low_bandpass_cutoff = low_bandpass_cutoff
+        self.high_bandpass_cutoff = high_bandpass_cutoff
+        self.global_registration_weight = global_registration_weight
+        self.upsample_factor = upsample_factor
+        self.num_threads = num_threads or os.cpu_count() or 1
+        self.mask = roi_mask(self.frame_shape, roi) if roi is not None else None
+        self.window = roi_window(self.mask) if self.mask is not None else None
+        self._pool = ThreadPoolExecutor(max_workers=self.num_threads)
+        self._workers = 1 if self.num_threads > 1 else -1
+        self.reference_spectrum = self._spectra(reference[None])[0]
+        self._last_spectrum: Optional[np.ndarray] = None
+        self._last_shift: Optional[np.ndarray] = None
+
+    def _spectra(self, frames: np.ndarray) -> np.ndarray:
+        if self.mask is not None:
+            mean = frames[:, self.mask].mean(axis=1)[:, None, None]
+            frames = (frames - mean) * self.window
+        return registration_spectrum(
+            frames, self.low_bandpass_cutoff, self.high_bandpass_cutoff, workers=self._workers
+        )
+
+    def _estimate(self, spectra: np.ndarray, reference: np.ndarray) -> np.ndarray:
+        return estimate_shifts(
+            spectra,
+            reference,
+            self.frame_shape,
+            max_translation=self.max_translation,
+            upsample_factor=self.upsample_factor,
+            normalize=self.mask is None,
+            workers=self._workers,
+        )
+
+    def _map(self, func: Callable[..., np.ndarray], *arrays: np.ndarray) -> np.ndarray:
+        n = len(arrays[0])
+        bounds = np.linspace(0, n, min(self.num_threads, n) + 1).astype(int)
+        parts = [[a[s:e] for a in arrays] for s, e in zip(bounds[:-1], bounds[1:])]
+        return np.concatenate(list(self._pool.map(lambda p: func(*p), parts)))
+
+    def estimate(self, frames: np.ndarray) -> np.ndarray:
+        """Estimate the shifts of the next chunk of frames.
+
+        Args:
+            frames (np.ndarray): (frames, rows, cols) chunk.
+
+        Returns:
+            np.ndarray: (frames, 2) array of (dy, dx).
+        """
+        if len(frames) == 0:
+            return np.zeros((0, 2))
+        spectra = self._map(self._spectra, np.asarray(frames, dtype=np.float32))
+        to_reference = self._map(lambda s: self._estimate(s, self.reference_spectrum), spectra)
+        weight = self.global_registration_weight
+        if weight == 1:
+            shifts = to_reference
+        else:
+            previous = np.concatenate(
+                [self._last_spectrum[None] if self._last_spectrum is not None else spectra[:1], spectra[:-1]]
+            )
+            to_previous = self._map(self._estimate, spectra, previous)
+            shifts = np.empty_like(to_reference)
+            last = self._last_shift if self._last_shift is not None else to_reference[0]
+            for i in range(len(shifts)):
+                last = weight * to_reference[i] + (1 - weight) * (last + to_previous[i])
+                shifts[i] = last
+        self._last_spectrum = spectra[-1]
+        self._last_shift = shifts[-1]
+        return shifts
+
+    def register(self, frames: np.ndarray, fill_value: float = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """Estimate the shifts of the next chunk of frames and apply them.
+
+        Args:
+            frames (np.ndarray): (frames, rows, cols) chunk.
+            fill_value (float, optional): Value of pixels shifted in from outside the frame. Defaults to 0.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Registered float32 frames and their (dy, dx) shifts.
+        """
+        frames = np.asarray(frames, dtype=np.float32)
+        shifts = self.estimate(frames)
+        if len(frames) == 0:
+            return frames, shifts
+        registered = self._map(
+            lambda f, s: apply_shifts(f, s, fill_value=fill_value, workers=self._workers),
+            frames,
+            shifts,
+        )
+        return registered, shifts
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self) -> "RigidRegistration":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def write_translations(
+    path: Path, shifts: np.ndarray, frame_period: Optional[float] = None
+) -> None:
+    """Write translations in the isx.motion_correct csv format.
+
+    Columns are translationX, translationY (the translation applied to each
+    frame to align it to the reference) and time since the start of the movie
+    in seconds (frame index if the frame period is unknown).
+    """
+    times = np.arange(len(shifts)) * (frame_period if frame_period else 1.0)
+    table = np.column_stack([-shifts[:, 1], -shifts[:, 0], times])
+    np.savetxt(
+        path, table, delimiter=",", header="translationX,translationY,time", comments="", fmt="%.6g"
+    )
+
+
+def valid_crop_rect(shifts: np.ndarray, frame_shape: Tuple[int, int]) -> Tuple[int, int, int, int]:
+    """The x, y, width, height rectangle that holds valid pixels in every registered frame."""
+    rows, cols = frame_shape
+    if len(shifts) == 0:
+        return 0, 0, cols, rows
+    correction = -shifts
+    top = int(np.ceil(max(correction[:, 0].max(), 0)))
+    bottom = int(np.ceil(max(-correction[:, 0].min(), 0)))
+    left = int(np.ceil(max(correction[:, 1].max(), 0)))
+    right = int(np.ceil(max(-correction[:, 1].min(), 0)))
+    return left, top, max(cols - left - right, 0), max(rows - top - bottom, 0)
+
+
+def motion_correct_movie(
+    in_vid: Path,
+    out_vid: Path,
+    max_translation: float = 20,
+    low_bandpass_cutoff: float = 0.004,
+    high_bandpass_cutoff: float = 0.016,
+    roi: Optional[Sequence[Sequence[float]]] = None,
+    reference_frame_index: int = 0,
+    reference_file_name: str = "",
+    global_registration_weight: float = 1,
+    output_translation_file: Optional[Path] = None,
+    output_crop_rect_file: Optional[Path] = None,
+    frames_per_chunk: int = 200,
+    num_threads: Optional[int] = None,
+    on_chunk: Optional[Callable[[np.ndarray], Any]] = None,
+) -> int:
+    """Rigidly motion correct a movie chunk by chunk.
+
+    Args:
+        in_vid (Path): Input movie.
+        out_vid (Path): Output movie.
+        max_translation (float, optional): Maximum translation in pixels. Defaults to 20.
+        low_bandpass_cutoff (float, optional): Low cutoff of the registration bandpass. Defaults to 0.004.
+        high_bandpass_cutoff (float, optional): High cutoff of the registration bandpass. Defaults to 0.016.
+        roi (Optional[Sequence[Sequence[float]]], optional): Polygon of (x, y) vertices to estimate motion in. Defaults to None.
+        reference_frame_index (int, optional): Index of the reference frame in the input movie. Defaults to 0.
+        reference_file_name (str, optional): Movie whose first frame is used as the reference instead. Defaults to "".
+        global_registration_weight (float, optional): Weight of the reference relative to the previous frame. Defaults to 1.
+        output_translation_file (Optional[Path], optional): Csv file to write the translations to. Defaults to None.
+        output_crop_rect_file (Optional[Path], optional): File to write the x,y,width,height valid crop rectangle to. Defaults to None.
+        frames_per_chunk (int, optional): Number of frames registered at a time. Defaults to 200.
+        num_threads (Optional[int], optional): Number of threads. Defaults to None (number of cpus).
+        on_chunk (Optional[Callable[[np.ndarray], Any]], optional): Called with each registered chunk before it is written, with the margins shifted in from outside the frame set to NaN. They are written as 0. Defaults to None.
+
+    Returns:
+        int: Number of frames processed.
+    """
+    metadata = read_metadata(in_vid)
+    if reference_file_name:
+        reference = np.array(open_movie(Path(reference_file_name))[0])
+    else:
+        reference = np.array(open_movie(in_vid)[reference_frame_index])
+
+    all_shifts: List[np.ndarray] = []
+    with RigidRegistration(
+        reference,
+        max_translation=max_translation,
+        low_bandpass_cutoff=low_bandpass_cutoff,
+        high_bandpass_cutoff=high_bandpass_cutoff,
+        roi=roi,
+        global_registration_weight=global_registration_weight,
+        num_threads=num_threads,
+    ) as registration, MovieWriter(
+        out_vid,
+        metadata.frame_shape,
+        n_frames=metadata.n_frames,
+        frame_period=metadata.frame_period,
+    ) as writer:
+        for frames in iter_chunks(in_vid, frames_per_chunk):
+            # NaN margins so on_chunk (e.g. an F0Accumulator) can ignore them
+            registered, shifts = registration.register(frames, fill_value=np.nan)
+            all_shifts.append(shifts)
+            if on_chunk is not None:
+                on_chunk(registered)
+            registered[np.isnan(registered)] = 0
+            writer.write(registered)
+
+    shifts = np.concatenate(all_shifts) if all_shifts else np.zeros((0, 2))
+    if output_translation_file:
+        write_translations(Path(output_translation_file), shifts, metadata.frame_period)
+    if output_crop_rect_file:
+        rect = valid_crop_rect(shifts, metadata.frame_shape)
+        Path(output_crop_rect_file).write_text(",".join(str(v) for v in rect) + "\n")
+    return metadata.n_frames
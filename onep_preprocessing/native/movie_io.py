@@ -0,0 +1,287 @@
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Iterator, Optional, Tuple, Union
+import json
+import numpy as np
+from . import isxd
+
+
+NPY_HEADER_SIZE = 128
+NPY_MAGIC = b"\x93NUMPY\x01\x00"
+
+
+@dataclass
+class MovieMetadata:
+    """
+    Shape and timing of a movie.
+
+    Args:
+        n_frames (int): Number of frames.
+        frame_shape (Tuple[int, int]): (rows, cols) of each frame.
+        dtype (str): NumPy dtype string of the pixels.
+        frame_period (Optional[float]): Time between frames in seconds, None if unknown.
+    """
+
+    n_frames: int
+    frame_shape: Tuple[int, int]
+    dtype: str
+    frame_period: Optional[float] = None
+
+    @property
+    def frame_bytes(self) -> int:
+        return int(np.prod(self.frame_shape)) * np.dtype(self.dtype).itemsize
+
+
+def metadata_path(path: Path) -> Path:
+    """Path of the JSON sidecar holding the metadata of a movie."""
+    path = Path(path)
+    return path.with_name(path.name + ".json")
+
+
+def _write_sidecar(path: Path, metadata: MovieMetadata) -> None:
+    metadata_path(path).write_text(json.dumps(asdict(metadata), indent=2))
+
+
+def _read_sidecar(path: Path) -> Optional[dict]:
+    sidecar = metadata_path(path)
+    if not sidecar.exists():
+        return None
+    return json.loads(sidecar.read_text())
+
+
+def _npy_header(shape: Tuple[int, ...], dtype: np.dtype) -> bytes:
+    # fixed size header so it can be rewritten in place once the frame count is known
+    header = repr(
+        {"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)), "fortran_order": False, "shape": tuple(shape)}
+    )
+    header_len = NPY_HEADER_SIZE - len(NPY_MAGIC) - 2
+    header = header.ljust(header_len - 1) + "\n"
+    if len(header) != header_len:
+        raise ValueError(f"Shape {shape} does not fit in the .npy header")
+    return NPY_MAGIC + header_len.to_bytes(2, "little") + header.encode("latin1")
+
+
+def _read_npy_header(path: Path) -> Tuple[Tuple[int, ...], np.dtype, int]:
+    with open(path, "rb") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        if fortran_order:
+            raise ValueError(f"{path} is stored in Fortran order")
+        return shape, dtype, f.tell()
+
+
+def read_metadata(path: Path) -> MovieMetadata:
+    """Read the metadata of a movie without touching the pixel data.
+
+    .npy movies store shape and dtype in their header, the frame period in an
+    optional sidecar. .raw movies need the sidecar. .isxd movies carry all of
+    it in their JSON footer.
+
+    Args:
+        path (Path): Path to the movie.
+
+    Returns:
+        MovieMetadata: Metadata of the movie.
+    """
+    path = Path(path)
+    if path.suffix == ".isxd":
+        header, n_frames, dtype, frame_shape, _ = isxd.movie_layout(path)
+        return MovieMetadata(n_frames, frame_shape, dtype.str, isxd.frame_period_from_header(header))
+    sidecar = _read_sidecar(path)
+    if path.suffix == ".npy":
+        shape, dtype, _ = _read_npy_header(path)
+        if len(shape) != 3:
+            raise ValueError(f"Expected a (frames, rows, cols) movie, got shape {shape}")
+        frame_period = sidecar.get("frame_period") if sidecar else None
+        return MovieMetadata(shape[0], tuple(shape[1:]), dtype.str, frame_period)
+    if sidecar is None:
+        raise FileNotFoundError(f"No metadata found for {path}")
+    return MovieMetadata(
+        n_frames=sidecar["n_frames"],
+        frame_shape=tuple(sidecar["frame_shape"]),
+        dtype=sidecar["dtype"],
+        frame_period=sidecar.get("frame_period"),
+    )
+
+
+def open_movie(path: Path, mode: str = "r") -> np.ndarray:
+    """Open a (frames, rows, cols) movie as a memory map without loading it.
+
+    Args:
+        path (Path): Path to a .npy, .raw or .isxd movie.
+        mode (str, optional): Memory map mode {"r", "r+"}. Defaults to "r".
+
+    Returns:
+        np.ndarray: Memory mapped view of the movie.
+    """
+    path = Path(path)
+    if path.suffix == ".isxd":
+        return isxd.open_movie(path, mode)
+    metadata = read_metadata(path)
+    offset = _read_npy_header(path)[2] if path.suffix == ".npy" else 0
+    shape = (metadata.n_frames, *metadata.frame_shape)
+    if metadata.n_frames == 0:
+        return np.zeros(shape, dtype=metadata.dtype)
+    return np.memmap(path, dtype=metadata.dtype, mode=mode, offset=offset, shape=shape)
+
+
+def iter_chunks(path: Path, frames_per_chunk: int) -> Iterator[np.ndarray]:
+    """Yield consecutive chunks of a movie.
+
+    Only one chunk is held in memory at a time, so peak memory is independent
+    of the length of the recording.
+
+    Args:
+        path (Path): Path to the movie.
+        frames_per_chunk (int): Maximum number of frames per chunk.
+
+    Yields:
+        np.ndarray: (frames, rows, cols) chunk, the last one may be shorter.
+    """
+    movie = open_movie(path)
+    for start in range(0, len(movie), frames_per_chunk):
+        yield np.array(movie[start : start + frames_per_chunk])
+
+
+class MovieWriter:
+    def __init__(
+        self,
+        path: Path,
+        frame_shape: Tuple[int, int],
+        dtype: Union[str, np.dtype] = np.float32,
+        n_frames: Optional[int] = None,
+        frame_period: Optional[float] = None,
+    ):
+        """
+        Writes frames to a .npy, .raw or .isxd movie in order.
+
+        If n_frames is given the file is preallocated and memory mapped, and
+        exactly n_frames must be written. Producers can also fill self.data
+        in place and call advance(). Otherwise frames are appended to the
+        file and the header is finalised on close. Either way only the chunk
+        being written is held in memory. The metadata, including the frame
+        period, is written to a JSON sidecar, or to the JSON footer for .isxd
+        movies, which then read back with open_movie and the isx package.
+
+        Args:
+            path (Path): Output path, .npy, .raw or .isxd. .isxd movies must be uint16, float32 or uint8.
+            frame_shape (Tuple[int, int]): (rows, cols) of each frame.
+            dtype (Union[str, np.dtype], optional): Data type of the movie. Defaults to np.float32.
+            n_frames (Optional[int], optional): Number of frames, if known in advance. Defaults to None.
+            frame_period (Optional[float], optional): Time between frames in seconds. Defaults to None.
+        """
+        self.path = Path(path)
+        if self.path.suffix not in (".npy", ".raw", ".isxd"):
+            raise ValueError(f"Unsupported movie format: {self.path.suffix}")
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        if self.path.suffix == ".isxd":
+            self.dtype = np.dtype(isxd.DATA_TYPES[isxd.data_type_code(self.dtype)])
+        self.n_frames = n_frames
+        self.frame_period = frame_period
+        self.n_written = 0
+        self._offset = NPY_HEADER_SIZE if self.path.suffix == ".npy" else 0
+
+        if n_frames is not None:
+            self._file = None
+            with open(self.path, "wb") as f:
+                if self._offset:
+                    f.write(_npy_header((n_frames, *self.frame_shape), self.dtype))
+                f.truncate(self._offset + n_frames * self.frame_bytes)
+            self.data = (
+                np.memmap(
+                    self.path,
+                    dtype=self.dtype,
+                    mode="r+",
+                    offset=self._offset,
+                    shape=(n_frames, *self.frame_shape),
+                )
+                if n_frames
+                else None
+            )
+        else:
+            self.data = None
+            self._file = open(self.path, "wb")
+            if self._offset:
+                self._file.write(_npy_header((0, *self.frame_shape), self.dtype))
+
+    @property
+    def frame_bytes(self) -> int:
+        return int(np.prod(self.frame_shape)) * self.dtype.itemsize
+
+    @property
+    def metadata(self) -> MovieMetadata:
+        return MovieMetadata(
+            n_frames=self.n_written,
+            frame_shape=self.frame_shape,
+            dtype=self.dtype.str,
+            frame_period=self.frame_period,
+        )
+
+    def advance(self, n_frames: int) -> None:
+        """Mark n_frames frames written directly into self.data as done."""
+        if self.n_frames is None:
+            raise ValueError("advance() needs a preallocated writer")
+        if self.n_written + n_frames > self.n_frames:
+            raise ValueError(f"Writing past the end of {self.path}")
+        self.n_written += n_frames
+
+    def write(self, frames: np.ndarray) -> None:
+        frames = np.asarray(frames)
+        if frames.shape[1:] != self.frame_shape:
+            raise ValueError(f"Expected frames of shape {self.frame_shape}, got {frames.shape[1:]}")
+        end = self.n_written + len(frames)
+        if self.n_frames is not None:
+            if end > (self.n_frames or 0):
+                raise ValueError(f"Writing past the end of {self.path}")
+            self.data[self.n_written : end] = frames
+        else:
+            self._file.write(np.ascontiguousarray(frames, dtype=self.dtype).tobytes())
+        self.n_written = end
+
+    def _write_isxd_footer(self) -> None:
+        f = self._file or open(self.path, "r+b")
+        try:
+            f.seek(self.n_written * self.frame_bytes)
+            f.truncate()
+            isxd.write_footer(
+                f,
+                isxd.movie_header(self.n_written, self.frame_shape, self.dtype, self.frame_period),
+            )
+        finally:
+            f.close()
+            self._file = None
+
+    def close(self) -> None:
+        if self.data is not None:
+            self.data.flush()
+            self.data = None
+        if self._file is not None:
+            if self._offset:
+                self._file.seek(0)
+                self._file.write(_npy_header((self.n_written, *self.frame_shape), self.dtype))
+            if self.path.suffix != ".isxd":
+                self._file.close()
+                self._file = None
+        if self.path.suffix == ".isxd":
+            self._write_isxd_footer()
+        else:
+            _write_sidecar(self.path, self.metadata)
+        if self.n_frames is not None and self.n_written != self.n_frames:
+            raise ValueError(
+                f"Expected {self.n_frames} frames in {self.path}, wrote {self.n_written}"
+            )
+
+    def __enter__(self) -> "MovieWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        elif self.data is not None:
+            self.data.flush()
+        elif self._file is not None:
+            self._file.close()
@@ -0,0 +1,141 @@
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import hashlib
+import os
+import pickle
+
+
+INDEX_VERSION = 1
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "onep_preprocessing"
+
+
+def _mtime(path: Path) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _sub_dirs(path: Path) -> List[str]:
+    with os.scandir(path) as entries:
+        return sorted(e.name for e in entries if e.is_dir())
+
+
+class DirIndex:
+    def __init__(self, index_file: Path):
+        """
+        Persisted cache of parsed mouse directories.
+
+        Parsing a mouse directory lists every session directory in it, which
+        is slow on network drives. The index stores each parsed mouse dir
+        with the mtimes of the mouse directory and of its sub directories.
+        These only change when entries are added, removed or renamed, which
+        is all the parsers look at. On the next run a mouse dir is reused if
+        none of those mtimes changed, which costs one stat per directory
+        instead of a listing. Root directory listings are cached the same way.
+
+        Parsed dirs are pickled, so the index file should only be shared
+        with trusted users.
+
+        Args:
+            index_file (Path): File the index is stored in. Created on save.
+        """
+        self.index_file = Path(index_file)
+        self._entries: Dict[Tuple[str, str, str], Tuple[Dict[str, Optional[int]], Any]] = {}
+        self._listings: Dict[str, Tuple[Optional[int], List[str]]] = {}
+        self._dirty = False
+        self.load()
+
+    @classmethod
+    def for_root(cls, root_dir: Path, cache_dir: Optional[Path] = None) -> "DirIndex":
+        """Index of a root directory, stored in cache_dir under a name derived from the root path.
+
+        The index is kept outside the tree it indexes, so saving it does not
+        change the mtime of the root directory.
+
+        Args:
+            root_dir (Path): The root directory.
+            cache_dir (Optional[Path], optional): Directory of the index files. Defaults to None (~/.cache/onep_preprocessing).
+        """
+        cache_dir = Path(cache_dir) if cache_dir is not None else DEFAULT_CACHE_DIR
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha1(str(Path(root_dir).resolve()).encode("utf-8")).hexdigest()[:16]
+        return cls(cache_dir / f"dir_index_{digest}.pkl")
+
+    def load(self) -> None:
+        if not self.index_file.exists():
+            return
+        try:
+            with open(self.index_file, "rb") as f:
+                stored = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return
+        if not isinstance(stored, dict) or stored.get("version") != INDEX_VERSION:
+            return
+        self._entries = stored["entries"]
+        self._listings = stored["listings"]
+
+    def save(self) -> None:
+        """Write the index if anything changed since it was loaded."""
+        if not self._dirty:
+            return
+        tmp = self.index_file.with_name(self.index_file.name + ".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(
+                {"version": INDEX_VERSION, "entries": self._entries, "listings": self._listings}, f
+            )
+        os.replace(tmp, self.index_file)
+        self._dirty = False
+
+    def sub_dirs(self, directory: Path) -> List[Path]:
+        """Sub directories of directory, listed again only if its mtime changed."""
+        directory = Path(directory)
+        key = str(directory)
+        mtime = _mtime(directory)
+        cached = self._listings.get(key)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, _sub_dirs(directory))
+            self._listings[key] = cached
+            self._dirty = True
+        return [directory / name for name in cached[1]]
+
+    @staticmethod
+    def _fingerprint(mouse_dir: Path, sub_dirs: List[str]) -> Dict[str, Optional[int]]:
+        fingerprint = {"": _mtime(mouse_dir)}
+        fingerprint.update({name: _mtime(mouse_dir / name) for name in sub_dirs})
+        return fingerprint
+
+    def get(self, parse: Callable[..., Any], mouse_dir: Path, **kwargs) -> Any:
+        """Parsed mouse dir, from the index if the directory is unchanged.
+
+        Args:
+            parse (Callable[..., Any]): Parser of a mouse dir, e.g. AstrocyteSet1IsxMouseDir.from_mouse_dir.
+            mouse_dir (Path): The mouse directory.
+            **kwargs: Passed on to parse and part of the cache key.
+
+        Returns:
+            Any: The parsed mouse dir.
+        """
+        mouse_dir = Path(mouse_dir)
+        key = (getattr(parse, "__qualname__", repr(parse)), str(mouse_dir), repr(sorted(kwargs.items())))
+        cached = self._entries.get(key)
+        if cached is not None:
+            fingerprint, parsed = cached
+            names = [name for name in fingerprint if name]
+            if fingerprint == self._fingerprint(mouse_dir, names):
+                return parsed
+        parsed = parse(mouse_dir, **kwargs)
+        self._entries[key] = (self._fingerprint(mouse_dir, _sub_dirs(mouse_dir)), parsed)
+        self._dirty = True
+        return parsed
+
+    def __enter__(self) -> "DirIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.save()
+
+
+def by_mouse_name(mouse_dirs) -> Dict[str, Any]:
+    """Mouse dirs keyed by mouse name, for matching raw and output trees."""
+    return {mouse_dir.mouse_name: mouse_dir for mouse_dir in mouse_dirs}
@@ -1,5 +1,6 @@
 from pathlib import Path
 from .output_session_dir import OutputDir
+from ...exporting.table_io import SUFFIXES, check_format
 from typing import List, Optional, Iterable, Type, Sequence
 from dataclasses import dataclass
 import datetime
@@ -40,6 +41,9 @@ class OutputMouseDir:
     |   │   ├── traces_tidy.csv
     |   |  ...
 
+    The tidy tables (long_reg_tidy*, *_tidy*) can also be .parquet or
+    .feather files, see from_mouse_dir(fmt=...). Attribute names keep the
+    _csv suffix whatever the format.
     """
 
     mouse_name: str
@@ -52,7 +56,7 @@ class OutputMouseDir:
     long_reg_translation_csv: Path
 
     @classmethod
-    def from_mouse_dir(cls, mouse_dir: Path):
+    def from_mouse_dir(cls, mouse_dir: Path, fmt: str = "csv"):
         raise NotImplementedError
 
 
@@ -75,10 +79,11 @@ class OutputMouseDirAstrocyte(OutputMouseDir):
         return "hab" in session_dir.name
 
     @classmethod
-    def from_mouse_dir(cls, mouse_dir: Path):
+    def from_mouse_dir(cls, mouse_dir: Path, fmt: str = "csv"):
+        suffix = SUFFIXES[check_format(fmt)]
         # filter sub_dirs to only include those that end in six digits
         sub_dirs = [
-            OutputDir.from_session_dir(d)
+            OutputDir.from_session_dir(d, fmt=fmt)
             for d in mouse_dir.glob("*")
             if d.is_dir() and d.name[-6:].isdigit() and not cls.is_hab_dir(d)
         ]
@@ -105,8 +110,8 @@ class OutputMouseDirAstrocyte(OutputMouseDir):
         renew_dir = sub_dirs[7]
 
         long_reg_csv = mouse_dir / "long_reg.csv"
-        long_reg_tidy_csv = mouse_dir / "long_reg_tidy.csv"
-        long_reg_tidy_dataset_id_csv = mouse_dir / "long_reg_tidy_dataset_id.csv"
+        long_reg_tidy_csv = mouse_dir / f"long_reg_tidy{suffix}"
+        long_reg_tidy_dataset_id_csv = mouse_dir / f"long_reg_tidy_dataset_id{suffix}"
         long_reg_crop_csv = mouse_dir / "long_reg_crop.csv"
         long_reg_translation_csv = mouse_dir / "long_reg_translation.csv"
 
@@ -1,7 +1,8 @@
 from pathlib import Path
 from .output_mouse_dir import OutputMouseDir, OutputMouseDirAstrocyte
-from typing import List, Optional, Iterable, Sequence
+from typing import Dict, List, Optional, Iterable, Sequence
 from dataclasses import dataclass
+from ..dir_index import DirIndex, by_mouse_name
 
 
 @dataclass
@@ -26,15 +27,32 @@ class OutputRootParser:
     root_dir: Path
     mouse_dirs: Sequence[OutputMouseDir]
 
+    def by_mouse_name(self) -> Dict[str, OutputMouseDir]:
+        return by_mouse_name(self.mouse_dirs)
+
+    @staticmethod
+    def _sub_dirs(root_dir: Path, index: Optional[DirIndex] = None) -> List[Path]:
+        if index is not None:
+            return index.sub_dirs(root_dir)
+        return [d for d in root_dir.glob("*") if d.is_dir()]
+
+    @staticmethod
+    def _parse(parse, mouse_dir: Path, index: Optional[DirIndex] = None, **kwargs):
+        if index is not None:
+            return index.get(parse, mouse_dir, **kwargs)
+        return parse(mouse_dir, **kwargs)
+
     @classmethod
-    def from_root_dir(cls, root_dir: Path):
+    def from_root_dir(cls, root_dir: Path, fmt: str = "csv", index: Optional[DirIndex] = None):
         # filter sub_dirs to only include those that end in six digits
         sub_dirs = [
             sub_dir
-            for sub_dir in root_dir.iterdir()
-            if sub_dir.is_dir() and sub_dir.name.isdigit()
+            for sub_dir in cls._sub_dirs(root_dir, index)
+            if sub_dir.name.isdigit()
+        ]
+        mouse_dirs = [
+            cls._parse(OutputMouseDir.from_mouse_dir, sub_dir, index, fmt=fmt) for sub_dir in sub_dirs
         ]
-        mouse_dirs = [OutputMouseDir.from_mouse_dir(sub_dir) for sub_dir in sub_dirs]
         return cls(root_dir=root_dir, mouse_dirs=mouse_dirs)
 
 
@@ -43,11 +61,22 @@ class OutputRootParserAstrocyte(OutputRootParser):
     mouse_dirs: Sequence[OutputMouseDirAstrocyte]
 
     @classmethod
-    def from_root_dir(cls, root_dir: Path, numbers: Optional[Iterable[int]] = None):
+    def from_root_dir(
+        cls,
+        root_dir: Path,
+        numbers: Optional[Iterable[int]] = None,
+        fmt: str = "csv",
+        index: Optional[DirIndex] = None,
+    ):
+        """
+        Args:
+            root_dir (Path): The root directory.
+            numbers (Optional[Iterable[int]], optional): Only parse mice with these numbers. Defaults to None (all).
+            fmt (str, optional): Format of the tidy tables {"csv", "parquet", "feather"}. Defaults to "csv".
+            index (Optional[DirIndex], optional): Index to reuse parsed mouse dirs from. Call index.save() afterwards to persist it. Defaults to None.
+        """
         mouse_dirs: List[OutputMouseDirAstrocyte] = []
-        for d in root_dir.glob("*"):
-            if not d.is_dir():
-                continue
+        for d in cls._sub_dirs(root_dir, index):
             if not d.name.startswith("A"):
                 continue
             if numbers:
@@ -55,7 +84,9 @@ class OutputRootParserAstrocyte(OutputRootParser):
                 if subdir_number not in numbers:
                     continue
             try:
-                mouse_dirs.append(OutputMouseDirAstrocyte.from_mouse_dir(d))
+                mouse_dirs.append(
+                    cls._parse(OutputMouseDirAstrocyte.from_mouse_dir, d, index, fmt=fmt)
+                )
             except ValueError:
                 raise
         return cls(root_dir=root_dir, mouse_dirs=mouse_dirs)
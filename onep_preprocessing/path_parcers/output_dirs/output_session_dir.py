@@ -2,6 +2,7 @@ from pathlib import Path
 from dataclasses import dataclass
 import datetime
 from typing import Union, Any, Optional, List
+from ...exporting.table_io import SUFFIXES, check_format
 
 
 @dataclass
@@ -22,9 +23,13 @@ class OutputDir:
     │   ├── props_tidy.csv
     │   ├── props_tidy_mouse_id.csv
     │   ├── props_tidy_mouse_dataset_id.csv
+    │   ├── cell_id_lookup.csv
+    │   ├── footprints.npy
+    │   ├── events.csv
     │   └── tiff
     │       ├── cell_0001.tif
 
+    The tidy tables can also be .parquet or .feather files (see fmt).
 
     """                                                                    
 
@@ -38,21 +43,32 @@ class OutputDir:
     props_tidy_mouse_id: Optional[Path]
     props_tidy_mouse_dataset_id: Optional[Path]
     tiff: Optional[Path]
+    cell_id_lookup: Optional[Path] = None
+    footprints: Optional[Path] = None
+    events: Optional[Path] = None
 
     @classmethod
-    def from_session_dir(cls, session_dir: Path):
+    def from_session_dir(cls, session_dir: Path, fmt: str = "csv"):
+        """
+        Args:
+            session_dir (Path): The session directory.
+            fmt (str, optional): Format of the tidy tables {"csv", "parquet", "feather"}. traces and props are always the csv files exported by isx. Defaults to "csv".
+        """
         # return expected paths even if they do not currently exist
-        session_dir = session_dir
+        suffix = SUFFIXES[check_format(fmt)]
 
         traces = session_dir / "traces.csv"
-        traces_tidy = session_dir / "traces_tidy.csv"
-        traces_tidy_mouse_id = session_dir / "traces_tidy_mouse_id.csv"
-        traces_tidy_mouse_dataset_id = session_dir / "traces_tidy_mouse_dataset_id.csv"
+        traces_tidy = session_dir / f"traces_tidy{suffix}"
+        traces_tidy_mouse_id = session_dir / f"traces_tidy_mouse_id{suffix}"
+        traces_tidy_mouse_dataset_id = session_dir / f"traces_tidy_mouse_dataset_id{suffix}"
         props = session_dir / "props.csv"
-        props_tidy = session_dir / "props_tidy.csv"
-        props_tidy_mouse_id = session_dir / "props_tidy_mouse_id.csv"
-        props_tidy_mouse_dataset_id = session_dir / "props_tidy_mouse_dataset_id.csv"
+        props_tidy = session_dir / f"props_tidy{suffix}"
+        props_tidy_mouse_id = session_dir / f"props_tidy_mouse_id{suffix}"
+        props_tidy_mouse_dataset_id = session_dir / f"props_tidy_mouse_dataset_id{suffix}"
         tiff = session_dir / "tiff"
+        cell_id_lookup = session_dir / f"cell_id_lookup{suffix}"
+        footprints = session_dir / "footprints.npy"
+        events = session_dir / f"events{suffix}"
 
 
         return cls(
@@ -66,4 +82,7 @@ class OutputDir:
             props_tidy_mouse_id=props_tidy_mouse_id,
             props_tidy_mouse_dataset_id=props_tidy_mouse_dataset_id,
             tiff=tiff,
+            cell_id_lookup=cell_id_lookup,
+            footprints=footprints,
+            events=events,
         )
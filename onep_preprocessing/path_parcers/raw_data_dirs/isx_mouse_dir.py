@@ -1,7 +1,7 @@
 from pathlib import Path
 from dataclasses import dataclass
 import datetime
-from .session_dir import ISXDir
+from .session_dir import ISXDir, SessionScanner
 
 from typing import Union, Any, Optional, List
 
@@ -57,10 +57,11 @@ class AstrocyteSet1IsxMouseDir(IsxMouseDir):
     @classmethod
     def from_mouse_dir(cls, mouse_dir: Path):
         # filter sub_dirs to only include those that end in six digits
+        scanner = SessionScanner()
         sub_dirs = [
-            ISXDir.from_session_dir(d)
-            for d in mouse_dir.glob("*")
-            if d.is_dir() and d.name[-6:].isdigit()
+            ISXDir.from_session_dir(d, scanner)
+            for d in scanner.sub_dirs(mouse_dir)
+            if d.name[-6:].isdigit()
         ]
 
         if len(sub_dirs) != 10:
@@ -123,10 +124,11 @@ class AstrocyteSet2IsxMouseDir(IsxMouseDir):
     @classmethod
     def from_mouse_dir(cls, mouse_dir: Path):
         # filter sub_dirs to only include those that end in six digits
+        scanner = SessionScanner()
         sub_dirs = [
-            ISXDir.from_session_dir(d)
-            for d in mouse_dir.glob("*")
-            if d.is_dir() and d.name[-6:].isdigit()
+            ISXDir.from_session_dir(d, scanner)
+            for d in scanner.sub_dirs(mouse_dir)
+            if d.name[-6:].isdigit()
         ]
 
         if len(sub_dirs) != 9:
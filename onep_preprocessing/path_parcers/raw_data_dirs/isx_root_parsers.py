@@ -1,7 +1,8 @@
 from pathlib import Path
 from .isx_mouse_dir import IsxMouseDir, AstrocyteSet1IsxMouseDir, AstrocyteSet2IsxMouseDir
-from typing import List, Optional, Iterable, Sequence
+from typing import Dict, List, Optional, Iterable, Sequence
 from dataclasses import dataclass
+from ..dir_index import DirIndex, by_mouse_name
 
 
 @dataclass
@@ -52,15 +53,30 @@ class IsxRootParser:
     root_dir: Path
     mouse_dirs: Sequence[IsxMouseDir]
 
+    def by_mouse_name(self) -> Dict[str, IsxMouseDir]:
+        return by_mouse_name(self.mouse_dirs)
+
+    @staticmethod
+    def _sub_dirs(root_dir: Path, index: Optional[DirIndex] = None) -> List[Path]:
+        if index is not None:
+            return index.sub_dirs(root_dir)
+        return [d for d in root_dir.glob("*") if d.is_dir()]
+
+    @staticmethod
+    def _parse(parse, mouse_dir: Path, index: Optional[DirIndex] = None):
+        if index is not None:
+            return index.get(parse, mouse_dir)
+        return parse(mouse_dir)
+
     @classmethod
-    def from_root_dir(cls, root_dir: Path):
+    def from_root_dir(cls, root_dir: Path, index: Optional[DirIndex] = None):
         # filter sub_dirs to only include those that end in six digits
         sub_dirs = [
             sub_dir
-            for sub_dir in root_dir.iterdir()
-            if sub_dir.is_dir() and sub_dir.name.isdigit()
+            for sub_dir in cls._sub_dirs(root_dir, index)
+            if sub_dir.name.isdigit()
         ]
-        mouse_dirs = [IsxMouseDir.from_mouse_dir(sub_dir) for sub_dir in sub_dirs]
+        mouse_dirs = [cls._parse(IsxMouseDir.from_mouse_dir, sub_dir, index) for sub_dir in sub_dirs]
         return cls(root_dir=root_dir, mouse_dirs=mouse_dirs)
 
 
@@ -69,11 +85,20 @@ class IsxRootParserAstrocyteSet1(IsxRootParser):
     mouse_dirs: Sequence[AstrocyteSet1IsxMouseDir]
 
     @classmethod
-    def from_root_dir(cls, root_dir: Path, numbers: Optional[Iterable[int]] = None):
+    def from_root_dir(
+        cls,
+        root_dir: Path,
+        numbers: Optional[Iterable[int]] = None,
+        index: Optional[DirIndex] = None,
+    ):
+        """
+        Args:
+            root_dir (Path): The root directory.
+            numbers (Optional[Iterable[int]], optional): Only parse mice with these numbers. Defaults to None (all).
+            index (Optional[DirIndex], optional): Index to reuse parsed mouse dirs from. Call index.save() afterwards to persist it. Defaults to None.
+        """
         mouse_dirs: List[AstrocyteSet1IsxMouseDir] = []
-        for d in root_dir.glob("*"):
-            if not d.is_dir():
-                continue
+        for d in cls._sub_dirs(root_dir, index):
             if not d.name.startswith("A"):
                 continue
             if numbers:
@@ -81,7 +106,7 @@ class IsxRootParserAstrocyteSet1(IsxRootParser):
                 if subdir_number not in numbers:
                     continue
             try:
-                mouse_dirs.append(AstrocyteSet1IsxMouseDir.from_mouse_dir(d))
+                mouse_dirs.append(cls._parse(AstrocyteSet1IsxMouseDir.from_mouse_dir, d, index))
             except ValueError:
                 print(d.name)
                 raise
@@ -93,11 +118,20 @@ class IsxRootParserAstrocyteSet2(IsxRootParser):
     mouse_dirs: Sequence[AstrocyteSet2IsxMouseDir]
 
     @classmethod
-    def from_root_dir(cls, root_dir: Path, numbers: Optional[Iterable[int]] = None):
+    def from_root_dir(
+        cls,
+        root_dir: Path,
+        numbers: Optional[Iterable[int]] = None,
+        index: Optional[DirIndex] = None,
+    ):
+        """
+        Args:
+            root_dir (Path): The root directory.
+            numbers (Optional[Iterable[int]], optional): Only parse mice with these numbers. Defaults to None (all).
+            index (Optional[DirIndex], optional): Index to reuse parsed mouse dirs from. Call index.save() afterwards to persist it. Defaults to None.
+        """
         mouse_dirs: List[AstrocyteSet2IsxMouseDir] = []
-        for d in root_dir.glob("*"):
-            if not d.is_dir():
-                continue
+        for d in cls._sub_dirs(root_dir, index):
             if not d.name.startswith("A"):
                 continue
             if numbers:
@@ -105,7 +139,7 @@ class IsxRootParserAstrocyteSet2(IsxRootParser):
                 if subdir_number not in numbers:
                     continue
             try:
-                mouse_dirs.append(AstrocyteSet2IsxMouseDir.from_mouse_dir(d))
+                mouse_dirs.append(cls._parse(AstrocyteSet2IsxMouseDir.from_mouse_dir, d, index))
             except ValueError:
                 print(d.name)
                 raise
@@ -1,7 +1,122 @@
 from pathlib import Path
 from dataclasses import dataclass
-import datetime
-from typing import Union, Any, Optional, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import os
+
+
+# (role, suffix, name substring) in priority order. Each file goes to the
+# first row with its suffix whose substring is in its name, and each role
+# gets the first such file in the listing. A role with substring None gets
+# the first file with the suffix that was not taken by another role. A role
+# listed with several suffixes takes the file of its earliest row, so .isxd
+# outputs win over native .npy/.raw ones. cnmfe comes first since cellsets
+# are named after the motion corrected movie.
+DEFAULT_ROLES: Sequence[Tuple[str, str, Optional[str]]] = (
+    ("cnmfe_cellset", ".isxd", "cnmfe"),
+    ("downsampled", ".isxd", "downsample"),
+    ("spatial_filtered", ".isxd", "spatial"),
+    ("motion_corrected", ".isxd", "motion"),
+    ("dff", ".isxd", "dff"),
+    ("raw_movie", ".isxd", None),
+    ("gpio", ".gpio", None),
+    ("imu", ".imu", None),
+    # outputs of the native backends
+    ("downsampled", ".npy", "downsample"),
+    ("spatial_filtered", ".npy", "spatial"),
+    ("motion_corrected", ".npy", "motion"),
+    ("dff", ".npy", "dff"),
+    ("downsampled", ".raw", "downsample"),
+    ("spatial_filtered", ".raw", "spatial"),
+    ("motion_corrected", ".raw", "motion"),
+    ("dff", ".raw", "dff"),
+)
+
+ISXDIR_ROLES = (
+    "raw_movie",
+    "gpio",
+    "imu",
+    "downsampled",
+    "spatial_filtered",
+    "motion_corrected",
+    "cnmfe_cellset",
+    "dff",
+)
+
+
+class SessionScanner:
+    def __init__(self, roles: Sequence[Tuple[str, str, Optional[str]]] = DEFAULT_ROLES):
+        """
+        Classifies the files of session directories with one listing per directory.
+
+        Each directory is read with a single os.scandir and every entry is
+        matched against the role table in the same pass. The directory
+        entries are kept, so stat results (free on Windows, where the listing
+        carries them) are cached for later calls to stat().
+
+        Args:
+            roles (Sequence[Tuple[str, str, Optional[str]]], optional): (role, suffix, name substring) table, see DEFAULT_ROLES. Defaults to DEFAULT_ROLES.
+        """
+        self.roles = tuple(roles)
+        self._by_suffix: Dict[str, List[Tuple[str, Optional[str], int]]] = {}
+        for rank, (role, suffix, contains) in enumerate(self.roles):
+            self._by_suffix.setdefault(suffix.lower(), []).append((role, contains, rank))
+        self._entries: Dict[str, os.DirEntry] = {}
+
+    def scan(self, session_dir: Path) -> Dict[str, Optional[Path]]:
+        """Path of every role in session_dir, None for roles without a file."""
+        found: Dict[str, Optional[Path]] = {role: None for role, _, _ in self.roles}
+        # row of the table each role was matched by
+        found_rank: Dict[str, int] = {}
+
+        def better(role: str, rank: int) -> bool:
+            return found_rank.get(role, len(self.roles)) > rank
+
+        with os.scandir(session_dir) as entries:
+            for entry in entries:
+                candidates = self._by_suffix.get(os.path.splitext(entry.name)[1].lower())
+                if not candidates or not entry.is_file():
+                    continue
+                self._entries[entry.path] = entry
+                match = next(
+                    (
+                        (role, rank)
+                        for role, contains, rank in candidates
+                        if contains is not None and contains in entry.name
+                    ),
+                    None,
+                )
+                if match is not None:
+                    role, rank = match
+                    if better(role, rank):
+                        found[role] = Path(entry.path)
+                        found_rank[role] = rank
+                        continue
+                for role, contains, rank in candidates:
+                    if contains is None and better(role, rank):
+                        found[role] = Path(entry.path)
+                        found_rank[role] = rank
+                        break
+        return found
+
+    def scan_many(
+        self, session_dirs: Iterable[Path], max_workers: int = 8
+    ) -> Dict[Path, Dict[str, Optional[Path]]]:
+        """scan() over many directories, with concurrent listings to hide network latency."""
+        session_dirs = [Path(d) for d in session_dirs]
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return dict(zip(session_dirs, pool.map(self.scan, session_dirs)))
+
+    def stat(self, path: Path) -> os.stat_result:
+        """stat of a scanned file, cached by its directory entry."""
+        entry = self._entries.get(str(path))
+        return entry.stat() if entry is not None else os.stat(path)
+
+    @staticmethod
+    def sub_dirs(directory: Path) -> List[Path]:
+        """Sub directories of directory, from one listing."""
+        with os.scandir(directory) as entries:
+            return [Path(e.path) for e in entries if e.is_dir()]
 
 
 @dataclass
@@ -36,50 +151,12 @@ class ISXDir:
     dff: Optional[Path]
 
     @classmethod
-    def from_session_dir(cls, session_dir: Path):
-        session_dir = session_dir
-        # get list of all isxd files
-        isxd_files = list(session_dir.glob("*.isxd"))
-        # if one contains 'downsample', assign to downsampled
-        downsampled = next((f for f in isxd_files if "downsample" in f.name), None)
-        # if one contains 'spatial', assign to spatial_filtered
-        spatial_filtered = next((f for f in isxd_files if "spatial" in f.name), None)
-        # if one contains 'motion', assign to motion_corrected
-        motion_corrected = next((f for f in isxd_files if "motion" in f.name), None)
-        # if one contains 'cnmfe', assign to cnmfe_cellset
-        cnmfe_cellset = next((f for f in isxd_files if "cnmfe" in f.name), None)
-        # if one contains 'dff', assign to dff
-        dff = next((f for f in isxd_files if "dff" in f.name), None)
-        # if there are any left, assign to raw_movie
-        raw_movie = next(
-            (
-                f
-                for f in isxd_files
-                if f
-                not in [
-                    downsampled,
-                    spatial_filtered,
-                    motion_corrected,
-                    cnmfe_cellset,
-                    dff,
-                ]
-            ),
-            None,
-        )
-
-        # get the gpio and imu files and assign to gpio and imu, set to None if not found
-        gpio = next((f for f in session_dir.glob("*.gpio")), None)
-
-        imu = next((f for f in session_dir.glob("*.imu")), None)
-
-        return cls(
-            session_dir=session_dir,
-            raw_movie=raw_movie,
-            gpio=gpio,
-            imu=imu,
-            downsampled=downsampled,
-            spatial_filtered=spatial_filtered,
-            motion_corrected=motion_corrected,
-            cnmfe_cellset=cnmfe_cellset,
-            dff=dff,
-        )
+    def from_session_dir(cls, session_dir: Path, scanner: Optional["SessionScanner"] = None):
+        """
+        Args:
+            session_dir (Path): The session directory.
+            scanner (Optional[SessionScanner], optional): Scanner classifying the files. Defaults to None (SessionScanner() with DEFAULT_ROLES).
+        """
+        scanner = scanner or SessionScanner()
+        roles = scanner.scan(session_dir)
+        return cls(session_dir=session_dir, **{f: roles.get(f) for f in ISXDIR_ROLES})
@@ -0,0 +1,184 @@
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+import hashlib
+import json
+
+
+# attributes that change how a processor runs but not what it writes. backend
+# is not one of them: the isx and numpy implementations write different movies
+EXECUTION_PARAMS = (
+    "num_threads",
+    "frames_per_chunk",
+    "scratch_dir",
+    "keep_tmp_files",
+    "movie_buffer",
+    "on_exists",
+    "raise_on_error",
+)
+
+
+class BuildCache:
+    def __init__(
+        self,
+        hash_mode: str = "full",
+        sample_bytes: int = 1 << 20,
+        manifest_suffix: str = ".manifest.json",
+    ):
+        """
+        Decides whether a processing stage has to be rerun.
+
+        A manifest is written next to each output recording the size, mtime and
+        hash of every input plus the class and full parameter set of the
+        processor that produced it. A stage is only rerun when the output or its
+        manifest is missing, the processor parameters changed, or an input's
+        content changed. Inputs whose size and mtime match the manifest are not
+        rehashed, so checking an up to date output costs a stat call.
+
+        Manifests are chained: an input that is itself the output of a stage
+        is recorded with a hash of its own manifest, so rerunning an upstream
+        stage invalidates everything downstream of it even if the new input
+        has the same size and sampled hash. Execution only settings
+        (EXECUTION_PARAMS, e.g. num_threads) are not part of the parameters.
+        The backend is, so switching between isx and numpy reruns the stage.
+
+        Args:
+            hash_mode (str, optional): How input files are hashed {"full", "sampled", "none"}. "sampled" only hashes the size and the first and last sample_bytes of the file, so it misses edits in the middle of an input that did not come from a stage with a manifest. Defaults to "full".
+            sample_bytes (int, optional): Number of bytes read from each end of the file in "sampled" mode. Defaults to 1 MB.
+            manifest_suffix (str, optional): Suffix appended to the output file name to get the manifest path. Defaults to ".manifest.json".
+        """
+        if hash_mode not in ("full", "sampled", "none"):
+            raise ValueError(f"Unknown hash_mode: {hash_mode}")
+        self.hash_mode = hash_mode
+        self.sample_bytes = sample_bytes
+        self.manifest_suffix = manifest_suffix
+
+    def manifest_path(self, output: Path) -> Path:
+        return output.with_name(output.name + self.manifest_suffix)
+
+    def file_hash(self, path: Path) -> Optional[str]:
+        if self.hash_mode == "none":
+            return None
+        h = hashlib.sha256()
+        size = path.stat().st_size
+        with open(path, "rb") as f:
+            if self.hash_mode == "full" or size <= 2 * self.sample_bytes:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    h.update(block)
+            else:
+                h.update(str(size).encode())
+                h.update(f.read(self.sample_bytes))
+                f.seek(-self.sample_bytes, 2)
+                h.update(f.read(self.sample_bytes))
+        return h.hexdigest()
+
+    def fingerprint(self, path: Path, with_hash: bool = True) -> Dict[str, Any]:
+        stat = path.stat()
+        fingerprint: Dict[str, Any] = {
+            "path": str(path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+        if with_hash:
+            fingerprint["hash"] = self.file_hash(path)
+            fingerprint["manifest"] = self.manifest_hash(path)
+        return fingerprint
+
+    def manifest_hash(self, path: Path) -> Optional[str]:
+        """Hash of the manifest of path if it is the output of a stage, else None."""
+        manifest_path = self.manifest_path(path)
+        if not manifest_path.exists():
+            return None
+        return hashlib.sha256(manifest_path.read_bytes()).hexdigest()
+
+    @staticmethod
+    def processor_params(processor: Any) -> Dict[str, Any]:
+        """Class name and parameters of a processor, normalised through JSON so they compare equal to a loaded manifest.
+
+        Processors nested in the parameters (e.g. the stages of a dispatcher)
+        are described the same way. Private attributes and EXECUTION_PARAMS
+        are left out.
+        """
+
+        def describe(obj: Any) -> Any:
+            if hasattr(obj, "__dict__"):
+                return {
+                    "class": type(obj).__name__,
+                    "params": {
+                        k: v
+                        for k, v in vars(obj).items()
+                        if not k.startswith("_") and k not in EXECUTION_PARAMS
+                    },
+                }
+            return str(obj)
+
+        return json.loads(json.dumps(describe(processor), sort_keys=True, default=describe))
+
+    def _input_unchanged(self, path: Path, recorded: Dict[str, Any]) -> bool:
+        if not path.exists():
+            return False
+        if self.manifest_hash(path) != recorded.get("manifest"):
+            # the stage that produced this input was rerun
+            return False
+        current = self.fingerprint(path, with_hash=False)
+        if current["size"] != recorded["size"]:
+            return False
+        if current["mtime_ns"] == recorded["mtime_ns"]:
+            return True
+        # touched or copied, fall back to the content hash
+        return recorded.get("hash") is not None and self.file_hash(path) == recorded["hash"]
+
+    def is_up_to_date(self, processor: Any, inputs: Sequence[Path], output: Path) -> bool:
+        """Check whether output was produced by processor from the current inputs.
+
+        Args:
+            processor (Any): Processor that produces output.
+            inputs (Sequence[Path]): Input files of the stage.
+            output (Path): Output file of the stage.
+
+        Returns:
+            bool: True if the stage does not need to be rerun.
+        """
+        manifest_path = self.manifest_path(output)
+        if not output.exists() or not manifest_path.exists():
+            return False
+        try:
+            manifest = json.loads(manifest_path.read_text())
+        except ValueError:
+            return False
+
+        if manifest.get("processor") != self.processor_params(processor):
+            return False
+        if manifest.get("output", {}).get("size") != output.stat().st_size:
+            return False
+        recorded_inputs = manifest.get("inputs", [])
+        if [r["path"] for r in recorded_inputs] != [str(p) for p in inputs]:
+            return False
+        return all(
+            self._input_unchanged(Path(p), r) for p, r in zip(inputs, recorded_inputs)
+        )
+
+    def record(self, processor: Any, inputs: Sequence[Path], output: Path) -> Path:
+        """Write the manifest for a freshly produced output.
+
+        Args:
+            processor (Any): Processor that produced output.
+            inputs (Sequence[Path]): Input files of the stage.
+            output (Path): Output file of the stage.
+
+        Returns:
+            Path: Path to the manifest.
+        """
+        manifest = {
+            "processor": self.processor_params(processor),
+            "inputs": [self.fingerprint(Path(p)) for p in inputs],
+            "output": self.fingerprint(output, with_hash=False),
+        }
+        manifest_path = self.manifest_path(output)
+        manifest_path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+        return manifest_path
+
+    def invalidate(self, output: Path) -> None:
+        """Remove an output and its manifest."""
+        for path in (output, self.manifest_path(output)):
+            if path.exists():
+                path.unlink()
@@ -1,6 +1,11 @@
-from typing import Any
-import isx
+from typing import Any, Optional, Union
 from pathlib import Path
+import shutil
+import tempfile
+from .preprocessors import require_isx
+from ..native.cnmfe import CNMFeParams, fit_movie, finalize
+from ..native.isxd import write_cellset
+from ..native.movie_io import read_metadata
 
 
 class ISXCellFinder:
@@ -24,6 +29,8 @@ class ISXCNMFe(ISXCellFinder):
         patch_size: int = 80,
         patch_overlap: int = 20,
         output_unit_type: str = "df_over_noise",
+        scratch_dir: Optional[Union[Path, str]] = None,
+        keep_tmp_files: bool = False,
     ):
         """
 
@@ -41,6 +48,8 @@ class ISXCNMFe(ISXCellFinder):
             patch_size (int, optional): Size of the patches to process. Defaults to 80.
             patch_overlap (int, optional): Overlap between patches. Defaults to 20.
             output_unit_type (str, optional): Output unit type. Defaults to "df_over_noise".
+            scratch_dir (Optional[Union[Path, str]], optional): Directory for CNMFe's temporary files, e.g. on a fast local disk. Each run uses its own subdirectory. Defaults to None (next to the output cellset).
+            keep_tmp_files (bool, optional): Keep the temporary files after the run instead of deleting them. Defaults to False.
         """
         self.cell_diameter = cell_diameter
         self.min_corr = min_corr
@@ -55,10 +64,24 @@ class ISXCNMFe(ISXCellFinder):
         self.patch_size = patch_size
         self.patch_overlap = patch_overlap
         self.output_unit_type = output_unit_type
+        self.scratch_dir = scratch_dir
+        self.keep_tmp_files = keep_tmp_files
+
+    def _make_tmp_dir(self, in_vid: Path, out_cellset: Path) -> Path:
+        scratch_dir = Path(self.scratch_dir) if self.scratch_dir else out_cellset.parent
+        scratch_dir.mkdir(exist_ok=True, parents=True)
+        return Path(tempfile.mkdtemp(prefix=f"cnmfe_{Path(in_vid).stem}_", dir=scratch_dir))
 
     def __call__(self, in_vid: Path, out_cellset: Path) -> Any:
-        tmp_dir = out_cellset.parent / "cnmfe_tmp_files"
-        tmp_dir.mkdir(exist_ok=True)
+        isx = require_isx()
+        tmp_dir = self._make_tmp_dir(in_vid, out_cellset)
+        try:
+            self._run_cnmfe(isx, in_vid, out_cellset, tmp_dir)
+        finally:
+            if not self.keep_tmp_files:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _run_cnmfe(self, isx: Any, in_vid: Path, out_cellset: Path, tmp_dir: Path) -> None:
         isx.run_cnmfe(
             [str(in_vid)],
             [str(out_cellset)],
@@ -77,3 +100,62 @@ class ISXCNMFe(ISXCellFinder):
             patch_overlap=self.patch_overlap,
             output_unit_type=self.output_unit_type,
         )
+
+
+class NativeCNMFe(ISXCNMFe):
+    def __init__(self, *args, n_iter: int = 3, movie_buffer: str = "memmap", **kwargs):
+        """
+        CNMF-E in NumPy/SciPy, for machines without the Inscopix runtime.
+
+        Takes the same parameters as ISXCNMFe. Seeds are found from local
+        correlation and peak-to-noise ratio (min_corr, min_pnr), the
+        background follows a ring model (ring_size_factor,
+        bg_spatial_subsampling) and footprints and traces are fitted by
+        non-negative alternating least squares per patch. In
+        'parallel_patches' mode num_threads patches are fitted at once in a
+        process pool. Workers share one copy of the movie (movie_buffer), get
+        only their patch and return sparse footprints, and one merge step
+        applies merge_threshold across patch borders. The output is written
+        as an .isxd cellset. See native.cnmfe.
+
+        The input movie must be readable by native.movie_io. scratch_dir and
+        keep_tmp_files are unused since no temporary files are written.
+
+        Args:
+            n_iter (int, optional): Number of background / NMF alternations. Defaults to 3.
+            movie_buffer (str, optional): How patch workers share the movie {'memmap', 'shared_memory'}. 'shared_memory' loads it into RAM once, for movies on slow or network storage. Defaults to "memmap".
+        """
+        super().__init__(*args, **kwargs)
+        self.n_iter = n_iter
+        self.movie_buffer = movie_buffer
+
+    @property
+    def params(self) -> CNMFeParams:
+        return CNMFeParams(
+            cell_diameter=self.cell_diameter,
+            min_corr=self.min_corr,
+            min_pnr=self.min_pnr,
+            bg_spatial_subsampling=self.bg_spatial_subsampling,
+            ring_size_factor=self.ring_size_factor,
+            gaussian_kernel_size=self.gaussian_kernel_size,
+            closing_kernel_size=self.closing_kernel_size,
+            merge_threshold=self.merge_threshold,
+            n_iter=self.n_iter,
+        )
+
+    def __call__(self, in_vid: Path, out_cellset: Path) -> Any:
+        components = fit_movie(
+            in_vid,
+            self.params,
+            processing_mode=self.processing_mode,
+            patch_size=self.patch_size,
+            patch_overlap=self.patch_overlap,
+            num_workers=self.num_threads,
+            movie_buffer=self.movie_buffer,
+        )
+        footprints, traces = finalize(
+            components, self.closing_kernel_size, self.output_unit_type
+        )
+        write_cellset(
+            out_cellset, footprints, traces, frame_period=read_metadata(in_vid).frame_period
+        )
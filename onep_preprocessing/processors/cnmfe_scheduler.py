@@ -0,0 +1,221 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+import copy
+import math
+import os
+import warnings
+
+from .cnmfe import ISXCNMFe
+from .dispatcher import CNMFeDispatcher
+from .preprocessors import require_isx
+from .scheduler import BatchScheduler, available_memory_gb
+from ..native.movie_io import read_metadata
+
+
+# working copies of the pixel data CNMFe holds per patch (movie, background,
+# residual and factorisation buffers), float32
+PATCH_COPIES = 6
+BASE_MEMORY_GB = 0.5
+
+
+@dataclass
+class CNMFePlan:
+    """
+    How to run a batch of CNMFe jobs.
+
+    Args:
+        n_workers (int): Number of movies processed concurrently.
+        threads_per_job (int): num_threads given to each CNMFe run.
+        memory_per_job_gb (float): Estimated peak memory of one run in GB.
+    """
+
+    n_workers: int
+    threads_per_job: int
+    memory_per_job_gb: float
+
+
+def movie_shape(isx_video: Path) -> Tuple[int, int, int]:
+    """(frames, rows, cols) of a movie, read from its header."""
+    isx_video = Path(isx_video)
+    if isx_video.suffix in (".npy", ".raw", ".isxd"):
+        metadata = read_metadata(isx_video)
+        return (metadata.n_frames, *metadata.frame_shape)
+    isx = require_isx()
+    movie = isx.Movie.read(str(isx_video))
+    rows, cols = movie.spacing.num_pixels
+    return movie.timing.num_samples, rows, cols
+
+
+def n_patches(frame_shape: Tuple[int, int], patch_size: int, patch_overlap: int) -> int:
+    """Number of patches CNMFe splits a frame into."""
+    stride = max(patch_size - patch_overlap, 1)
+    return int(
+        math.prod(max(math.ceil(max(n - patch_overlap, 1) / stride), 1) for n in frame_shape)
+    )
+
+
+def estimate_cnmfe_memory_gb(
+    shape: Tuple[int, int, int], cnmfe: ISXCNMFe, num_threads: Optional[int] = None
+) -> float:
+    """Rough peak memory of one CNMFe run in GB.
+
+    Each patch in flight holds PATCH_COPIES float32 copies of its pixels over
+    all frames. In 'parallel_patches' mode up to num_threads patches are in
+    flight, in 'sequential_patches' one, and 'all_in_memory' treats the whole
+    frame as one patch.
+
+    Args:
+        shape (Tuple[int, int, int]): (frames, rows, cols) of the movie.
+        cnmfe (ISXCNMFe): CNMFe parameters.
+        num_threads (Optional[int], optional): Threads of the run. Defaults to None (cnmfe.num_threads).
+
+    Returns:
+        float: Estimated memory in GB.
+    """
+    n_frames, rows, cols = shape
+    num_threads = num_threads or cnmfe.num_threads
+    if cnmfe.processing_mode == "all_in_memory":
+        pixels = rows * cols
+    else:
+        side = min(cnmfe.patch_size + cnmfe.patch_overlap, max(rows, cols))
+        in_flight = 1
+        if cnmfe.processing_mode == "parallel_patches":
+            in_flight = min(num_threads, n_patches((rows, cols), cnmfe.patch_size, cnmfe.patch_overlap))
+        pixels = min(side, rows) * min(side, cols) * in_flight
+    return BASE_MEMORY_GB + n_frames * pixels * 4 * PATCH_COPIES / 1024**3
+
+
+def plan_cnmfe(
+    cnmfe: ISXCNMFe,
+    shapes: Sequence[Tuple[int, int, int]],
+    cpus: Optional[int] = None,
+    memory_gb: Optional[float] = None,
+    max_workers: Optional[int] = None,
+) -> CNMFePlan:
+    """Choose the number of concurrent CNMFe runs and threads per run.
+
+    Prefers running more movies at once, since patch level parallelism inside
+    a run stops scaling once threads exceed the number of patches. Each
+    option is checked against the memory estimate of the largest movie, and
+    the first that fits is used.
+
+    Args:
+        cnmfe (ISXCNMFe): CNMFe parameters.
+        shapes (Sequence[Tuple[int, int, int]]): (frames, rows, cols) of the queued movies.
+        cpus (Optional[int], optional): Cpus to use. Defaults to None (all).
+        memory_gb (Optional[float], optional): Memory budget in GB. Defaults to None (80% of the available memory).
+        max_workers (Optional[int], optional): Upper bound on concurrent runs. Defaults to None.
+
+    Returns:
+        CNMFePlan: The plan.
+    """
+    cpus = cpus or os.cpu_count() or 1
+    if memory_gb is None:
+        memory_gb = 0.8 * available_memory_gb()
+    largest = max(shapes, key=lambda s: s[0] * s[1] * s[2])
+    max_threads = cpus
+    if cnmfe.processing_mode == "parallel_patches":
+        max_threads = min(cpus, n_patches(largest[1:], cnmfe.patch_size, cnmfe.patch_overlap))
+    elif cnmfe.processing_mode == "sequential_patches":
+        max_threads = 1
+
+    upper = min(len(shapes), cpus, max_workers or cpus)
+    for n_workers in range(max(upper, 1), 0, -1):
+        threads = max(min(cpus // n_workers, max_threads), 1)
+        memory = estimate_cnmfe_memory_gb(largest, cnmfe, threads)
+        if n_workers * memory <= memory_gb:
+            return CNMFePlan(n_workers, threads, memory)
+
+    for threads in range(max_threads, 0, -1):
+        memory = estimate_cnmfe_memory_gb(largest, cnmfe, threads)
+        if memory <= memory_gb:
+            return CNMFePlan(1, threads, memory)
+    warnings.warn(
+        f"CNMFe is estimated to need {memory:.1f} GB, more than the {memory_gb:.1f} GB budget"
+    )
+    return CNMFePlan(1, 1, memory)
+
+
+class CNMFeScheduler:
+    def __init__(
+        self,
+        dispatcher: CNMFeDispatcher,
+        max_workers: Optional[int] = None,
+        memory_fraction: float = 0.8,
+        raise_on_error: bool = True,
+    ):
+        """
+        Runs CNMFe over many movies with concurrency sized to the machine.
+
+        The number of concurrent runs and the num_threads of each are derived
+        from the movie dimensions, patch_size/patch_overlap and the available
+        memory (see plan_cnmfe), then the movies are dispatched through a
+        BatchScheduler.
+
+        Args:
+            dispatcher (CNMFeDispatcher): Dispatcher to run for each movie. Its num_threads is overridden by the plan.
+            max_workers (Optional[int], optional): Upper bound on concurrent runs. Defaults to None.
+            memory_fraction (float, optional): Fraction of the available memory to plan for. Defaults to 0.8.
+            raise_on_error (bool, optional): Re-raise the first failure once all jobs finished. Defaults to True.
+        """
+        self.dispatcher = dispatcher
+        self.max_workers = max_workers
+        self.memory_fraction = memory_fraction
+        self.raise_on_error = raise_on_error
+
+    def plan(self, isx_videos: Sequence[Path]) -> CNMFePlan:
+        return self._plan([movie_shape(v) for v in isx_videos])
+
+    def _plan(self, shapes: Sequence[Tuple[int, int, int]]) -> CNMFePlan:
+        return plan_cnmfe(
+            self.dispatcher.cnmfe,
+            shapes,
+            memory_gb=self.memory_fraction * available_memory_gb(),
+            max_workers=self.max_workers,
+        )
+
+    def __call__(self, isx_videos: Iterable[Optional[Path]]) -> Dict[Path, Any]:
+        """Run CNMFe on every movie.
+
+        Sessions without a movie (None) are skipped with a warning. Movies
+        that cannot be read are reported like failed runs: with a warning and
+        their exception in place of a result, and the others still run.
+
+        Args:
+            isx_videos (Iterable[Optional[Path]]): Paths to motion corrected movies.
+
+        Returns:
+            Dict[Path, Any]: Output cellset of each movie, in input order.
+        """
+        videos = []
+        for video in isx_videos:
+            if video is None:
+                warnings.warn("Skipping a session without a motion corrected movie")
+                continue
+            videos.append(Path(video))
+        results: Dict[Path, Any] = {v: None for v in videos}
+        errors = []
+        shapes = {}
+        for video in videos:
+            try:
+                shapes[video] = movie_shape(video)
+            except Exception as e:
+                warnings.warn(f"Failed to read {video}: {e!r}")
+                results[video] = e
+                errors.append(e)
+        if shapes:
+            plan = self._plan(list(shapes.values()))
+            dispatcher = copy.deepcopy(self.dispatcher)
+            dispatcher.cnmfe.num_threads = plan.threads_per_job
+            results.update(
+                BatchScheduler(
+                    dispatcher,
+                    max_workers=plan.n_workers,
+                    cpus_per_job=plan.threads_per_job,
+                    raise_on_error=self.raise_on_error,
+                )(list(shapes))
+            )
+        if errors and self.raise_on_error:
+            raise errors[0]
+        return results
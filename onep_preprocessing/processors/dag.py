@@ -0,0 +1,120 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set
+import warnings
+
+
+@dataclass
+class Node:
+    """
+    A unit of work in a DAG.
+
+    Args:
+        name (str): Unique name of the node.
+        func (Callable[[], Any]): Function run by the node.
+        resource (str): Resource class the node runs under, e.g. "io" or "cpu". Each class has its own concurrency limit.
+        depends_on (Sequence[str]): Names of nodes that must finish before this one starts.
+    """
+
+    name: str
+    func: Callable[[], Any]
+    resource: str = "cpu"
+    depends_on: Sequence[str] = field(default_factory=tuple)
+
+
+class DAGExecutor:
+    def __init__(
+        self,
+        limits: Optional[Dict[str, int]] = None,
+        raise_on_error: bool = True,
+    ):
+        """
+        Runs a DAG of nodes with a separate thread pool for each resource class.
+
+        Nodes are started as soon as their dependencies have finished and their
+        resource class has a free slot. Ready nodes are started in the order
+        they were given, so earlier videos are favoured. Threads are enough
+        here because the stages spend their time in native code (isx, NumPy)
+        that does not hold the GIL.
+
+        Args:
+            limits (Optional[Dict[str, int]], optional): Maximum number of concurrent nodes for each resource class. Classes not listed get 1. Defaults to None.
+            raise_on_error (bool, optional): Re-raise the first failure once the DAG has finished. Nodes depending on a failed node are never run. Defaults to True.
+        """
+        self.limits = dict(limits) if limits is not None else {}
+        self.raise_on_error = raise_on_error
+
+    @staticmethod
+    def _validate(nodes: Sequence[Node]) -> None:
+        names = [node.name for node in nodes]
+        if len(set(names)) != len(names):
+            raise ValueError("Node names must be unique.")
+        known = set(names)
+        for node in nodes:
+            missing = [d for d in node.depends_on if d not in known]
+            if missing:
+                raise ValueError(f"{node.name} depends on unknown nodes: {missing}")
+
+    def __call__(self, nodes: Sequence[Node]) -> Dict[str, Any]:
+        """Run the DAG.
+
+        Args:
+            nodes (Sequence[Node]): Nodes to run.
+
+        Returns:
+            Dict[str, Any]: Output of each node, keyed by name. Failed nodes map to their exception and skipped nodes are absent.
+        """
+        self._validate(nodes)
+        resources = {node.resource for node in nodes}
+        pools = {
+            r: ThreadPoolExecutor(max_workers=self.limits.get(r, 1), thread_name_prefix=r)
+            for r in resources
+        }
+        running: Dict[str, int] = {r: 0 for r in resources}
+        pending: List[Node] = list(nodes)
+        futures: Dict[Future, Node] = {}
+        done: Set[str] = set()
+        failed: Set[str] = set()
+        results: Dict[str, Any] = {}
+        errors: List[BaseException] = []
+
+        try:
+            while pending or futures:
+                for node in list(pending):
+                    if any(d in failed for d in node.depends_on):
+                        # never run nodes downstream of a failure
+                        pending.remove(node)
+                        failed.add(node.name)
+                        continue
+                    if not all(d in done for d in node.depends_on):
+                        continue
+                    if running[node.resource] >= self.limits.get(node.resource, 1):
+                        continue
+                    pending.remove(node)
+                    running[node.resource] += 1
+                    futures[pools[node.resource].submit(node.func)] = node
+
+                if not futures:
+                    if pending:
+                        raise ValueError("DAG contains a cycle.")
+                    break
+
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    node = futures.pop(future)
+                    running[node.resource] -= 1
+                    try:
+                        results[node.name] = future.result()
+                        done.add(node.name)
+                    except Exception as e:
+                        warnings.warn(f"Node {node.name} failed: {e!r}")
+                        results[node.name] = e
+                        failed.add(node.name)
+                        errors.append(e)
+        finally:
+            for pool in pools.values():
+                pool.shutdown(wait=True)
+
+        if errors and self.raise_on_error:
+            raise errors[0]
+        return results
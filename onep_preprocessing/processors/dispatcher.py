@@ -1,5 +1,7 @@
-from typing import Any, Union, Optional
+from typing import Any, Dict, Iterable, List, Union, Optional
 from pathlib import Path
+from .build_cache import BuildCache
+from .dag import DAGExecutor, Node
 from .preprocessors import (
     ISXDownSampler,
     ISXSpatialFilterer,
@@ -15,9 +17,11 @@ class Dispatcher:
 
     Args:
         output_dir (Optional[Union[Path, str]], optional): Output directory, relative or absolute. Defaults to None.
-        on_exists (str): What to do if the output file already exists {"overwrite", "raise", "skip"}. Defaults to "overwrite".
+        on_exists (str): What to do if the output file already exists {"overwrite", "raise", "skip", "incremental"}. "incremental" reruns a stage only if its inputs or processor parameters changed, see BuildCache. Defaults to "overwrite".
     """
 
+    build_cache = BuildCache()
+
     def __init__(self, output_dir, on_exists: str = "overwrite"):
         self.output_dir = output_dir
         self.on_exists = on_exists
@@ -54,6 +58,41 @@ class Dispatcher:
                 raise ValueError(f"Unknown on_exists value: {self.on_exists}")
         return False
 
+    def needs_run(self, processor: Any, in_vid: Path, out_vid: Path) -> bool:
+        """Decide whether a stage has to be run, removing stale outputs.
+
+        Args:
+            processor (Any): Processor of the stage.
+            in_vid (Path): Input of the stage.
+            out_vid (Path): Output of the stage.
+
+        Returns:
+            bool: True if the processor should be called.
+        """
+        if self.on_exists == "incremental":
+            if self.build_cache.is_up_to_date(processor, [in_vid], out_vid):
+                return False
+            self.build_cache.invalidate(out_vid)
+            return True
+        return not self.file_exists(out_vid)
+
+    def run_stage(self, processor: Any, in_vid: Path, out_vid: Path) -> Path:
+        """Run a single stage if needed.
+
+        Args:
+            processor (Any): Processor of the stage.
+            in_vid (Path): Input of the stage.
+            out_vid (Path): Output of the stage.
+
+        Returns:
+            Path: Output of the stage.
+        """
+        if self.needs_run(processor, in_vid, out_vid):
+            processor(in_vid, out_vid)
+            if self.on_exists == "incremental":
+                self.build_cache.record(processor, [in_vid], out_vid)
+        return out_vid
+
     def __call__(self, isx_video: Path) -> Any:
         ...
 
@@ -64,20 +103,33 @@ class PreprocessorDispatcher(Dispatcher):
         downsampler: ISXDownSampler,
         spatial_filterer: ISXSpatialFilterer,
         motion_corrector: ISXMotionCorrector,
-        dff: ISXDff,
+        dff: Optional[ISXDff],
         output_dir: Optional[Union[Path, str]] = None,
         on_exists: str = "overwrite",
+        io_workers: int = 1,
+        cpu_workers: int = 1,
+        suffix: str = ".isxd",
     ):
         """
         A class that dispatches preprocessing operations.
 
+        Each stage of each video is a node in a DAG. When several videos are
+        dispatched together, stages of different videos overlap: video B is
+        downsampled while video A is motion corrected, and dF/F (which only
+        needs the motion corrected output) overlaps with later stages of other
+        videos. Downsampling and dF/F are limited by io_workers, spatial
+        filtering and motion correction by cpu_workers.
+
         Args:
             downsampler (ISXDownSampler): Downsampler.
             spatial_filterer (ISXSpatialFilterer): Spatial filterer.
             motion_corrector (ISXMotionCorrector): Motion corrector.
-            dff (ISXDff): Dff.
+            dff (Optional[ISXDff]): Dff. None skips the dF/F movie, e.g. when traces are normalised after cell extraction with native.dff.TraceDff.
             output_dir (Optional[Union[Path, str]], optional): Output directory, relative or absolute. Defaults to None.
-            on_exists (str): What to do if the output file already exists {"overwrite", "raise", "skip"}. Defaults to "overwrite".
+            on_exists (str): What to do if the output file already exists {"overwrite", "raise", "skip", "incremental"}. Defaults to "overwrite".
+            io_workers (int, optional): Maximum number of concurrent I/O-heavy stages (downsample, dF/F). Defaults to 1.
+            cpu_workers (int, optional): Maximum number of concurrent CPU-heavy stages (spatial filter, motion correction). Defaults to 1.
+            suffix (str, optional): File suffix of the stage outputs. Native backends write .isxd, .npy or .raw. Defaults to ".isxd".
         """
         self.downsampler = downsampler
         self.spatial_filterer = spatial_filterer
@@ -85,40 +137,89 @@ class PreprocessorDispatcher(Dispatcher):
         self.dff = dff
         self.output_dir = output_dir
         self.on_exists = on_exists
+        self.io_workers = io_workers
+        self.cpu_workers = cpu_workers
+        self.suffix = suffix
 
-    def __call__(self, isx_video: Path) -> Any:
-        """Dispatch preprocessing operations.
+    def build_nodes(self, isx_video: Path) -> List[Node]:
+        """Build the DAG nodes for preprocessing a single video.
 
         Args:
             isx_video (Path): Path to ISX video.
 
         Returns:
-            Any: Output of the last preprocessing operation.
+            List[Node]: Nodes named "<video>:<stage>", in topological order.
         """
         output_dir = self._get_outputdir(isx_video.parent)
         output_dir.mkdir(exist_ok=True, parents=True)
 
-        # Downsample
-        downsampler_output = output_dir / f"{isx_video.stem}_downsampled.isxd"
-        if not self.file_exists(downsampler_output):
-            self.downsampler(isx_video, downsampler_output)
+        downsampler_output = output_dir / f"{isx_video.stem}_downsampled{self.suffix}"
+        spatial_filterer_output = output_dir / f"{isx_video.stem}_spatial_filtered{self.suffix}"
+        motion_corrector_output = output_dir / f"{isx_video.stem}_motion_corrected{self.suffix}"
+        dff_output = output_dir / f"{isx_video.stem}_dff{self.suffix}"
 
-        # Spatial filter
-        spatial_filterer_output = output_dir / f"{isx_video.stem}_spatial_filtered.isxd"
-        if not self.file_exists(spatial_filterer_output):
-            self.spatial_filterer(downsampler_output, spatial_filterer_output)
+        name = str(isx_video)
+        nodes = [
+            Node(
+                name=f"{name}:downsample",
+                func=lambda: self.run_stage(self.downsampler, isx_video, downsampler_output),
+                resource="io",
+            ),
+            Node(
+                name=f"{name}:spatial_filter",
+                func=lambda: self.run_stage(
+                    self.spatial_filterer, downsampler_output, spatial_filterer_output
+                ),
+                resource="cpu",
+                depends_on=(f"{name}:downsample",),
+            ),
+            Node(
+                name=f"{name}:motion_correct",
+                func=lambda: self.run_stage(
+                    self.motion_corrector, spatial_filterer_output, motion_corrector_output
+                ),
+                resource="cpu",
+                depends_on=(f"{name}:spatial_filter",),
+            ),
+        ]
+        if self.dff is not None:
+            nodes.append(
+                Node(
+                    name=f"{name}:dff",
+                    func=lambda: self.run_stage(self.dff, motion_corrector_output, dff_output),
+                    resource="io",
+                    depends_on=(f"{name}:motion_correct",),
+                )
+            )
+        return nodes
 
-        # Motion correct
-        motion_corrector_output = output_dir / f"{isx_video.stem}_motion_corrected.isxd"
-        if not self.file_exists(motion_corrector_output):
-            self.motion_corrector(spatial_filterer_output, motion_corrector_output)
+    def dispatch_many(self, isx_videos: Iterable[Path]) -> Dict[Path, Any]:
+        """Dispatch preprocessing operations for several videos with cross-video pipelining.
 
-        # DFF
-        dff_output = output_dir / f"{isx_video.stem}_dff.isxd"
-        if not self.file_exists(dff_output):
-            self.dff(motion_corrector_output, dff_output)
+        Args:
+            isx_videos (Iterable[Path]): Paths to ISX videos.
 
-        return motion_corrector_output
+        Returns:
+            Dict[Path, Any]: Motion corrected output of each video.
+        """
+        isx_videos = [Path(v) for v in isx_videos]
+        nodes: List[Node] = []
+        for isx_video in isx_videos:
+            nodes.extend(self.build_nodes(isx_video))
+        executor = DAGExecutor(limits={"io": self.io_workers, "cpu": self.cpu_workers})
+        results = executor(nodes)
+        return {v: results.get(f"{v}:motion_correct") for v in isx_videos}
+
+    def __call__(self, isx_video: Path) -> Any:
+        """Dispatch preprocessing operations.
+
+        Args:
+            isx_video (Path): Path to ISX video.
+
+        Returns:
+            Any: Output of the last preprocessing operation.
+        """
+        return self.dispatch_many([isx_video])[Path(isx_video)]
 
 
 class CNMFeDispatcher(Dispatcher):
@@ -134,7 +235,7 @@ class CNMFeDispatcher(Dispatcher):
         Args:
             cnmfe (ISXCNMFe): CNMFe.
             output_dir (Optional[Union[Path, str]], optional): Output directory, relative or absolute. Defaults to None.
-            on_exists (str): What to do if the output file already exists {"overwrite", "raise", "skip"}. Defaults to "overwrite".
+            on_exists (str): What to do if the output file already exists {"overwrite", "raise", "skip", "incremental"}. Defaults to "overwrite".
         """
         self.cnmfe = cnmfe
         self.output_dir = output_dir
@@ -154,7 +255,4 @@ class CNMFeDispatcher(Dispatcher):
 
         # CNMFe
         cnmfe_output = output_dir / f"{isx_video.stem}_cnmfe_cellset.isxd"
-        if not self.file_exists(cnmfe_output):
-            self.cnmfe(isx_video, cnmfe_output)
-
-        return cnmfe_output
+        return self.run_stage(self.cnmfe, isx_video, cnmfe_output)
@@ -0,0 +1,264 @@
+from contextlib import nullcontext
+import warnings
+from typing import Any, Dict, Optional, Sequence, Union
+from pathlib import Path
+import numpy as np
+from .dispatcher import Dispatcher
+from .preprocessors import (
+    ISXDownSampler,
+    ISXSpatialFilterer,
+    ISXMotionCorrector,
+    ISXDff,
+)
+from ..native.movie_io import open_movie, iter_chunks, read_metadata, MovieWriter
+from ..native.downsample import (
+    cast_frames,
+    downsample,
+    downsampled_dtype,
+    movie_defective_pixel_mask,
+)
+from ..native.spatial_filter import bandpass
+from ..native.motion_correction import RigidRegistration
+from ..native.dff import F0Accumulator, SlidingPercentileF0, apply_dff
+
+
+INTERMEDIATES = ("downsampled", "spatial_filtered")
+
+
+class FusedPreprocessorDispatcher(Dispatcher):
+    def __init__(
+        self,
+        downsampler: ISXDownSampler,
+        spatial_filterer: ISXSpatialFilterer,
+        motion_corrector: ISXMotionCorrector,
+        dff: Optional[ISXDff],
+        output_dir: Optional[Union[Path, str]] = None,
+        on_exists: str = "overwrite",
+        frames_per_chunk: int = 200,
+        keep_intermediates: Sequence[str] = (),
+        suffix: str = ".npy",
+    ):
+        """
+        Preprocesses a movie in memory, chunk by chunk, without the isx backend.
+
+        Frames are streamed through NumPy implementations of downsample ->
+        bandpass spatial filter -> rigid registration, and the motion corrected
+        movie is written while a mean or min F0 is accumulated, ignoring the
+        margins left by the registration. A second pass over the motion
+        corrected movie subtracts the global minimum (if requested) and zeroes
+        the margins in place and writes dF/F. A sliding percentile F0 is
+        computed from the fixed movie between the two, which costs one more
+        read of it. Only the motion corrected and dF/F movies are written,
+        plus any intermediates listed in keep_intermediates. These are the
+        same as the outputs of the numpy backend stages: the downsampled
+        movie is rounded to the input dtype (and filtered as such) and the
+        spatially filtered movie has its global minimum subtracted. Peak
+        memory is set by frames_per_chunk, not by the length of the
+        recording.
+
+        Parameters are taken from the same processor objects used by
+        PreprocessorDispatcher. Options the native chain does not implement
+        (e.g. trim_early_frames, translation files) are ignored.
+
+        Args:
+            downsampler (ISXDownSampler): Downsampler. Factors must be integers.
+            spatial_filterer (ISXSpatialFilterer): Spatial filterer.
+            motion_corrector (ISXMotionCorrector): Motion corrector.
+            dff (Optional[ISXDff]): Dff. None skips the dF/F movie and its F0.
+            output_dir (Optional[Union[Path, str]], optional): Output directory, relative or absolute. Defaults to None.
+            on_exists (str): What to do if the output file already exists {"overwrite", "raise", "skip", "incremental"}. All outputs are written by one run, so "skip" and "incremental" only skip a movie when every output is there (and, for "incremental", up to date); otherwise all of them are rewritten. Defaults to "overwrite".
+            frames_per_chunk (int, optional): Number of raw frames read at a time. Defaults to 200.
+            keep_intermediates (Sequence[str], optional): Intermediate movies to persist {"downsampled", "spatial_filtered"}. Defaults to ().
+            suffix (str, optional): File suffix of the movies. Defaults to ".npy".
+        """
+        unknown = set(keep_intermediates) - set(INTERMEDIATES)
+        if unknown:
+            raise ValueError(f"Unknown intermediates: {sorted(unknown)}")
+        self.downsampler = downsampler
+        self.spatial_filterer = spatial_filterer
+        self.motion_corrector = motion_corrector
+        self.dff = dff
+        self.output_dir = output_dir
+        self.on_exists = on_exists
+        self.frames_per_chunk = frames_per_chunk
+        self.keep_intermediates = tuple(keep_intermediates)
+        self.suffix = suffix
+
+    def output_paths(self, isx_video: Path) -> Dict[str, Path]:
+        output_dir = self._get_outputdir(isx_video.parent)
+        names = self.keep_intermediates + ("motion_corrected",)
+        if self.dff is not None:
+            names += ("dff",)
+        return {name: output_dir / f"{isx_video.stem}_{name}{self.suffix}" for name in names}
+
+    def _needs_run(self, isx_video: Path, outputs: Dict[str, Path]) -> bool:
+        if self.on_exists == "incremental":
+            if all(
+                self.build_cache.is_up_to_date(self, [isx_video], out)
+                for out in outputs.values()
+            ):
+                return False
+            for out in outputs.values():
+                self.build_cache.invalidate(out)
+            return True
+        if self.on_exists == "skip":
+            # a partial set of outputs is rewritten as a whole
+            if all(out.exists() for out in outputs.values()):
+                warnings.warn(f"Skipping {isx_video}, all outputs already exist.")
+                return False
+            return True
+        exists = [self.file_exists(out) for out in outputs.values()]
+        return not all(exists)
+
+    def _process_chunk(
+        self, raw: np.ndarray, defective_mask: Optional[np.ndarray] = None
+    ) -> Any:
+        downsampled = downsample(
+            raw,
+            temporal_factor=self.downsampler.temporal_factor,
+            spatial_factor=self.downsampler.spatial_factor,
+            crop_rect=self.downsampler.crop_rect,
+            fix_defective_pixels=self.downsampler.fix_defective_pixels,
+            defective_mask=defective_mask,
+        )
+        downsampled = cast_frames(downsampled, downsampled_dtype(raw.dtype))
+        filtered = bandpass(
+            downsampled,
+            low_cutoff=self.spatial_filterer.low_cutoff,
+            high_cutoff=self.spatial_filterer.high_cutoff,
+            retain_mean=self.spatial_filterer.retain_mean,
+        )
+        return downsampled, filtered
+
+    def _registration(self, reference: np.ndarray) -> RigidRegistration:
+        mc = self.motion_corrector
+        return RigidRegistration(
+            reference,
+            max_translation=mc.max_translation,
+            low_bandpass_cutoff=mc.low_bandpass_cutoff,
+            high_bandpass_cutoff=mc.high_bandpass_cutoff,
+            roi=mc.roi,
+            global_registration_weight=mc.global_registration_weight,
+            num_threads=mc.num_threads,
+        )
+
+    def _run(self, isx_video: Path, outputs: Dict[str, Path]) -> None:
+        raw = open_movie(isx_video)
+        metadata = read_metadata(isx_video)
+        temporal_factor = int(self.downsampler.temporal_factor)
+        n_frames = len(raw) // temporal_factor
+        chunk = max(self.frames_per_chunk // temporal_factor, 1) * temporal_factor
+        frame_period = (
+            metadata.frame_period * temporal_factor if metadata.frame_period else None
+        )
+        defective_mask = (
+            movie_defective_pixel_mask(
+                isx_video, self.downsampler.crop_rect, frames_per_chunk=chunk
+            )
+            if self.downsampler.fix_defective_pixels
+            else None
+        )
+
+        ref_index = self.motion_corrector.reference_frame_index
+        ref_raw = raw[ref_index * temporal_factor : (ref_index + 1) * temporal_factor]
+        _, reference = self._process_chunk(np.asarray(ref_raw), defective_mask)
+        registration = self._registration(reference[0])
+        frame_shape = reference.shape[1:]
+
+        dtypes = {"downsampled": downsampled_dtype(metadata.dtype)}
+        writers = {
+            name: MovieWriter(
+                path,
+                frame_shape,
+                dtype=dtypes.get(name, np.float32),
+                n_frames=n_frames,
+                frame_period=frame_period,
+            )
+            for name, path in outputs.items()
+            if name != "dff"
+        }
+        percentile_f0 = self.dff is not None and self.dff.f0_type == "percentile"
+        f0 = F0Accumulator(self.dff.f0_type) if self.dff is not None and not percentile_f0 else None
+        global_min = np.inf
+
+        # pass 1: raw -> motion corrected, accumulating F0 and the global minimum
+        for raw_chunk in iter_chunks(isx_video, chunk):
+            if len(raw_chunk) < temporal_factor:
+                break
+            downsampled, filtered = self._process_chunk(raw_chunk, defective_mask)
+            if "downsampled" in writers:
+                writers["downsampled"].write(downsampled)
+            if "spatial_filtered" in writers:
+                writers["spatial_filtered"].write(filtered)
+            global_min = min(global_min, float(filtered.min()))
+
+            registered, _ = registration.register(filtered, fill_value=np.nan)
+            writers["motion_corrected"].write(registered)
+            if f0 is not None:
+                f0.update(registered)
+        registration.close()
+        for writer in writers.values():
+            writer.close()
+
+        # pass 2: fix the motion corrected movie in place and write dF/F
+        offset = global_min if self.spatial_filterer.subtract_global_minimum else 0.0
+        out_chunk = chunk // temporal_factor
+        if "spatial_filtered" in outputs and offset:
+            filtered = open_movie(outputs["spatial_filtered"], mode="r+")
+            for start in range(0, n_frames, out_chunk):
+                filtered[start : start + out_chunk] -= np.float32(offset)
+            filtered.flush()
+            del filtered
+        motion_corrected = open_movie(outputs["motion_corrected"], mode="r+")
+
+        def fix(start: int) -> np.ndarray:
+            frames = np.asarray(motion_corrected[start : start + out_chunk]) - offset
+            frames[np.isnan(frames)] = 0
+            motion_corrected[start : start + out_chunk] = frames
+            return frames
+
+        f0_offset = offset
+        if percentile_f0:
+            # the percentile is taken over the fixed movie, margins included,
+            # like a numpy ISXDff on the motion corrected stage output
+            for start in range(0, n_frames, out_chunk):
+                fix(start)
+            f0 = SlidingPercentileF0(
+                motion_corrected, window=self.dff.window, percentile=self.dff.percentile
+            )
+            f0_offset = 0.0
+        dff_writer = (
+            MovieWriter(outputs["dff"], frame_shape, n_frames=n_frames, frame_period=frame_period)
+            if "dff" in outputs
+            else nullcontext()
+        )
+        with dff_writer:
+            for start in range(0, n_frames, out_chunk):
+                if percentile_f0:
+                    frames = np.asarray(motion_corrected[start : start + out_chunk])
+                else:
+                    frames = fix(start)
+                if f0 is not None:
+                    baseline = f0.at(range(start, start + len(frames))) - f0_offset
+                    dff_writer.write(apply_dff(frames, baseline))
+        motion_corrected.flush()
+        del motion_corrected
+
+    def __call__(self, isx_video: Path) -> Any:
+        """Run the fused preprocessing chain.
+
+        Args:
+            isx_video (Path): Path to the raw movie.
+
+        Returns:
+            Any: Path to the motion corrected movie.
+        """
+        isx_video = Path(isx_video)
+        outputs = self.output_paths(isx_video)
+        outputs["motion_corrected"].parent.mkdir(exist_ok=True, parents=True)
+        if self._needs_run(isx_video, outputs):
+            self._run(isx_video, outputs)
+            if self.on_exists == "incremental":
+                for out in outputs.values():
+                    self.build_cache.record(self, [isx_video], out)
+        return outputs["motion_corrected"]
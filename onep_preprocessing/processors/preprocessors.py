@@ -1,14 +1,52 @@
-import isx
-from typing import Any, Union
+from typing import Any, Optional, Union
 from pathlib import Path
+import time
+from ..native.downsample import downsample_movie
+from ..native.spatial_filter import filter_movie
+from ..native.motion_correction import motion_correct_movie
+from ..native.dff import F0Accumulator, dff_movie, save_f0
+
+try:
+    import isx
+except ImportError:
+    isx = None
+
+
+def require_isx() -> Any:
+    """Return the isx module, raising a helpful error if it is not installed."""
+    if isx is None:
+        raise ImportError(
+            "The Inscopix isx package is required for this operation. "
+            "Install it or use a native backend."
+        )
+    return isx
 
 
 class ISXPreprocessor:
+    backends = ("isx",)
+
+    def _check_backend(self, backend: str) -> str:
+        if backend not in self.backends:
+            raise ValueError(
+                f"Unknown backend for {type(self).__name__}: {backend}. Expected one of {self.backends}"
+            )
+        return backend
+
+    @property
+    def frames_per_second(self) -> Optional[float]:
+        """Input frames processed per second by the last call, None if unknown."""
+        return getattr(self, "_frames_per_second", None)
+
+    def _record_throughput(self, n_frames: int, start: float) -> None:
+        self._frames_per_second = n_frames / max(time.perf_counter() - start, 1e-9)
+
     def __call__(self, in_vid: Path, out_vid: Path):
         raise NotImplementedError
 
 
 class ISXDownSampler(ISXPreprocessor):
+    backends = ("isx", "numpy")
+
     def __init__(
         self,
         temporal_factor: float = 2,
@@ -16,67 +54,123 @@ class ISXDownSampler(ISXPreprocessor):
         crop_rect: Union[Any, None] = None,
         fix_defective_pixels: bool = True,
         trim_early_frames: bool = True,
+        backend: str = "isx",
+        frames_per_chunk: int = 200,
     ):
         """
 
+        The "numpy" backend runs without the Inscopix runtime on movies readable
+        by onep_preprocessing.native.movie_io, see native.downsample.downsample_movie
+        for its numerical agreement with isx. It needs integer factors and
+        ignores trim_early_frames, as the native containers have no frame
+        timestamps to trim by.
+
         Args:
             temporal_factor (float, optional): Temporal downsample factor. Defaults to 2.
             spatial_factor (float, optional): Spatial downsample factor. Defaults to 4.
             crop_rect (Union[Any, None], optional): A list of 4 pixel locations that determines the crop rectangle: [top, left, bottom, right]. Defaults to None.
             fix_defective_pixels (bool, optional): Fix defective pixels. Defaults to True.
             trim_early_frames (bool, optional): Trim early frames. Defaults to True.
+            backend (str, optional): Implementation to use {"isx", "numpy"}. Defaults to "isx".
+            frames_per_chunk (int, optional): Number of frames processed at a time by the numpy backend. Defaults to 200.
         """
         self.temporal_factor = temporal_factor
         self.spatial_factor = spatial_factor
         self.crop_rect = crop_rect
         self.fix_defective_pixels = fix_defective_pixels
         self.trim_early_frames = trim_early_frames
+        self.backend = self._check_backend(backend)
+        self.frames_per_chunk = frames_per_chunk
 
     def __call__(self, in_vid: Path, out_vid: Path):
-        isx.preprocess(
-            str(in_vid),
-            str(out_vid),
-            temporal_downsample_factor=self.temporal_factor,
-            spatial_downsample_factor=self.spatial_factor,
-            crop_rect=self.crop_rect,
-            fix_defective_pixels=self.fix_defective_pixels,
-            trim_early_frames=self.trim_early_frames,
-        )
+        start = time.perf_counter()
+        if self.backend == "numpy":
+            n_frames = downsample_movie(
+                in_vid,
+                out_vid,
+                temporal_factor=self.temporal_factor,
+                spatial_factor=self.spatial_factor,
+                crop_rect=self.crop_rect,
+                fix_defective_pixels=self.fix_defective_pixels,
+                frames_per_chunk=self.frames_per_chunk,
+            )
+        else:
+            isx = require_isx()
+            isx.preprocess(
+                str(in_vid),
+                str(out_vid),
+                temporal_downsample_factor=self.temporal_factor,
+                spatial_downsample_factor=self.spatial_factor,
+                crop_rect=self.crop_rect,
+                fix_defective_pixels=self.fix_defective_pixels,
+                trim_early_frames=self.trim_early_frames,
+            )
+            n_frames = isx.Movie.read(str(in_vid)).timing.num_samples
+        self._record_throughput(n_frames, start)
 
 
 class ISXSpatialFilterer(ISXPreprocessor):
+    backends = ("isx", "numpy")
+
     def __init__(
         self,
         low_cutoff: float = 0.005,
         high_cutoff: float = 0.5,
         retain_mean: bool = False,
         subtract_global_minimum: bool = True,
+        backend: str = "isx",
+        frames_per_chunk: int = 100,
     ):
         """
 
+        The "numpy" backend filters batches of frames with real FFTs against a
+        cached Gaussian bandpass kernel and writes float32 frames, see
+        native.spatial_filter.filter_movie.
+
         Args:
             low_cutoff (float, optional): Low cutoff frequency. Defaults to 0.005.
             high_cutoff (float, optional): High cutoff frequency. Defaults to 0.5.
             retain_mean (bool, optional): Retain mean. Defaults to False.
-            subtract_global_minimum (bool, optional): Subtract global minimum after frame by frame. By doing this, all pixel intensities will stay positive valued, and integer-valued movies can stay that way. Defaults to True.
+            subtract_global_minimum (bool, optional): Subtract global minimum after frame by frame, so all pixel intensities stay positive valued. The numpy backend always writes float32 frames, whatever the input dtype. Defaults to True.
+            backend (str, optional): Implementation to use {"isx", "numpy"}. Defaults to "isx".
+            frames_per_chunk (int, optional): Number of frames filtered at a time by the numpy backend. Defaults to 100.
         """
         self.low_cutoff = low_cutoff
         self.high_cutoff = high_cutoff
         self.retain_mean = retain_mean
         self.subtract_global_minimum = subtract_global_minimum
+        self.backend = self._check_backend(backend)
+        self.frames_per_chunk = frames_per_chunk
 
     def __call__(self, in_vid: Path, out_vid: Path):
-        isx.spatial_filter(
-            str(in_vid),
-            str(out_vid),
-            low_cutoff=self.low_cutoff,
-            high_cutoff=self.high_cutoff,
-            retain_mean=self.retain_mean,
-            subtract_global_minimum=self.subtract_global_minimum,
-        )
+        start = time.perf_counter()
+        if self.backend == "numpy":
+            n_frames = filter_movie(
+                in_vid,
+                out_vid,
+                low_cutoff=self.low_cutoff,
+                high_cutoff=self.high_cutoff,
+                retain_mean=self.retain_mean,
+                subtract_global_minimum=self.subtract_global_minimum,
+                frames_per_chunk=self.frames_per_chunk,
+            )
+        else:
+            isx = require_isx()
+            isx.spatial_filter(
+                str(in_vid),
+                str(out_vid),
+                low_cutoff=self.low_cutoff,
+                high_cutoff=self.high_cutoff,
+                retain_mean=self.retain_mean,
+                subtract_global_minimum=self.subtract_global_minimum,
+            )
+            n_frames = isx.Movie.read(str(in_vid)).timing.num_samples
+        self._record_throughput(n_frames, start)
 
 
 class ISXMotionCorrector(ISXPreprocessor):
+    backends = ("isx", "numpy")
+
     def __init__(
         self,
         max_translation: float = 20,
@@ -89,8 +183,22 @@ class ISXMotionCorrector(ISXPreprocessor):
         global_registration_weight: float = 1,
         output_translation_files: Union[Any, None] = None,
         output_crop_rect_file: Union[Any, None] = None,
+        backend: str = "isx",
+        frames_per_chunk: int = 200,
+        num_threads: Optional[int] = None,
+        f0_type: Optional[str] = None,
     ):
         """
+
+        The "numpy" backend estimates translations by phase correlation against
+        a cached reference spectrum with upsampled DFT sub-pixel refinement,
+        splitting each chunk of frames across a thread pool, see
+        native.motion_correction.motion_correct_movie. It supports a single
+        input movie, so reference_segment_index must be 0 and only the first
+        of output_translation_files is written. If f0_type is set, it also
+        accumulates a per-pixel F0 while writing the output and stores it next
+        to it, so a numpy ISXDff with the same f0_type skips its F0 pass.
+
         Args:
             max_translation (float, optional): Maximum translation in pixels. Defaults to 20.
             low_bandpass_cutoff (float, optional): Low bandpass cutoff frequency. Defaults to 0.004.
@@ -102,6 +210,10 @@ class ISXMotionCorrector(ISXPreprocessor):
             global_registration_weight (float, optional): When this is set to 1, only the reference frame is used for motion estimation. When this is less than 1, the previous frame is also used for motion estimation. The closer this value is to 0, the more the previous frame is used and the less the reference frame is used.
             output_translation_files (Any | None, optional):  A list of file names to write the X and Y translations to. Must be either None, in which case no files are written, or a list of valid file names equal in length to the number of input and output file names. The output translations are written into a .csv file with three columns. The first two columns, "translationX" and "translationY", store the X and Y translations from each frame to the reference frame respectively. The third column contains the time of the frame since the beginning of the movie. The first row stores the column names as a header. Each subsequent row contains the X translation, Y translation, and time offset for that frame.
             output_crop_rect_file (Any | None, optional): The path to a file that will contain the crop rectangle applied to the input movies to generate the output movies. The format of the crop rectangle is a comma separated list: x,y,width,height.
+            backend (str, optional): Implementation to use {"isx", "numpy"}. Defaults to "isx".
+            frames_per_chunk (int, optional): Number of frames registered at a time by the numpy backend. Defaults to 200.
+            num_threads (Optional[int], optional): Number of threads used by the numpy backend. Defaults to None (number of cpus).
+            f0_type (Optional[str], optional): F0 to accumulate during the numpy backend's write {'mean', 'min'}. Defaults to None.
         """
         self.max_translation = max_translation
         self.low_bandpass_cutoff = low_bandpass_cutoff
@@ -113,8 +225,46 @@ class ISXMotionCorrector(ISXPreprocessor):
         self.global_registration_weight = global_registration_weight
         self.output_translation_files = output_translation_files
         self.output_crop_rect_file = output_crop_rect_file
+        self.backend = self._check_backend(backend)
+        self.frames_per_chunk = frames_per_chunk
+        self.num_threads = num_threads
+        if f0_type is not None and f0_type not in ("mean", "min"):
+            raise ValueError(f"Unknown f0_type: {f0_type}")
+        self.f0_type = f0_type
+
+    def _motion_correct_numpy(self, in_vid: Path, out_vid: Path) -> int:
+        if self.reference_segment_index != 0:
+            raise ValueError("The numpy backend only supports reference_segment_index=0")
+        translation_file = self.output_translation_files
+        if isinstance(translation_file, (list, tuple)):
+            translation_file = translation_file[0] if translation_file else None
+        f0 = F0Accumulator(self.f0_type) if self.f0_type else None
+        n_frames = motion_correct_movie(
+            in_vid,
+            out_vid,
+            max_translation=self.max_translation,
+            low_bandpass_cutoff=self.low_bandpass_cutoff,
+            high_bandpass_cutoff=self.high_bandpass_cutoff,
+            roi=self.roi,
+            reference_frame_index=self.reference_frame_index,
+            reference_file_name=self.reference_file_name,
+            global_registration_weight=self.global_registration_weight,
+            output_translation_file=translation_file,
+            output_crop_rect_file=self.output_crop_rect_file,
+            frames_per_chunk=self.frames_per_chunk,
+            num_threads=self.num_threads,
+            on_chunk=f0.update if f0 else None,
+        )
+        if f0 is not None and n_frames:
+            save_f0(out_vid, f0)
+        return n_frames
 
     def __call__(self, in_vid: Path, out_vid: Path):
+        start = time.perf_counter()
+        if self.backend == "numpy":
+            self._record_throughput(self._motion_correct_numpy(in_vid, out_vid), start)
+            return
+        isx = require_isx()
         isx.motion_correct(
             str(in_vid),
             str(out_vid),
@@ -128,28 +278,60 @@ class ISXMotionCorrector(ISXPreprocessor):
             reference_file_name=self.reference_file_name,
             output_translation_files=self.output_translation_files,
             output_crop_rect_file=self.output_crop_rect_file,
-            
         )
+        self._record_throughput(isx.Movie.read(str(in_vid)).timing.num_samples, start)
 
 
 class ISXDff(ISXPreprocessor):
+    backends = ("isx", "numpy")
+
     def __init__(
         self,
         f0_type: str = "mean",
+        backend: str = "isx",
+        window: int = 1000,
+        percentile: float = 8,
+        frames_per_chunk: int = 200,
     ):
         """
 
+        The "numpy" backend reuses the F0 stored by a numpy ISXMotionCorrector
+        with the same f0_type, so it reads the motion corrected movie once. It
+        also supports a sliding window percentile F0 ('percentile') for long
+        recordings where bleaching makes one F0 wrong. See native.dff.
+
         Args:
-            f0_type (str, optional): Type of F0 to use {'mean', 'min'}. Defaults to "mean".
+            f0_type (str, optional): Type of F0 to use {'mean', 'min', 'percentile'}. 'percentile' needs the numpy backend. Defaults to "mean".
+            backend (str, optional): Implementation to use {"isx", "numpy"}. Defaults to "isx".
+            window (int, optional): Window length in frames for 'percentile'. Defaults to 1000.
+            percentile (float, optional): Percentile for 'percentile'. Defaults to 8.
+            frames_per_chunk (int, optional): Number of frames processed at a time by the numpy backend. Defaults to 200.
         """
         self.f0_type = f0_type
+        self.backend = self._check_backend(backend)
+        if f0_type == "percentile" and self.backend != "numpy":
+            raise ValueError("f0_type='percentile' needs the numpy backend")
+        self.window = window
+        self.percentile = percentile
+        self.frames_per_chunk = frames_per_chunk
 
     def __call__(self, in_vid: Path, out_vid: Path):
-        isx.dff(
-            str(in_vid),
-            str(out_vid),
-            f0_type=self.f0_type,
-        )
-
-
-    
\ No newline at end of file
+        start = time.perf_counter()
+        if self.backend == "numpy":
+            n_frames = dff_movie(
+                in_vid,
+                out_vid,
+                f0_type=self.f0_type,
+                window=self.window,
+                percentile=self.percentile,
+                frames_per_chunk=self.frames_per_chunk,
+            )
+        else:
+            isx = require_isx()
+            isx.dff(
+                str(in_vid),
+                str(out_vid),
+                f0_type=self.f0_type,
+            )
+            n_frames = isx.Movie.read(str(in_vid)).timing.num_samples
+        self._record_throughput(n_frames, start)
@@ -0,0 +1,183 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+import os
+import warnings
+
+from .dispatcher import Dispatcher
+
+
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+
+def available_memory_gb() -> float:
+    """Return the amount of available physical memory in GB.
+
+    Uses psutil if it is installed, then falls back to sysconf. Returns inf if
+    neither is available, in which case memory budgets are not enforced.
+    """
+    try:
+        import psutil
+
+        return psutil.virtual_memory().available / 1024**3
+    except ImportError:
+        pass
+    try:
+        pages = os.sysconf("SC_AVPHYS_PAGES")
+        page_size = os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return float("inf")
+    return pages * page_size / 1024**3
+
+
+def raw_movies_from_root(
+    root_parser: Any,
+    session_attrs: Sequence[str] = ("ret_behavior_dir", "ext_behavior_dir"),
+) -> List[Path]:
+    """Collect the raw movies of selected sessions from an IsxRootParser.
+
+    Args:
+        root_parser (Any): A parsed IsxRootParserAstrocyteSet1/2.
+        session_attrs (Sequence[str], optional): Session attributes of each mouse dir to include. Defaults to ("ret_behavior_dir", "ext_behavior_dir").
+
+    Returns:
+        List[Path]: Raw movie paths. Sessions without a raw movie are skipped with a warning.
+    """
+    raw_movies: List[Path] = []
+    for mouse_dir in root_parser.mouse_dirs:
+        for attr in session_attrs:
+            session_dir = getattr(mouse_dir, attr)
+            if session_dir.raw_movie is None:
+                warnings.warn(f"No raw movie found in {session_dir.session_dir}")
+                continue
+            raw_movies.append(session_dir.raw_movie)
+    return raw_movies
+
+
+@contextmanager
+def thread_env(num_threads: int) -> Iterator[None]:
+    """Set THREAD_ENV_VARS to num_threads for the duration of the block.
+
+    Numerical libraries read these once, when they are loaded, so they must
+    be set before a worker process starts rather than by the worker itself.
+    """
+    previous = {var: os.environ.get(var) for var in THREAD_ENV_VARS}
+    os.environ.update({var: str(num_threads) for var in THREAD_ENV_VARS})
+    try:
+        yield
+    finally:
+        for var, value in previous.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+
+def _limit_threads(num_threads: int) -> None:
+    # the environment covers libraries loaded by the worker, threadpoolctl any already loaded
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    threadpool_limits(num_threads)
+
+
+def _run_job(dispatcher: Dispatcher, isx_video: Path) -> Any:
+    return dispatcher(isx_video)
+
+
+class BatchScheduler:
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        max_workers: Optional[int] = None,
+        cpus_per_job: int = 1,
+        memory_per_job_gb: Optional[float] = None,
+        raise_on_error: bool = True,
+    ):
+        """
+        Runs a dispatcher over many videos in a process pool.
+
+        The number of concurrent jobs is the smallest of max_workers, the number
+        of cpus divided by cpus_per_job and the available memory divided by
+        memory_per_job_gb. Keeping this bounded stops concurrent motion
+        correction jobs from thrashing the disk.
+
+        Workers are started with the "spawn" method and THREAD_ENV_VARS set
+        to cpus_per_job, so NumPy and isx in each worker load with that many
+        threads instead of inheriting the thread pools of the parent.
+
+        Args:
+            dispatcher (Dispatcher): Dispatcher to run for each video, e.g. a PreprocessorDispatcher. Must be picklable.
+            max_workers (Optional[int], optional): Upper bound on the number of concurrent jobs. Defaults to None (number of cpus).
+            cpus_per_job (int, optional): Number of cpus each job may use. Also caps the thread count of numerical libraries in each worker. Defaults to 1.
+            memory_per_job_gb (Optional[float], optional): Memory each job is expected to use, in GB. Defaults to None (not enforced).
+            raise_on_error (bool, optional): Re-raise the first failure once all jobs finished. If False, failures are returned in place of results. Defaults to True.
+        """
+        if cpus_per_job < 1:
+            raise ValueError("cpus_per_job must be at least 1")
+        self.dispatcher = dispatcher
+        self.max_workers = max_workers
+        self.cpus_per_job = cpus_per_job
+        self.memory_per_job_gb = memory_per_job_gb
+        self.raise_on_error = raise_on_error
+
+    def n_workers(self, n_jobs: Optional[int] = None) -> int:
+        """Number of jobs to run concurrently given the cpu and memory budgets.
+
+        Args:
+            n_jobs (Optional[int], optional): Number of queued jobs. Defaults to None.
+
+        Returns:
+            int: Number of workers, at least 1.
+        """
+        cpus = os.cpu_count() or 1
+        limits = [max(cpus // self.cpus_per_job, 1)]
+        if self.max_workers is not None:
+            limits.append(self.max_workers)
+        if self.memory_per_job_gb:
+            limits.append(int(min(available_memory_gb() // self.memory_per_job_gb, cpus)))
+        if n_jobs is not None:
+            limits.append(n_jobs)
+        return max(min(limits), 1)
+
+    def __call__(self, isx_videos: Iterable[Path]) -> Dict[Path, Any]:
+        """Dispatch every video in the process pool.
+
+        Args:
+            isx_videos (Iterable[Path]): Paths to ISX videos.
+
+        Returns:
+            Dict[Path, Any]: Output of the dispatcher for each video, in input order.
+        """
+        isx_videos = [Path(v) for v in isx_videos]
+        results: Dict[Path, Any] = {v: None for v in isx_videos}
+        errors: List[BaseException] = []
+        with thread_env(self.cpus_per_job), ProcessPoolExecutor(
+            max_workers=self.n_workers(len(isx_videos)),
+            mp_context=get_context("spawn"),
+            initializer=_limit_threads,
+            initargs=(self.cpus_per_job,),
+        ) as pool:
+            futures = {
+                pool.submit(_run_job, self.dispatcher, video): video
+                for video in isx_videos
+            }
+            for future in as_completed(futures):
+                video = futures[future]
+                try:
+                    results[video] = future.result()
+                except Exception as e:
+                    warnings.warn(f"Failed to process {video}: {e!r}")
+                    results[video] = e
+                    errors.append(e)
+        if errors and self.raise_on_error:
+            raise errors[0]
+        return results
@@ -3,6 +3,7 @@ import pandas as pd
 from enum import Enum, auto
 from pathlib import Path
 import re
+from .exporting.remap import lookup_from_table, remap_column
 
 
 class Cohort(Enum):
@@ -91,14 +92,11 @@ class IDUpdater:
             logreg_file = logreg_paths[mouse]
             data_files = data_paths[mouse]
             df_logreg = pd.read_csv(logreg_file)
+            lookup = lookup_from_table(df_logreg, "cell_id", "updated_id")
 
             for f in data_files:
                 df_data = pd.read_csv(f).drop_duplicates()
-                df_data = df_data.merge(
-                    df_logreg[["cell_id", "updated_id"]].drop_duplicates()
-                )
-                df_data.drop("cell_id", axis=1, inplace=True)
-                df_data.rename(columns={"updated_id": "cell_id"}, inplace=True)
+                df_data = remap_column(df_data, lookup, "cell_id")
                 df_data.to_csv(f, index=False)
 
             df_logreg.drop("cell_id", axis=1, inplace=True)
@@ -1,15 +1,10 @@
 from onep_preprocessing.path_parcers.raw_data_dirs.isx_root_parsers import (
     IsxRootParserAstrocyteSet1,
 )
-from onep_preprocessing.path_parcers.raw_data_dirs.isx_mouse_dir import (
-    AstrocyteSet1IsxMouseDir,
-)
 from onep_preprocessing.path_parcers.output_dirs.output_root_parsers import (
     OutputRootParserAstrocyte,
 )
-from onep_preprocessing.path_parcers.output_dirs.output_mouse_dir import (
-    OutputMouseDirAstrocyte,
-)
+from onep_preprocessing.path_parcers.dir_index import DirIndex
 
 from onep_preprocessing.exporting.export_isx_files import IsxExporter
 from typing import List, Iterable, Optional, Sequence
@@ -27,23 +22,14 @@ TIFF_SUBDIR = "tiff"
 TIFF_FILENAME = "tiff.tif"
 
 
-def get_mouse_dir(
-    source: AstrocyteSet1IsxMouseDir, target_dirs: Sequence[OutputMouseDirAstrocyte]
-) -> Optional[OutputMouseDirAstrocyte]:
-
-    for target in target_dirs:
-        if source.mouse_name == target.mouse_name:
-            return target
-    return None
-
-
 def main():
-    source_mouse_dirs = IsxRootParserAstrocyteSet1.from_root_dir(
-        SOURCE_DIR, numbers=GOOD_MICE_NUMS
-    ).mouse_dirs
-    target_mouse_dirs = OutputRootParserAstrocyte.from_root_dir(
-        DEST_DIR, numbers=GOOD_MICE_NUMS
-    ).mouse_dirs
+    with DirIndex.for_root(SOURCE_DIR) as source_index, DirIndex.for_root(DEST_DIR) as target_index:
+        source_mouse_dirs = IsxRootParserAstrocyteSet1.from_root_dir(
+            SOURCE_DIR, numbers=GOOD_MICE_NUMS, index=source_index
+        ).mouse_dirs
+        target_mouse_dirs = OutputRootParserAstrocyte.from_root_dir(
+            DEST_DIR, numbers=GOOD_MICE_NUMS, index=target_index
+        ).by_mouse_name()
 
     isx_exporter = IsxExporter(
         trace_filename=TRACE_FILENAME,
@@ -54,7 +40,7 @@ def main():
     )
 
     for source_mouse_dir in tqdm(source_mouse_dirs):
-        target_mouse_dir = get_mouse_dir(source_mouse_dir, target_mouse_dirs)
+        target_mouse_dir = target_mouse_dirs[source_mouse_dir.mouse_name]
 
         for source_session_dir, target_session_dir in zip(
             [source_mouse_dir.ret_behavior_dir, source_mouse_dir.ext_behavior_dir],
@@ -13,11 +13,12 @@ from tqdm import tqdm
 GOOD_MICE_NUMS = (5, 8, 9, 13, 15, 22, 27, 30, 31, 6, 7, 12, 18, 24, 25, 28, 32)
 DEST_DIR = Path(r"F:\astrocyte\export1")
 ON_EXISTS = "skip"
+FORMAT = "parquet"
 
 
 def main():
     mouse_dirs = OutputRootParserAstrocyte.from_root_dir(
-        DEST_DIR, numbers=GOOD_MICE_NUMS
+        DEST_DIR, numbers=GOOD_MICE_NUMS, fmt=FORMAT
     ).mouse_dirs
 
     trace_tidyer = TraceTidier(on_exists=ON_EXISTS)
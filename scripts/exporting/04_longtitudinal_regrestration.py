@@ -1,15 +1,10 @@
 from onep_preprocessing.path_parcers.raw_data_dirs.isx_root_parsers import (
     IsxRootParserAstrocyteSet1,
 )
-from onep_preprocessing.path_parcers.raw_data_dirs.isx_mouse_dir import (
-    AstrocyteSet1IsxMouseDir,
-)
 from onep_preprocessing.path_parcers.output_dirs.output_root_parsers import (
     OutputRootParserAstrocyte,
 )
-from onep_preprocessing.path_parcers.output_dirs.output_mouse_dir import (
-    OutputMouseDirAstrocyte,
-)
+from onep_preprocessing.path_parcers.dir_index import DirIndex
 
 from onep_preprocessing.exporting.longreg import IsxLongtitudinalRegistration
 from typing import List, Iterable, Optional, Sequence
@@ -23,30 +18,21 @@ DEST_DIR = Path(r"F:\astrocyte\export1")
 ON_EXISTS = "overwrite"
 
 
-def get_mouse_dir(
-    source: AstrocyteSet1IsxMouseDir, target_dirs: Sequence[OutputMouseDirAstrocyte]
-) -> Optional[OutputMouseDirAstrocyte]:
-
-    for target in target_dirs:
-        if source.mouse_name == target.mouse_name:
-            return target
-    return None
-
-
 def main():
-    source_mouse_dirs = IsxRootParserAstrocyteSet1.from_root_dir(
-        SOURCE_DIR, numbers=GOOD_MICE_NUMS
-    ).mouse_dirs
-    target_mouse_dirs = OutputRootParserAstrocyte.from_root_dir(
-        DEST_DIR, numbers=GOOD_MICE_NUMS
-    ).mouse_dirs
+    with DirIndex.for_root(SOURCE_DIR) as source_index, DirIndex.for_root(DEST_DIR) as target_index:
+        source_mouse_dirs = IsxRootParserAstrocyteSet1.from_root_dir(
+            SOURCE_DIR, numbers=GOOD_MICE_NUMS, index=source_index
+        ).mouse_dirs
+        target_mouse_dirs = OutputRootParserAstrocyte.from_root_dir(
+            DEST_DIR, numbers=GOOD_MICE_NUMS, index=target_index
+        ).by_mouse_name()
 
     long_reg = IsxLongtitudinalRegistration(
         min_correlation=0.4, accepted_cells_only=True, on_exists=ON_EXISTS
     )
 
     for source_mouse_dir in tqdm(source_mouse_dirs):
-        target_mouse_dir = get_mouse_dir(source_mouse_dir, target_mouse_dirs)
+        target_mouse_dir = target_mouse_dirs[source_mouse_dir.mouse_name]
         input_cellsets = [
             source_mouse_dir.ret_behavior_dir.cnmfe_cellset,
             source_mouse_dir.ext_behavior_dir.cnmfe_cellset,
@@ -3,18 +3,20 @@ from onep_preprocessing.path_parcers.output_dirs.output_root_parsers import (
 )
 
 from onep_preprocessing.exporting.update_ids import IDUpdaterDataset
+from onep_preprocessing.exporting.table_io import with_format
 from pathlib import Path
 from tqdm import tqdm
 
 GOOD_MICE_NUMS = (5, 8, 9, 13, 15, 22, 27, 30, 31, 6, 7, 12, 18, 24, 25, 28, 32)
 DEST_DIR = Path(r"F:\astrocyte\export1")
 ON_EXISTS = "overwrite"
-MASTER_CELLSET_FILE = DEST_DIR / "master_cellset.csv"
+FORMAT = "parquet"
+MASTER_CELLSET_FILE = with_format(DEST_DIR / "master_cellset", FORMAT)
 
 
 def main():
     mouse_dirs = OutputRootParserAstrocyte.from_root_dir(
-        DEST_DIR, numbers=GOOD_MICE_NUMS
+        DEST_DIR, numbers=GOOD_MICE_NUMS, fmt=FORMAT
     ).mouse_dirs
 
     id_updater = IDUpdaterDataset(
@@ -30,19 +32,11 @@ def main():
     )
 
     for mouse_dir in tqdm(mouse_dirs):
-        mouse_name = mouse_dir.mouse_name
         for session_dir in (mouse_dir.ret_behavior_dir, mouse_dir.ext_behavior_dir):
-            id_updater.update_traces(
+            id_updater.update_lookup(
                 master_cellset=master_cellset,
-                mouse_name=mouse_name,
-                trace_file=session_dir.traces_tidy_mouse_id,
-                updated_trace_file=session_dir.traces_tidy_mouse_dataset_id,
-            )
-            id_updater.update_props(
-                master_cellset=master_cellset,
-                mouse_name=mouse_name,
-                props_file=session_dir.props_tidy_mouse_id,
-                updated_props_file=session_dir.props_tidy_mouse_dataset_id,
+                mouse_name=mouse_dir.mouse_name,
+                lookup_file=session_dir.cell_id_lookup,
             )
 
 
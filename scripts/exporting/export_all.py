@@ -0,0 +1,130 @@
+from onep_preprocessing.path_parcers.raw_data_dirs.isx_root_parsers import (
+    IsxRootParserAstrocyteSet1,
+)
+from onep_preprocessing.path_parcers.output_dirs.output_root_parsers import (
+    OutputRootParserAstrocyte,
+)
+from onep_preprocessing.exporting.driver import (
+    DatasetIDStage,
+    ExportCellsetStage,
+    ExportDriver,
+    LongRegStage,
+    LongRegTidyStage,
+    MouseIDStage,
+    NativeEventStage,
+    NativeExportStage,
+    Stage,
+    TidyStage,
+)
+from onep_preprocessing.exporting.export_isx_files import IsxExporter
+from onep_preprocessing.native.dff import TraceDff
+from onep_preprocessing.exporting.native_export import NativeCellsetExporter, NativeEventExporter
+from onep_preprocessing.exporting.longreg import IsxLongtitudinalRegistration
+from onep_preprocessing.exporting.table_io import with_format
+from onep_preprocessing.exporting.tidy_output import LongRegTidier, PropsTidier, TraceTidier
+from onep_preprocessing.exporting.update_ids import IDUpdaterDataset, IDUpdaterMouse
+from pathlib import Path
+
+# scripts 02-07 as one run, parallel over mice and sessions
+
+GOOD_MICE_NUMS = (5, 8, 9, 13, 15, 22, 27, 30, 31, 6, 7, 12, 18, 24, 25, 28, 32)
+SOURCE_DIR = Path(r"D:\raw data")
+DEST_DIR = Path(r"F:\astrocyte\export1")
+ON_EXISTS = "skip"
+FORMAT = "parquet"
+MASTER_CELLSET_FILE = with_format(DEST_DIR / "master_cellset", FORMAT)
+MAX_WORKERS = 8
+# read the cellsets directly instead of exporting them with isx and tidying the csv files
+NATIVE_EXPORT = False
+EVENT_THRESHOLD = 3
+# per cell dF/F added to the traces, in place of a dF/F movie
+TRACE_DFF = TraceDff(f0_type="percentile")
+
+SESSIONS = {"ret_behavior_dir": "ret", "ext_behavior_dir": "ext"}
+
+
+def main():
+    source_mouse_dirs = IsxRootParserAstrocyteSet1.from_root_dir(
+        SOURCE_DIR, numbers=GOOD_MICE_NUMS
+    ).mouse_dirs
+    root_parser = OutputRootParserAstrocyte.from_root_dir(
+        DEST_DIR, numbers=GOOD_MICE_NUMS, fmt=FORMAT
+    )
+
+    if NATIVE_EXPORT:
+        export_stages = [
+            Stage(
+                "tidy",
+                NativeExportStage(
+                    NativeCellsetExporter(dff=TRACE_DFF, on_exists=ON_EXISTS), source_mouse_dirs
+                ),
+            ),
+            Stage(
+                "events",
+                NativeEventStage(
+                    NativeEventExporter(threshold=EVENT_THRESHOLD, on_exists=ON_EXISTS),
+                    source_mouse_dirs,
+                ),
+            ),
+        ]
+    else:
+        export_stages = [
+            Stage(
+                "export",
+                ExportCellsetStage(
+                    IsxExporter(
+                        trace_filename="traces.csv",
+                        props_filename="props.csv",
+                        tiff_subdir="tiff",
+                        tiff_filename="tiff.tif",
+                        on_exists=ON_EXISTS,
+                    ),
+                    source_mouse_dirs,
+                ),
+            ),
+            Stage(
+                "tidy",
+                TidyStage(TraceTidier(on_exists=ON_EXISTS), PropsTidier(on_exists=ON_EXISTS)),
+                depends_on=["export"],
+            ),
+        ]
+
+    stages = [
+        *export_stages,
+        Stage(
+            "long_reg",
+            LongRegStage(
+                IsxLongtitudinalRegistration(
+                    min_correlation=0.4, accepted_cells_only=True, on_exists="overwrite"
+                ),
+                source_mouse_dirs,
+                sessions=list(SESSIONS),
+            ),
+            scope="mouse",
+        ),
+        Stage(
+            "long_reg_tidy",
+            LongRegTidyStage(LongRegTidier(sessions=tuple(SESSIONS.values()))),
+            scope="mouse",
+            depends_on=["long_reg"],
+        ),
+        Stage(
+            "mouse_ids",
+            MouseIDStage(IDUpdaterMouse(), SESSIONS),
+            depends_on=["long_reg_tidy"],
+        ),
+        Stage(
+            "dataset_ids",
+            DatasetIDStage(IDUpdaterDataset(), MASTER_CELLSET_FILE, sessions=list(SESSIONS)),
+            scope="dataset",
+            depends_on=["mouse_ids"],
+        ),
+    ]
+
+    driver = ExportDriver(stages, sessions=list(SESSIONS), max_workers=MAX_WORKERS)
+    driver(root_parser)
+    print(driver.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 from onep_preprocessing.processors.dispatcher import CNMFeDispatcher
 from onep_preprocessing.processors.cnmfe import ISXCNMFe
+from onep_preprocessing.processors.cnmfe_scheduler import CNMFeScheduler
 from onep_preprocessing.path_parcers.raw_data_dirs.isx_mouse_dir import (
     AstrocyteSet2IsxMouseDir,
     ISXDir,
@@ -7,10 +8,10 @@ from onep_preprocessing.path_parcers.raw_data_dirs.isx_mouse_dir import (
 
 from typing import List, Iterable, Optional
 from pathlib import Path
-from tqdm import tqdm
 
 GOOD_MICE_NUMS = (5, 8, 9, 13, 15, 22, 27, 30, 31, 6, 7, 12, 18, 24, 25, 28, 32)
 ROOT_DIR = Path(r"E:\AS-Gq-GRIN")
+SCRATCH_DIR = None  # e.g. a local SSD for CNMFe's temporary files
 
 
 def find_mouse_dirs(
@@ -39,14 +40,14 @@ def main():
     mouse_dirs = find_mouse_dirs(ROOT_DIR, numbers=GOOD_MICE_NUMS)
     dispatcher = CNMFeDispatcher(
         on_exists="skip",
-        cnmfe=ISXCNMFe(num_threads=10),
+        cnmfe=ISXCNMFe(scratch_dir=SCRATCH_DIR),
     )
-    for mouse_dir in tqdm(mouse_dirs, desc="Mice"):
-        for session_dir in tqdm(
-            [mouse_dir.ret_behavior_dir, mouse_dir.ext_behavior_dir],
-            desc=f"{mouse_dir.mouse_name} sessions",
-        ):
-            dispatcher(isx_video=session_dir.motion_corrected)
+    videos = [
+        session_dir.motion_corrected
+        for mouse_dir in mouse_dirs
+        for session_dir in (mouse_dir.ret_behavior_dir, mouse_dir.ext_behavior_dir)
+    ]
+    CNMFeScheduler(dispatcher)(videos)
 
 
 if __name__ == "__main__":
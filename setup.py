@@ -12,5 +12,7 @@ setup(
     author_email="ruairi.osullivan.work@gmail.com",
     license="GNU GPLv3",
     packages=find_packages(),
+    # parquet and feather tables, see exporting.table_io
+    extras_require={"tables": ["pyarrow"]},
     python_requires=">=3",
 )
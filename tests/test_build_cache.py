@@ -0,0 +1,94 @@
+import os
+from onep_preprocessing.processors.build_cache import BuildCache
+from onep_preprocessing.processors.dispatcher import Dispatcher
+
+
+class Scale:
+    """A stage that multiplies every byte of its input, counting its runs."""
+
+    def __init__(self, factor: int, num_threads: int = 1, backend: str = "isx"):
+        self.factor = factor
+        self.num_threads = num_threads
+        self.backend = backend
+        self._runs = 0
+
+    def __call__(self, in_vid, out_vid):
+        self._runs += 1
+        out_vid.write_bytes(bytes((b * self.factor) % 256 for b in in_vid.read_bytes()))
+
+
+def run_chain(tmp_path, first, second):
+    dispatcher = Dispatcher(output_dir=None, on_exists="incremental")
+    middle = dispatcher.run_stage(first, tmp_path / "raw.bin", tmp_path / "middle.bin")
+    return dispatcher.run_stage(second, middle, tmp_path / "out.bin")
+
+
+def touch_later(path):
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_hit_when_nothing_changed(tmp_path):
+    (tmp_path / "raw.bin").write_bytes(bytes(range(100)))
+    first, second = Scale(2), Scale(3)
+    run_chain(tmp_path, first, second)
+    run_chain(tmp_path, first, second)
+    assert (first._runs, second._runs) == (1, 1)
+
+
+def test_execution_params_do_not_invalidate(tmp_path):
+    (tmp_path / "raw.bin").write_bytes(bytes(range(100)))
+    run_chain(tmp_path, Scale(2), Scale(3))
+    first, second = Scale(2, num_threads=8), Scale(3, num_threads=8)
+    run_chain(tmp_path, first, second)
+    assert (first._runs, second._runs) == (0, 0)
+
+
+def test_miss_on_backend_change(tmp_path):
+    (tmp_path / "raw.bin").write_bytes(bytes(range(100)))
+    run_chain(tmp_path, Scale(2), Scale(3))
+    first, second = Scale(2), Scale(3, backend="numpy")
+    run_chain(tmp_path, first, second)
+    assert (first._runs, second._runs) == (0, 1)
+
+
+def test_miss_on_parameter_change(tmp_path):
+    (tmp_path / "raw.bin").write_bytes(bytes(range(100)))
+    run_chain(tmp_path, Scale(2), Scale(3))
+    first, second = Scale(2), Scale(5)
+    run_chain(tmp_path, first, second)
+    assert (first._runs, second._runs) == (0, 1)
+
+
+def test_miss_on_edit_in_the_middle_of_the_input(tmp_path):
+    raw = tmp_path / "raw.bin"
+    data = bytearray(4096)
+    raw.write_bytes(bytes(data))
+    run_chain(tmp_path, Scale(2), Scale(3))
+    data[2048] = 1
+    raw.write_bytes(bytes(data))
+    touch_later(raw)
+    first, second = Scale(2), Scale(3)
+    run_chain(tmp_path, first, second)
+    assert (first._runs, second._runs) == (1, 1)
+
+
+class MarkMiddle(Scale):
+    """A stage that copies its input with the middle byte set to factor."""
+
+    def __call__(self, in_vid, out_vid):
+        self._runs += 1
+        data = bytearray(in_vid.read_bytes())
+        data[len(data) // 2] = self.factor
+        out_vid.write_bytes(bytes(data))
+
+
+def test_upstream_rerun_invalidates_downstream_with_sampled_hashes(tmp_path, monkeypatch):
+    monkeypatch.setattr(Dispatcher, "build_cache", BuildCache(hash_mode="sampled", sample_bytes=16))
+    (tmp_path / "raw.bin").write_bytes(bytes(100))
+    run_chain(tmp_path, MarkMiddle(1), Scale(3))
+    # the new intermediate has the same size and ends, only its manifest tells it apart
+    first, second = MarkMiddle(2), Scale(3)
+    run_chain(tmp_path, first, second)
+    assert (first._runs, second._runs) == (1, 1)
+    assert (tmp_path / "out.bin").read_bytes()[50] == 6
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import ndimage
+from onep_preprocessing.exporting.native_export import NativeCellsetExporter
+from onep_preprocessing.native.isxd import read_cellset, write_cellset
+from onep_preprocessing.native.movie_io import MovieWriter
+from onep_preprocessing.processors.cnmfe import NativeCNMFe
+
+isx = pytest.importorskip("isx")
+
+
+def random_cells(n_cells=3, shape=(4, 5), n_frames=7):
+    rng = np.random.default_rng(0)
+    footprints = rng.random((n_cells,) + shape).astype(np.float32)
+    traces = rng.normal(size=(n_cells, n_frames)).astype(np.float32)
+    return footprints, traces
+
+
+def test_isx_reads_write_cellset_output(tmp_path):
+    footprints, traces = random_cells()
+    statuses = ["accepted", "rejected", "undecided"]
+    path = tmp_path / "cellset.isxd"
+    write_cellset(path, footprints, traces, frame_period=0.05, statuses=statuses)
+
+    cellset = isx.CellSet.read(str(path))
+    assert cellset.num_cells == 3
+    assert cellset.timing.num_samples == 7
+    assert cellset.timing.period.secs_float == pytest.approx(0.05)
+    for i in range(3):
+        assert cellset.get_cell_name(i) == f"C{i}"
+        assert cellset.get_cell_status(i) == statuses[i]
+        np.testing.assert_array_equal(cellset.get_cell_trace_data(i), traces[i])
+        np.testing.assert_array_equal(cellset.get_cell_image_data(i), footprints[i])
+
+
+def test_read_cellset_reads_isx_output(tmp_path):
+    footprints, traces = random_cells()
+    path = tmp_path / "cellset.isxd"
+    cellset = isx.CellSet.write(
+        str(path),
+        isx.Timing(num_samples=7, period=isx.Duration.from_msecs(50)),
+        isx.Spacing(num_pixels=(4, 5)),
+    )
+    for i in range(3):
+        cellset.set_cell_data(i, footprints[i], traces[i], f"C{i:02d}")
+    cellset.set_cell_status(1, "rejected")
+    cellset.flush()
+
+    cellset = read_cellset(path)
+    assert cellset.names == ["C00", "C01", "C02"]
+    assert cellset.statuses == ["undecided", "rejected", "undecided"]
+    assert cellset.frame_period == pytest.approx(0.05)
+    np.testing.assert_allclose(cellset.timestamps, np.arange(7) * 0.05)
+    np.testing.assert_array_equal(cellset.traces, traces)
+    np.testing.assert_array_equal(cellset.footprints, footprints)
+
+
+def test_native_cnmfe_recovers_planted_cells(tmp_path):
+    rng = np.random.default_rng(0)
+    n_frames, rows, cols = 400, 40, 48
+    centers = np.array([[10, 10], [10, 36], [28, 14], [30, 34]], dtype=float)
+    y, x = np.mgrid[:rows, :cols]
+    footprints = np.stack(
+        [np.exp(-((y - cy) ** 2 + (x - cx) ** 2) / (2 * 2.0**2)) for cy, cx in centers]
+    )
+    spikes = (rng.random((len(centers), n_frames)) < 0.02) * rng.uniform(1, 3, (len(centers), n_frames))
+    kernel = np.exp(-np.arange(40) / 8)
+    traces = np.stack([np.convolve(s, kernel)[:n_frames] for s in spikes])
+    movie = 100 + np.einsum("kt,kij->tij", 8 * traces, footprints)
+    movie += rng.normal(size=movie.shape)
+    in_vid = tmp_path / "movie.isxd"
+    with MovieWriter(in_vid, (rows, cols), dtype=np.float32, frame_period=0.05) as writer:
+        writer.write(movie.astype(np.float32))
+
+    out_cellset = tmp_path / "cellset.isxd"
+    NativeCNMFe(processing_mode="all_in_memory", num_threads=1)(in_vid, out_cellset)
+
+    cellset = read_cellset(out_cellset)
+    assert cellset.n_cells == len(centers)
+    found = np.array(
+        [ndimage.center_of_mass(np.clip(footprint, 0, None)) for footprint in cellset.footprints]
+    )
+    distance = np.linalg.norm(found[:, None] - centers[None], axis=2)
+    match = distance.argmin(axis=1)
+    assert sorted(match) == list(range(len(centers)))
+    assert distance.min(axis=1).max() < 1
+    for trace, planted in zip(cellset.traces, traces[match]):
+        assert np.corrcoef(trace, planted)[0, 1] > 0.95
+
+    # and isx reads it back the same
+    isx_cellset = isx.CellSet.read(str(out_cellset))
+    assert isx_cellset.num_cells == len(centers)
+    for i in range(len(centers)):
+        np.testing.assert_array_equal(isx_cellset.get_cell_trace_data(i), cellset.traces[i])
+
+
+def test_native_cellset_exporter_on_isx_cellset(tmp_path):
+    footprints, traces = random_cells()
+    path = tmp_path / "cellset.isxd"
+    cellset = isx.CellSet.write(
+        str(path),
+        isx.Timing(num_samples=7, period=isx.Duration.from_msecs(50)),
+        isx.Spacing(num_pixels=(4, 5)),
+    )
+    for i in range(3):
+        cellset.set_cell_data(i, footprints[i], traces[i], f"C{i:02d}")
+    cellset.set_cell_status(1, "rejected")
+    cellset.flush()
+
+    exporter = NativeCellsetExporter(chunk_frames=3)
+    exporter(path, tmp_path / "traces.csv", tmp_path / "props.csv", tmp_path / "footprints.npy")
+
+    tidy = pd.read_csv(tmp_path / "traces.csv")
+    assert list(tidy.columns) == ["time", "session_cell_id", "value"]
+    assert len(tidy) == 3 * 7
+    # ordered by cell, then time, like TraceTidier
+    assert tidy["session_cell_id"].tolist() == [0] * 7 + [1] * 7 + [2] * 7
+    wide = tidy.pivot(index="session_cell_id", columns="time", values="value")
+    np.testing.assert_array_equal(wide.index, [0, 1, 2])
+    np.testing.assert_allclose(wide.columns, np.arange(7) * 0.05)
+    np.testing.assert_allclose(wide.to_numpy(), traces, rtol=1e-6)
+
+    props = pd.read_csv(tmp_path / "props.csv")
+    assert props["status"].tolist() == ["undecided", "rejected", "undecided"]
+    assert props["size"].tolist() == [20, 20, 20]
+    np.testing.assert_array_equal(np.load(tmp_path / "footprints.npy"), footprints)
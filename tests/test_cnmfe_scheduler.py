@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from onep_preprocessing.native.isxd import read_cellset
+from onep_preprocessing.native.movie_io import MovieWriter
+from onep_preprocessing.processors.cnmfe import NativeCNMFe
+from onep_preprocessing.processors.cnmfe_scheduler import CNMFeScheduler
+from onep_preprocessing.processors.dispatcher import CNMFeDispatcher
+
+
+def write_movie(path):
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[:24, :24]
+    footprint = np.exp(-((y - 12) ** 2 + (x - 12) ** 2) / 8)
+    trace = np.convolve((rng.random(200) < 0.03) * 3.0, np.exp(-np.arange(20) / 5))[:200]
+    movie = 100 + 8 * trace[:, None, None] * footprint + rng.normal(size=(200, 24, 24))
+    with MovieWriter(path, (24, 24), dtype=np.float32, frame_period=0.05) as writer:
+        writer.write(movie.astype(np.float32))
+
+
+@pytest.mark.parametrize("raise_on_error", [False, True])
+def test_missing_movies_do_not_stop_the_batch(tmp_path, raise_on_error):
+    good = tmp_path / "good.isxd"
+    write_movie(good)
+    missing = tmp_path / "missing.isxd"
+    dispatcher = CNMFeDispatcher(NativeCNMFe(processing_mode="all_in_memory"))
+    scheduler = CNMFeScheduler(dispatcher, raise_on_error=raise_on_error)
+
+    with pytest.warns(UserWarning) as record:
+        if raise_on_error:
+            with pytest.raises(FileNotFoundError):
+                scheduler([None, missing, good])
+        else:
+            results = scheduler([None, missing, good])
+            assert list(results) == [missing, good]
+            assert isinstance(results[missing], FileNotFoundError)
+    messages = [str(w.message) for w in record]
+    assert any("without a motion corrected movie" in m for m in messages)
+    assert any("missing.isxd" in m for m in messages)
+    assert read_cellset(tmp_path / "good_cnmfe_cellset.isxd").n_cells == 1
@@ -0,0 +1,106 @@
+import threading
+import time
+import pytest
+from onep_preprocessing.processors.dag import DAGExecutor, Node
+
+
+class Recorder:
+    # records the order nodes start and finish in and how many of each resource run at once
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = []
+        self.running = {}
+        self.peak = {}
+
+    def node(self, name, resource="cpu", depends_on=(), seconds=0.0, fail=False):
+        def func():
+            with self.lock:
+                self.events.append(("start", name))
+                self.running[resource] = self.running.get(resource, 0) + 1
+                self.peak[resource] = max(self.peak.get(resource, 0), self.running[resource])
+            time.sleep(seconds)
+            with self.lock:
+                self.running[resource] -= 1
+                self.events.append(("end", name))
+            if fail:
+                raise RuntimeError(f"{name} failed")
+            return name
+
+        return Node(name=name, func=func, resource=resource, depends_on=depends_on)
+
+    def index(self, event, name):
+        return self.events.index((event, name))
+
+
+def test_nodes_start_after_their_dependencies():
+    recorder = Recorder()
+    nodes = [
+        recorder.node("export", depends_on=["tidy_a", "tidy_b"]),
+        recorder.node("tidy_b", depends_on=["load"]),
+        recorder.node("tidy_a", depends_on=["load"]),
+        recorder.node("load", resource="io"),
+    ]
+    results = DAGExecutor(limits={"cpu": 2})(nodes)
+
+    assert results == {name: name for name in ("load", "tidy_a", "tidy_b", "export")}
+    for node in nodes:
+        for dependency in node.depends_on:
+            assert recorder.index("end", dependency) < recorder.index("start", node.name)
+
+
+def test_ready_nodes_start_in_the_given_order():
+    recorder = Recorder()
+    nodes = [recorder.node(f"video_{i}") for i in range(4)]
+    DAGExecutor()(nodes)
+    assert [name for event, name in recorder.events if event == "start"] == [
+        f"video_{i}" for i in range(4)
+    ]
+
+
+def test_resource_limits_cap_concurrency():
+    recorder = Recorder()
+    nodes = [recorder.node(f"read_{i}", resource="io", seconds=0.05) for i in range(6)]
+    nodes += [recorder.node(f"filter_{i}", resource="cpu", seconds=0.05) for i in range(6)]
+    nodes += [recorder.node(f"write_{i}", resource="disk", seconds=0.02) for i in range(3)]
+    DAGExecutor(limits={"io": 3, "cpu": 2})(nodes)
+    # classes without a limit get one slot
+    assert recorder.peak == {"io": 3, "cpu": 2, "disk": 1}
+
+
+def test_failure_skips_dependents():
+    recorder = Recorder()
+    nodes = [
+        recorder.node("a", fail=True),
+        recorder.node("b", depends_on=["a"]),
+        recorder.node("c", depends_on=["b"]),
+        recorder.node("d"),
+        recorder.node("e", depends_on=["d"]),
+    ]
+    with pytest.warns(UserWarning, match="Node a failed"):
+        results = DAGExecutor(raise_on_error=False)(nodes)
+
+    assert isinstance(results["a"], RuntimeError)
+    assert "b" not in results and "c" not in results
+    assert results["d"] == "d" and results["e"] == "e"
+    assert ("start", "b") not in recorder.events
+
+
+def test_failure_is_raised_after_the_rest_finished():
+    recorder = Recorder()
+    nodes = [recorder.node("a", fail=True), recorder.node("d", seconds=0.05)]
+    with pytest.warns(UserWarning), pytest.raises(RuntimeError, match="a failed"):
+        DAGExecutor(limits={"cpu": 2})(nodes)
+    assert ("end", "d") in recorder.events
+
+
+@pytest.mark.parametrize(
+    "nodes, message",
+    [
+        ([Node("a", lambda: 0), Node("a", lambda: 0)], "unique"),
+        ([Node("a", lambda: 0, depends_on=["b"])], "unknown"),
+        ([Node("a", lambda: 0, depends_on=["b"]), Node("b", lambda: 0, depends_on=["a"])], "cycle"),
+    ],
+)
+def test_invalid_dags_are_rejected(nodes, message):
+    with pytest.raises(ValueError, match=message):
+        DAGExecutor()(nodes)
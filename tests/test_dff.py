@@ -0,0 +1,118 @@
+import os
+import numpy as np
+import pytest
+from onep_preprocessing.native.dff import (
+    F0Accumulator,
+    SlidingPercentileF0,
+    apply_dff,
+    compute_f0,
+    dff_movie,
+    f0_path,
+    load_f0,
+    save_f0,
+    trace_dff,
+)
+from onep_preprocessing.native.movie_io import MovieWriter, open_movie
+
+
+def random_movie(n_frames=40, shape=(6, 7), seed=0):
+    rng = np.random.default_rng(seed)
+    drift = np.linspace(1.5, 1, n_frames)[:, None, None]
+    return (100 * drift + rng.normal(scale=5, size=(n_frames, *shape))).astype(np.float32)
+
+
+def write_movie(path, movie):
+    with MovieWriter(path, movie.shape[1:], dtype=np.float32, frame_period=0.05) as writer:
+        writer.write(movie)
+
+
+@pytest.mark.parametrize("f0_type", ["mean", "min"])
+def test_dff_movie_with_sidecar_matches_compute_f0(tmp_path, f0_type):
+    movie = random_movie()
+    in_vid, out_vid = tmp_path / "motion_corrected.npy", tmp_path / "dff.npy"
+    write_movie(in_vid, movie)
+    accumulator = F0Accumulator(f0_type)
+    for start in range(0, len(movie), 16):
+        accumulator.update(movie[start : start + 16])
+    save_f0(in_vid, accumulator)
+    assert load_f0(in_vid, f0_type) is not None
+
+    dff_movie(in_vid, out_vid, f0_type=f0_type, frames_per_chunk=16)
+    expected = apply_dff(movie, compute_f0(movie, f0_type).at(range(len(movie))))
+    np.testing.assert_allclose(open_movie(out_vid), expected, rtol=1e-5, atol=1e-6)
+
+
+def test_dff_movie_reads_f0_from_the_sidecar(tmp_path):
+    movie = random_movie()
+    in_vid, out_vid = tmp_path / "motion_corrected.npy", tmp_path / "dff.npy"
+    write_movie(in_vid, movie)
+    f0 = np.full(movie.shape[1:], 80, dtype=np.float32)
+    save_f0(in_vid, F0Accumulator.from_f0("mean", f0, len(movie)))
+    dff_movie(in_vid, out_vid, f0_type="mean")
+    np.testing.assert_allclose(open_movie(out_vid), movie / 80 - 1, rtol=1e-5)
+
+
+def test_stale_or_mismatched_sidecar_is_ignored(tmp_path):
+    movie = random_movie()
+    in_vid = tmp_path / "motion_corrected.npy"
+    write_movie(in_vid, movie)
+    save_f0(in_vid, compute_f0(movie, "mean"))
+    assert load_f0(in_vid, "min") is None
+    # a movie rewritten after its sidecar
+    sidecar_mtime = f0_path(in_vid).stat().st_mtime_ns
+    os.utime(in_vid, ns=(sidecar_mtime + 10**9, sidecar_mtime + 10**9))
+    assert load_f0(in_vid, "mean") is None
+
+
+def brute_force_percentile(movie, window, percentile):
+    # the percentile of the window centred on each frame, clamped to the movie
+    n, half = len(movie), window // 2
+    starts = np.clip(np.arange(n), half, n - window + half) - half
+    return np.stack(
+        [np.nanpercentile(movie[s : s + window], percentile, axis=0) for s in starts]
+    )
+
+
+@pytest.mark.parametrize("window", [2, 7, 10, 40, 100])
+def test_sliding_percentile_matches_brute_force(window):
+    movie = random_movie()
+    movie[3, 2, 2] = np.nan
+    f0 = SlidingPercentileF0(movie, window=window, percentile=20, step=1)
+    expected = brute_force_percentile(movie, min(window, len(movie)), 20)
+    np.testing.assert_allclose(f0.at(range(len(movie))), expected, rtol=1e-5)
+
+
+def test_sliding_percentile_interpolates_between_steps():
+    movie = random_movie()
+    f0 = SlidingPercentileF0(movie, window=10, percentile=20, step=4)
+    expected = brute_force_percentile(movie, 10, 20)
+    at = f0.at(range(len(movie)))
+    # exact where it is evaluated, linear in between
+    np.testing.assert_allclose(at[f0.anchors], expected[f0.anchors], rtol=1e-5)
+    for a, b in zip(f0.anchors[:-1], f0.anchors[1:]):
+        frac = ((np.arange(a, b + 1) - a) / (b - a))[:, None, None]
+        np.testing.assert_allclose(
+            at[a : b + 1], expected[a] * (1 - frac) + expected[b] * frac, rtol=1e-5
+        )
+
+
+@pytest.mark.parametrize("f0_type", ["mean", "min", "percentile"])
+def test_trace_dff_matches_traces_of_the_dff_movie(tmp_path, f0_type):
+    rng = np.random.default_rng(1)
+    n_frames, shape = 50, (8, 9)
+    traces = (100 + rng.normal(scale=10, size=(3, n_frames))).astype(np.float32)
+    footprints = np.zeros((3, *shape), dtype=np.float32)
+    footprints[0, 1:3, 1:4] = 1
+    footprints[1, 5:8, 2:4] = 1
+    footprints[2, 2:6, 6:8] = 1
+    footprints /= footprints.sum(axis=(1, 2), keepdims=True)
+    # every pixel of a cell follows its trace, so its F0 is that of the trace
+    movie = 50 + np.einsum("kt,kij->tij", traces - 50, (footprints > 0).astype(np.float32))
+    in_vid, out_vid = tmp_path / "motion_corrected.npy", tmp_path / "dff.npy"
+    write_movie(in_vid, movie.astype(np.float32))
+
+    dff_movie(in_vid, out_vid, f0_type=f0_type, window=12, frames_per_chunk=16)
+    movie_traces = np.einsum("tij,kij->kt", open_movie(out_vid), footprints)
+    np.testing.assert_allclose(
+        trace_dff(traces, f0_type, window=12), movie_traces, rtol=1e-4, atol=1e-5
+    )
@@ -0,0 +1,96 @@
+import os
+import pickle
+import pytest
+from onep_preprocessing.path_parcers.dir_index import DirIndex
+
+CALLS = []
+PAST = 10**18  # 2001, so any change to the tree gives a newer mtime
+
+
+def parse_mouse_dir(mouse_dir, suffix=""):
+    # stands in for a parser: lists the session dirs and their files
+    CALLS.append(mouse_dir)
+    return {
+        session.name + suffix: sorted(f.name for f in session.iterdir())
+        for session in sorted(mouse_dir.iterdir())
+    }
+
+
+@pytest.fixture
+def mouse_dir(tmp_path):
+    CALLS.clear()
+    mouse_dir = tmp_path / "root" / "mouse1"
+    for session in ("ret", "ext"):
+        (mouse_dir / session).mkdir(parents=True)
+        (mouse_dir / session / "rec.isxd").touch()
+    for directory in (mouse_dir / "ret", mouse_dir / "ext", mouse_dir, mouse_dir.parent):
+        os.utime(directory, ns=(PAST, PAST))
+    return mouse_dir
+
+
+def test_hit_does_not_parse_again(tmp_path, mouse_dir):
+    index_file = tmp_path / "index.pkl"
+    with DirIndex(index_file) as index:
+        parsed = index.get(parse_mouse_dir, mouse_dir)
+        assert index.get(parse_mouse_dir, mouse_dir) == parsed
+    assert len(CALLS) == 1
+
+    # a new index reads the saved one
+    mtime = index_file.stat().st_mtime_ns
+    with DirIndex(index_file) as index:
+        assert index.get(parse_mouse_dir, mouse_dir) == parsed
+    assert len(CALLS) == 1
+    # nothing changed, so nothing was written
+    assert index_file.stat().st_mtime_ns == mtime
+
+    # kwargs are part of the key
+    with DirIndex(index_file) as index:
+        assert "ret_x" in index.get(parse_mouse_dir, mouse_dir, suffix="_x")
+    assert len(CALLS) == 2
+
+
+def test_new_file_in_a_session_dir_invalidates(tmp_path, mouse_dir):
+    index_file = tmp_path / "index.pkl"
+    with DirIndex(index_file) as index:
+        index.get(parse_mouse_dir, mouse_dir)
+    (mouse_dir / "ext" / "rec_downsampled.isxd").touch()
+
+    with DirIndex(index_file) as index:
+        parsed = index.get(parse_mouse_dir, mouse_dir)
+    assert len(CALLS) == 2
+    assert parsed["ext"] == ["rec.isxd", "rec_downsampled.isxd"]
+    with DirIndex(index_file) as index:
+        assert index.get(parse_mouse_dir, mouse_dir) == parsed
+    assert len(CALLS) == 2
+
+
+def test_root_listing_follows_new_mouse_dirs(tmp_path, mouse_dir):
+    index_file = tmp_path / "index.pkl"
+    root = mouse_dir.parent
+    with DirIndex(index_file) as index:
+        assert index.sub_dirs(root) == [mouse_dir]
+    (root / "mouse0").mkdir()
+    with DirIndex(index_file) as index:
+        assert index.sub_dirs(root) == [root / "mouse0", mouse_dir]
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        b"not a pickle",
+        pickle.dumps({"version": 1, "entries": {}})[:-5],
+        pickle.dumps({"version": 0, "entries": None, "listings": None}),
+        pickle.dumps(["an", "older", "format"]),
+    ],
+    ids=["garbage", "truncated", "old_version", "not_a_dict"],
+)
+def test_corrupt_or_stale_index_is_rebuilt(tmp_path, mouse_dir, content):
+    index_file = tmp_path / "index.pkl"
+    index_file.write_bytes(content)
+    with DirIndex(index_file) as index:
+        parsed = index.get(parse_mouse_dir, mouse_dir)
+    assert len(CALLS) == 1
+    # the broken file was replaced by a valid index
+    with DirIndex(index_file) as index:
+        assert index.get(parse_mouse_dir, mouse_dir) == parsed
+    assert len(CALLS) == 1
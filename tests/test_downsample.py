@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+from onep_preprocessing.native.downsample import defective_pixel_mask, downsample_movie
+from onep_preprocessing.native.movie_io import MovieWriter, open_movie
+from onep_preprocessing.processors.fused import FusedPreprocessorDispatcher
+from onep_preprocessing.processors.preprocessors import (
+    ISXDff,
+    ISXDownSampler,
+    ISXMotionCorrector,
+    ISXSpatialFilterer,
+)
+
+HOT_PIXEL = (9, 14)
+
+
+def write_raw_movie(path, n_frames=60, shape=(32, 40)):
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[: shape[0], : shape[1]]
+    background = 1000 + 200 * np.exp(-((y - 16) ** 2 + (x - 20) ** 2) / 200)
+    movie = background + rng.normal(scale=5, size=(n_frames, *shape))
+    movie[:, HOT_PIXEL[0], HOT_PIXEL[1]] = 4000
+    with MovieWriter(path, shape, dtype=np.uint16, frame_period=0.05) as writer:
+        writer.write(np.rint(movie).astype(np.uint16))
+
+
+def test_flat_frame_has_no_defective_pixels():
+    frames = np.full((4, 8, 8), 100, dtype=np.uint16)
+    frames[:, 2, 3] = 101
+    assert not defective_pixel_mask(frames).any()
+    frames[:, 5, 5] = 5000
+    np.testing.assert_array_equal(np.argwhere(defective_pixel_mask(frames)), [[5, 5]])
+
+
+def test_defective_pixels_are_fixed_the_same_in_every_chunk(tmp_path):
+    raw = tmp_path / "raw.npy"
+    write_raw_movie(raw)
+    outputs = [tmp_path / f"downsampled_{chunk}.npy" for chunk in (4, 60)]
+    for chunk, out in zip((4, 60), outputs):
+        downsample_movie(raw, out, temporal_factor=2, spatial_factor=1, frames_per_chunk=chunk)
+    small_chunks, one_chunk = (open_movie(out) for out in outputs)
+    assert small_chunks.dtype == np.uint16
+    np.testing.assert_array_equal(small_chunks, one_chunk)
+    assert small_chunks[:, HOT_PIXEL[0], HOT_PIXEL[1]].max() < 1500
+
+
+@pytest.mark.parametrize("f0_type", ["mean", "percentile"])
+@pytest.mark.parametrize("subtract_global_minimum", [True, False])
+def test_fused_intermediates_match_stage_outputs(tmp_path, subtract_global_minimum, f0_type):
+    raw = tmp_path / "raw.npy"
+    write_raw_movie(raw)
+    downsampler = ISXDownSampler(spatial_factor=2, backend="numpy", frames_per_chunk=16)
+    spatial_filterer = ISXSpatialFilterer(
+        subtract_global_minimum=subtract_global_minimum, backend="numpy"
+    )
+    motion_corrector = ISXMotionCorrector(
+        backend="numpy", frames_per_chunk=8, f0_type=None if f0_type == "percentile" else f0_type
+    )
+    dff = ISXDff(f0_type=f0_type, backend="numpy", window=10, frames_per_chunk=8)
+    fused = FusedPreprocessorDispatcher(
+        downsampler,
+        spatial_filterer,
+        motion_corrector,
+        dff,
+        output_dir="fused",
+        frames_per_chunk=10,
+        keep_intermediates=("downsampled", "spatial_filtered"),
+    )
+    fused(raw)
+
+    downsampled = tmp_path / "downsampled.npy"
+    filtered = tmp_path / "spatial_filtered.npy"
+    motion_corrected = tmp_path / "motion_corrected.npy"
+    dff_vid = tmp_path / "dff.npy"
+    downsampler(raw, downsampled)
+    spatial_filterer(downsampled, filtered)
+    motion_corrector(filtered, motion_corrected)
+    dff(motion_corrected, dff_vid)
+
+    fused_downsampled = open_movie(tmp_path / "fused" / "raw_downsampled.npy")
+    assert fused_downsampled.dtype == np.uint16
+    np.testing.assert_array_equal(fused_downsampled, open_movie(downsampled))
+    np.testing.assert_allclose(
+        open_movie(tmp_path / "fused" / "raw_spatial_filtered.npy"),
+        open_movie(filtered),
+        atol=1e-3,
+    )
+    np.testing.assert_allclose(
+        open_movie(tmp_path / "fused" / "raw_motion_corrected.npy"),
+        open_movie(motion_corrected),
+        atol=1e-3,
+    )
+    np.testing.assert_allclose(
+        open_movie(tmp_path / "fused" / "raw_dff.npy"), open_movie(dff_vid), atol=1e-4
+    )
+
+
+def test_fused_skip_reruns_when_an_output_is_missing(tmp_path):
+    raw = tmp_path / "raw.npy"
+    write_raw_movie(raw)
+    fused = FusedPreprocessorDispatcher(
+        ISXDownSampler(spatial_factor=2, backend="numpy"),
+        ISXSpatialFilterer(backend="numpy"),
+        ISXMotionCorrector(backend="numpy"),
+        ISXDff(backend="numpy"),
+        on_exists="skip",
+    )
+    outputs = fused.output_paths(raw)
+    fused(raw)
+    mtimes = {name: path.stat().st_mtime_ns for name, path in outputs.items()}
+
+    with pytest.warns(UserWarning, match="all outputs already exist"):
+        fused(raw)
+    assert {name: path.stat().st_mtime_ns for name, path in outputs.items()} == mtimes
+
+    outputs["dff"].unlink()
+    fused(raw)
+    assert outputs["dff"].exists()
+    assert outputs["motion_corrected"].stat().st_mtime_ns > mtimes["motion_corrected"]
@@ -0,0 +1,79 @@
+import numpy as np
+from onep_preprocessing.native.events import (
+    candidate_peaks,
+    detect_events,
+    detect_events_thresholds,
+    event_candidates,
+    max_thresholds,
+)
+
+FRAME_PERIOD = 0.05
+
+
+def planted_traces(n_cells=5, n_frames=2000, seed=0):
+    """Noisy traces with exponentially decaying transients starting at known frames."""
+    rng = np.random.default_rng(seed)
+    kernel = np.concatenate([[0.0, 0.5], np.exp(-np.arange(20) / 3)])
+    traces = rng.normal(scale=0.05, size=(n_cells, n_frames))
+    onsets = []
+    for cell in range(n_cells):
+        starts = np.sort(rng.choice(np.arange(50, n_frames - 50, 60), size=10, replace=False))
+        for start in starts:
+            traces[cell, start : start + len(kernel)] += rng.uniform(3, 5) * kernel
+        onsets.append(starts)
+    return traces.astype(np.float32), onsets
+
+
+def test_detect_events_finds_planted_transients():
+    traces, onsets = planted_traces()
+    events = detect_events(traces, FRAME_PERIOD, threshold=5, tau=0.2, event_time_ref="maximum")
+    np.testing.assert_array_equal(events.counts(), [10] * len(onsets))
+    for cell, starts in enumerate(onsets):
+        frames = np.round(events.times[events.cell == cell] / FRAME_PERIOD).astype(int)
+        # the kernel peaks two frames after its start
+        np.testing.assert_array_equal(frames, starts + 2)
+        np.testing.assert_array_equal(events.values[events.cell == cell], traces[cell, frames])
+
+
+def test_beginning_is_at_most_the_peak():
+    traces, onsets = planted_traces()
+    peaks = detect_events(traces, FRAME_PERIOD, event_time_ref="maximum")
+    beginnings = detect_events(traces, FRAME_PERIOD, event_time_ref="beginning")
+    np.testing.assert_array_equal(peaks.cell, beginnings.cell)
+    np.testing.assert_array_equal(peaks.values, beginnings.values)
+    starts = np.round(beginnings.times / FRAME_PERIOD).astype(int)
+    stops = np.round(peaks.times / FRAME_PERIOD).astype(int)
+    for cell, start, stop in zip(peaks.cell, starts, stops):
+        # the rise to each peak starts at the last frame not above its predecessor
+        assert start < stop
+        assert np.all(np.diff(traces[cell, start : stop + 1]) > 0)
+        assert traces[cell, start] <= traces[cell, start - 1]
+
+
+def test_no_events_in_noise():
+    rng = np.random.default_rng(1)
+    traces = rng.normal(size=(4, 2000)).astype(np.float32)
+    assert detect_events(traces, FRAME_PERIOD, threshold=8).n_events == 0
+
+
+def test_candidate_peaks_are_tau_apart():
+    traces, _ = planted_traces()
+    traces[0, 100:110] = 10  # plateau
+    mask = candidate_peaks(traces, 4)
+    assert mask[0, 100] and not mask[0, 101:110].any()
+    for row in mask:
+        assert np.all(np.diff(np.nonzero(row)[0]) > 4)
+
+
+def test_thresholds_match_single_runs():
+    traces, _ = planted_traces()
+    traces[2, 500:505] += 1.2  # a small transient, only above the lower thresholds
+    thresholds = [3, 5, 8]
+    per_threshold = detect_events_thresholds(traces, FRAME_PERIOD, thresholds)
+    events, highest = max_thresholds(*event_candidates(traces, FRAME_PERIOD), thresholds)
+    for threshold in thresholds:
+        single = detect_events(traces, FRAME_PERIOD, threshold=threshold)
+        for events_t in (per_threshold[threshold], events.select(highest >= threshold)):
+            np.testing.assert_array_equal(events_t.cell, single.cell)
+            np.testing.assert_array_equal(events_t.times, single.times)
+            np.testing.assert_array_equal(events_t.values, single.values)
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from onep_preprocessing.native.isxd import EventSet, read_eventset, read_header, write_eventset
+
+isx = pytest.importorskip("isx")
+
+# C0: (0 s, 1.5), (0.1 s, 2.5); C1: (0.05 s, 3.0); C2: no events
+EVENTS = EventSet(
+    cell=np.array([1, 0, 0]),
+    times=np.array([0.05, 0.1, 0.0]),
+    values=np.array([3.0, 2.5, 1.5], dtype=np.float32),
+    names=["C0", "C1", "C2"],
+)
+
+
+def write_isx_eventset(path, n_frames=5):
+    eventset = isx.EventSet.write(
+        str(path), isx.Timing(num_samples=n_frames, period=isx.Duration.from_msecs(50)), EVENTS.names
+    )
+    for i in range(len(EVENTS.names)):
+        mask = EVENTS.cell == i
+        order = np.argsort(EVENTS.times[mask])
+        offsets = np.round(EVENTS.times[mask][order] * 1e6).astype(np.uint64)
+        eventset.set_cell_data(i, offsets, EVENTS.values[mask][order])
+    eventset.flush()
+
+
+def test_read_eventset_reads_isx_output(tmp_path):
+    path = tmp_path / "events.isxd"
+    write_isx_eventset(path)
+
+    events = read_eventset(path)
+    assert events.names == EVENTS.names
+    np.testing.assert_array_equal(events.cell, [0, 0, 1])
+    np.testing.assert_allclose(events.times, [0.0, 0.1, 0.05])
+    np.testing.assert_array_equal(events.values, [1.5, 2.5, 3.0])
+    np.testing.assert_array_equal(events.counts(), [2, 1, 0])
+
+
+def test_write_eventset_matches_isx(tmp_path):
+    isx_path = tmp_path / "isx_events.isxd"
+    write_isx_eventset(isx_path)
+    path = tmp_path / "events.isxd"
+    write_eventset(path, EVENTS, n_frames=5, frame_period=0.05)
+
+    isx_header, isx_end = read_header(isx_path)
+    header, end = read_header(path)
+    assert path.read_bytes()[:end] == isx_path.read_bytes()[:isx_end]
+    for key in ("type", "channel list", "numSamples", "startOffsets", "signalTypes"):
+        assert header[key] == isx_header[key]
+    # rationals can be reduced differently, compare their values
+    assert [step["num"] / step["den"] for step in header["signalSteps"]] == pytest.approx(
+        [step["num"] / step["den"] for step in isx_header["signalSteps"]]
+    )
+    end_time, isx_end_time = (h["global times"][1]["secsSinceEpoch"] for h in (header, isx_header))
+    assert end_time["num"] / end_time["den"] == pytest.approx(isx_end_time["num"] / isx_end_time["den"])
+
+    eventset = isx.EventSet.read(str(path))
+    assert eventset.num_cells == 3
+    assert eventset.timing.num_samples == 5
+    for i, (offsets, values) in enumerate([([0, 100000], [1.5, 2.5]), ([50000], [3.0]), ([], [])]):
+        isx_offsets, isx_values = eventset.get_cell_data(i)
+        np.testing.assert_array_equal(isx_offsets, offsets)
+        np.testing.assert_array_equal(isx_values, values)
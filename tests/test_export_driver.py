@@ -0,0 +1,134 @@
+import time
+from types import SimpleNamespace
+import pytest
+from onep_preprocessing.exporting.driver import ExportDriver, Stage
+
+SESSIONS = ("ret", "ext")
+
+
+class Job:
+    # stands in for a stage: appends "stage target start end" to a log shared by the workers
+    def __init__(self, log_file, stage, seconds=0.0, fail_for=None):
+        self.log_file = log_file
+        self.stage = stage
+        self.seconds = seconds
+        self.fail_for = fail_for
+
+    def __call__(self, target, session=None):
+        if isinstance(target, list):
+            name = "+".join(m.mouse_name for m in target)
+        else:
+            name = target.mouse_name
+        start = time.time()
+        if name == self.fail_for:
+            raise RuntimeError(f"{self.stage} failed for {name}")
+        time.sleep(self.seconds)
+        end = time.time()
+        with open(self.log_file, "a") as f:
+            f.write(f"{self.stage} {name} {session} {start} {end}\n")
+        return self.stage, name, session
+
+
+def read_log(log_file):
+    jobs = {}
+    for line in log_file.read_text().splitlines():
+        stage, name, session, start, end = line.split()
+        jobs[(stage, name, session)] = (float(start), float(end))
+    return jobs
+
+
+def make_stages(log_file, fail_for=None):
+    return [
+        Stage("tidy", Job(log_file, "tidy"), "session"),
+        Stage("longreg", Job(log_file, "longreg", seconds=0.2, fail_for=fail_for), "mouse", ["tidy"]),
+        Stage("mouse_ids", Job(log_file, "mouse_ids"), "session", ["longreg"]),
+        Stage("master", Job(log_file, "master"), "dataset", ["mouse_ids"]),
+        Stage("report", Job(log_file, "report"), "session", ["master"]),
+    ]
+
+
+def mouse_dirs():
+    return [SimpleNamespace(mouse_name=name) for name in ("m1", "m2")]
+
+
+def test_dependencies_expand_by_scope(tmp_path):
+    driver = ExportDriver(make_stages(tmp_path / "log"), sessions=SESSIONS)
+    nodes = {node.name: node for node in driver.nodes(mouse_dirs(), pool=None)}
+    assert len(nodes) == 4 + 2 + 4 + 1 + 4
+    assert list(nodes["tidy/m1/ret"].depends_on) == []
+    # a mouse stage waits for every session of its own mouse
+    assert list(nodes["longreg/m2"].depends_on) == ["tidy/m2/ret", "tidy/m2/ext"]
+    # a session stage waits only for its own mouse on a mouse stage
+    assert list(nodes["mouse_ids/m1/ext"].depends_on) == ["longreg/m1"]
+    # a dataset stage waits for every mouse and session
+    assert sorted(nodes["master"].depends_on) == sorted(
+        f"mouse_ids/{m}/{s}" for m in ("m1", "m2") for s in SESSIONS
+    )
+    assert list(nodes["report/m2/ret"].depends_on) == ["master"]
+
+
+def test_unknown_dependency_is_rejected(tmp_path):
+    stages = [Stage("tidy", Job(tmp_path / "log", "tidy"), "session", ["missing"])]
+    with pytest.raises(ValueError, match="missing"):
+        ExportDriver(stages, sessions=SESSIONS).nodes(mouse_dirs(), pool=None)
+
+
+def test_stages_run_after_their_dependencies(tmp_path):
+    log_file = tmp_path / "log"
+    driver = ExportDriver(make_stages(log_file), sessions=SESSIONS, max_workers=2)
+    results = driver(SimpleNamespace(mouse_dirs=mouse_dirs()))
+
+    assert results["longreg/m1"] == ("longreg", "m1", None)
+    assert results["master"] == ("master", "m1+m2", None)
+    assert results["report/m2/ext"] == ("report", "m2", "ext")
+    jobs = read_log(log_file)
+    assert len(jobs) == len(results) == 15
+    for mouse in ("m1", "m2"):
+        longreg_start, longreg_end = jobs[("longreg", mouse, "None")]
+        assert all(jobs[("tidy", mouse, s)][1] <= longreg_start for s in SESSIONS)
+        assert all(jobs[("mouse_ids", mouse, s)][0] >= longreg_end for s in SESSIONS)
+    # the dataset stage starts only once every mouse has finished
+    master_start, master_end = jobs[("master", "m1+m2", "None")]
+    assert master_start >= max(end for (stage, _, _), (_, end) in jobs.items() if stage == "mouse_ids")
+    assert all(start >= master_end for (stage, _, _), (start, _) in jobs.items() if stage == "report")
+
+    timings = driver.timings
+    assert {name: t.n_jobs for name, t in timings.items()} == {
+        "tidy": 4,
+        "longreg": 2,
+        "mouse_ids": 4,
+        "master": 1,
+        "report": 4,
+    }
+    assert timings["longreg"].busy_seconds >= 0.4
+    assert timings["longreg"].wall_seconds >= 0.2
+    assert timings["master"].start >= timings["mouse_ids"].end
+    report = driver.report().splitlines()
+    assert [line.split()[0] for line in report[1:]] == ["tidy", "longreg", "mouse_ids", "master", "report"]
+
+
+def test_failure_skips_dependents(tmp_path):
+    log_file = tmp_path / "log"
+    driver = ExportDriver(
+        make_stages(log_file, fail_for="m1"), sessions=SESSIONS, max_workers=2, raise_on_error=False
+    )
+    with pytest.warns(UserWarning, match="longreg/m1 failed"):
+        results = driver(SimpleNamespace(mouse_dirs=mouse_dirs()))
+
+    assert isinstance(results["longreg/m1"], RuntimeError)
+    # the other mouse carries on, everything downstream of the failure is skipped
+    assert results["mouse_ids/m2/ret"] == ("mouse_ids", "m2", "ret")
+    assert not any(name.startswith(("mouse_ids/m1", "master", "report")) for name in results)
+    assert sorted(results) == sorted(
+        [f"tidy/{m}/{s}" for m in ("m1", "m2") for s in SESSIONS]
+        + ["longreg/m1", "longreg/m2", "mouse_ids/m2/ret", "mouse_ids/m2/ext"]
+    )
+    assert "longreg" not in {stage for stage, name, _ in read_log(log_file) if name == "m1"}
+
+
+def test_failure_is_raised_after_the_rest_finished(tmp_path):
+    log_file = tmp_path / "log"
+    driver = ExportDriver(make_stages(log_file, fail_for="m1"), sessions=SESSIONS, max_workers=2)
+    with pytest.warns(UserWarning), pytest.raises(RuntimeError, match="longreg failed for m1"):
+        driver(SimpleNamespace(mouse_dirs=mouse_dirs()))
+    assert ("mouse_ids", "m2", "ext") in read_log(log_file)
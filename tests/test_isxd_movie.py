@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from onep_preprocessing.native import isxd
+from onep_preprocessing.native.movie_io import open_movie, read_metadata
+
+isx = pytest.importorskip("isx")
+
+
+def write_isx_movie(path, frames, period_ms=50):
+    timing = isx.Timing(num_samples=len(frames), period=isx.Duration.from_msecs(period_ms))
+    spacing = isx.Spacing(num_pixels=frames.shape[1:])
+    movie = isx.Movie.write(str(path), timing, spacing, frames.dtype.type)
+    for i, frame in enumerate(frames):
+        movie.set_frame_data(i, frame)
+    movie.flush()
+
+
+@pytest.mark.parametrize("dtype", [np.uint16, np.float32])
+def test_reads_isx_movie(tmp_path, dtype):
+    rng = np.random.default_rng(0)
+    frames = (rng.random((7, 5, 9)) * 1000).astype(dtype)
+    path = tmp_path / "movie.isxd"
+    write_isx_movie(path, frames)
+
+    header, _ = isxd.read_header(path)
+    assert header["type"] == isxd.TYPE_MOVIE
+    np.testing.assert_array_equal(open_movie(path), frames)
+    metadata = read_metadata(path)
+    assert metadata.n_frames == 7
+    assert metadata.frame_shape == (5, 9)
+    assert metadata.frame_period == pytest.approx(0.05)
+
+
+def test_invalid_footer_raises(tmp_path):
+    path = tmp_path / "bad.isxd"
+    path.write_bytes(b"not an isxd file" + (10 ** 6).to_bytes(8, "little"))
+    with pytest.raises(ValueError):
+        isxd.read_header(path)
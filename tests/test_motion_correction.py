@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import ndimage
+from onep_preprocessing.native.dff import compute_f0, load_f0
+from onep_preprocessing.native.motion_correction import (
+    RigidRegistration,
+    valid_crop_rect,
+    write_translations,
+)
+from onep_preprocessing.native.movie_io import MovieWriter, open_movie
+from onep_preprocessing.processors.preprocessors import ISXMotionCorrector
+
+OFFSETS = [(0, 0), (2, -3), (-3, 1), (1, 4), (-2, -2), (3, 0)]
+
+
+def textured_image(shape, seed=0):
+    rng = np.random.default_rng(seed)
+    image = ndimage.gaussian_filter(rng.normal(size=shape), 2)
+    return (100 + 50 * image / image.std()).astype(np.float32)
+
+
+def write_shifted_movie(path, offsets=OFFSETS, shape=(48, 56), margin=8):
+    # every frame is a window of one larger image, moved by an integer (dy, dx)
+    image = textured_image((shape[0] + 2 * margin, shape[1] + 2 * margin))
+    frames = np.stack(
+        [
+            image[margin + dy : margin + dy + shape[0], margin + dx : margin + dx + shape[1]]
+            for dy, dx in offsets
+        ]
+    )
+    with MovieWriter(path, shape, dtype=np.float32, frame_period=0.05) as writer:
+        writer.write(frames)
+    return frames
+
+
+@pytest.mark.parametrize("f0_type", ["mean", "min"])
+def test_sidecar_f0_ignores_margins(tmp_path, f0_type):
+    in_vid, out_vid = tmp_path / "movie.npy", tmp_path / "motion_corrected.npy"
+    write_shifted_movie(in_vid)
+    ISXMotionCorrector(
+        low_bandpass_cutoff=0, high_bandpass_cutoff=0, backend="numpy", frames_per_chunk=4, f0_type=f0_type
+    )(in_vid, out_vid)
+
+    corrected = np.asarray(open_movie(out_vid))
+    margins = corrected == 0
+    assert margins.any() and not margins.all(axis=0).any()
+    expected = compute_f0(np.where(margins, np.nan, corrected), f0_type).f0
+    sidecar = load_f0(out_vid, f0_type)
+    assert sidecar is not None
+    np.testing.assert_allclose(sidecar.f0, expected, rtol=1e-5)
+    # the margins written as 0 would otherwise pull the F0 down
+    assert (compute_f0(corrected, f0_type).f0 < expected - 1).any()
+
+
+def subpixel_shifted(image, shifts):
+    # frame i shows the image moved by shifts[i] = (dy, dx), wrapping around the edges
+    spectrum = np.fft.fft2(image)
+    return np.stack(
+        [np.fft.ifft2(ndimage.fourier_shift(spectrum, shift)).real for shift in shifts]
+    ).astype(np.float32)
+
+
+def test_estimate_recovers_subpixel_shifts():
+    image = textured_image((64, 72))
+    shifts = np.array([[0, 0], [1.3, -2.7], [-0.45, 0.8], [3.6, 2.2], [-5.1, -0.3]])
+    frames = subpixel_shifted(image, shifts)
+    with RigidRegistration(
+        image, low_bandpass_cutoff=0, high_bandpass_cutoff=0, num_threads=2
+    ) as registration:
+        np.testing.assert_allclose(registration.estimate(frames), shifts, atol=0.1)
+    with RigidRegistration(image, low_bandpass_cutoff=0, high_bandpass_cutoff=0) as registration:
+        registered, estimated = registration.register(frames[1:2])
+    np.testing.assert_allclose(estimated, shifts[1:2], atol=0.1)
+    # away from the margins, the registered frame is the reference again, up to
+    # the 0.1 pixel precision of the shift (the image has a std of 50)
+    difference = registered[0, 8:-8, 8:-8] - image[8:-8, 8:-8]
+    assert np.abs(difference).mean() < 1 and np.abs(difference).max() < 5
+
+
+def test_max_translation_clamps_shifts():
+    image = textured_image((64, 72))
+    frames = subpixel_shifted(image, [(6.4, -7.2), (1.2, -0.6)])
+    with RigidRegistration(
+        image, max_translation=3, low_bandpass_cutoff=0, high_bandpass_cutoff=0
+    ) as registration:
+        shifts = registration.estimate(frames)
+    assert np.abs(shifts[0]).max() <= 3
+    np.testing.assert_allclose(shifts[1], [1.2, -0.6], atol=0.1)
+
+
+def test_write_translations(tmp_path):
+    shifts = np.array([[0.5, -1.25], [-2.0, 3.5], [0.0, 0.1]])
+    path = tmp_path / "translations.csv"
+    write_translations(path, shifts, frame_period=0.05)
+    table = pd.read_csv(path)
+    assert list(table.columns) == ["translationX", "translationY", "time"]
+    np.testing.assert_allclose(table["translationX"], -shifts[:, 1])
+    np.testing.assert_allclose(table["translationY"], -shifts[:, 0])
+    np.testing.assert_allclose(table["time"], [0, 0.05, 0.1])
+
+    write_translations(path, shifts)
+    np.testing.assert_allclose(pd.read_csv(path)["time"], [0, 1, 2])
+
+
+def test_valid_crop_rect():
+    shifts = np.array([[1.5, -2.2], [-0.5, 0.3], [0.0, 0.0]])
+    # the correction -shifts moves frames by up to 0.5 down, 1.5 up, 2.2 right and 0.3 left
+    assert valid_crop_rect(shifts, (20, 30)) == (3, 1, 26, 17)
+    assert valid_crop_rect(np.zeros((0, 2)), (20, 30)) == (0, 0, 30, 20)
+
+    # every pixel of the rect is valid in every registered frame
+    image = textured_image((20, 30))
+    frames = subpixel_shifted(image, shifts)
+    with RigidRegistration(image, low_bandpass_cutoff=0, high_bandpass_cutoff=0) as registration:
+        registered, estimated = registration.register(frames, fill_value=np.nan)
+    x, y, width, height = valid_crop_rect(estimated, (20, 30))
+    assert np.isfinite(registered[:, y : y + height, x : x + width]).all()
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+from onep_preprocessing.native.movie_io import MovieWriter, open_movie
+
+isx = pytest.importorskip("isx")
+
+
+@pytest.mark.parametrize("dtype", [np.uint16, np.float32, np.uint8])
+@pytest.mark.parametrize("preallocate", [False, True])
+def test_isx_reads_movie_writer_output(tmp_path, dtype, preallocate):
+    rng = np.random.default_rng(1)
+    frames = (rng.random((6, 4, 5)) * 200).astype(dtype)
+    path = tmp_path / "movie.isxd"
+    n_frames = len(frames) if preallocate else None
+    with MovieWriter(path, (4, 5), dtype=dtype, n_frames=n_frames, frame_period=0.05) as writer:
+        writer.write(frames[:4])
+        writer.write(frames[4:])
+
+    movie = isx.Movie.read(str(path))
+    assert movie.timing.num_samples == 6
+    assert movie.timing.period.secs_float == pytest.approx(0.05)
+    assert movie.spacing.num_pixels == (4, 5)
+    for i, frame in enumerate(frames):
+        np.testing.assert_array_equal(movie.get_frame_data(i), frame)
+    np.testing.assert_array_equal(open_movie(path), frames)
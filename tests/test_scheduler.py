@@ -0,0 +1,112 @@
+import json
+import os
+import textwrap
+import pytest
+from onep_preprocessing.processors.dispatcher import PreprocessorDispatcher
+from onep_preprocessing.processors.preprocessors import (
+    ISXDff,
+    ISXDownSampler,
+    ISXMotionCorrector,
+    ISXSpatialFilterer,
+)
+from onep_preprocessing.processors.scheduler import THREAD_ENV_VARS, BatchScheduler
+
+# stands in for isx in the workers: like a numerical library, it reads the thread
+# settings once when it is imported, and each stage writes them to its output
+FAKE_ISX = textwrap.dedent(
+    """
+    import json
+    import os
+    from types import SimpleNamespace
+
+    THREAD_ENV_VARS = {thread_env_vars!r}
+    LOADED_ENV = {{var: os.environ.get(var) for var in THREAD_ENV_VARS}}
+
+
+    def _stage(name, in_vid, out_vid, **kwargs):
+        with open(in_vid) as f:
+            stages = json.load(f).get("stages", [])
+        record = {{
+            "stages": stages + [name],
+            "env": LOADED_ENV,
+            "pid": os.getpid(),
+        }}
+        with open(out_vid, "w") as f:
+            json.dump(record, f)
+
+
+    def preprocess(in_vid, out_vid, **kwargs):
+        _stage("preprocess", in_vid, out_vid)
+
+
+    def spatial_filter(in_vid, out_vid, **kwargs):
+        _stage("spatial_filter", in_vid, out_vid)
+
+
+    def motion_correct(in_vid, out_vid, **kwargs):
+        _stage("motion_correct", in_vid, out_vid)
+
+
+    def dff(in_vid, out_vid, **kwargs):
+        _stage("dff", in_vid, out_vid)
+
+
+    class Movie:
+        @staticmethod
+        def read(path):
+            return SimpleNamespace(timing=SimpleNamespace(num_samples=1))
+    """
+)
+
+
+@pytest.fixture
+def fake_isx(tmp_path, monkeypatch):
+    module_dir = tmp_path / "fake_isx"
+    module_dir.mkdir()
+    (module_dir / "isx.py").write_text(FAKE_ISX.format(thread_env_vars=THREAD_ENV_VARS))
+    # spawned workers start from the sys.path of the parent, so they import the fake isx
+    monkeypatch.syspath_prepend(str(module_dir))
+    for var in THREAD_ENV_VARS:
+        monkeypatch.delenv(var, raising=False)
+
+
+def test_workers_start_with_thread_limits(tmp_path, fake_isx):
+    videos = []
+    for i in range(3):
+        video = tmp_path / f"video{i}.isxd"
+        video.write_text("{}")
+        videos.append(video)
+    dispatcher = PreprocessorDispatcher(
+        ISXDownSampler(), ISXSpatialFilterer(), ISXMotionCorrector(), ISXDff(), output_dir="out"
+    )
+    scheduler = BatchScheduler(dispatcher, max_workers=2, cpus_per_job=3)
+
+    results = scheduler(videos)
+
+    assert list(results) == videos
+    for video in videos:
+        with open(tmp_path / "out" / f"{video.stem}_dff.isxd") as f:
+            record = json.load(f)
+        assert record["stages"] == ["preprocess", "spatial_filter", "motion_correct", "dff"]
+        assert record["env"] == {var: "3" for var in THREAD_ENV_VARS}
+        assert record["pid"] != os.getpid()
+    # the parent environment is left as it was
+    assert not any(var in os.environ for var in THREAD_ENV_VARS)
+
+
+def test_failures_are_reported_per_video(tmp_path, fake_isx):
+    good = tmp_path / "good.isxd"
+    good.write_text("{}")
+    bad = tmp_path / "bad.isxd"
+    bad.write_text("not json")
+    dispatcher = PreprocessorDispatcher(
+        ISXDownSampler(), ISXSpatialFilterer(), ISXMotionCorrector(), None, output_dir="out"
+    )
+    scheduler = BatchScheduler(dispatcher, max_workers=2, raise_on_error=False)
+
+    with pytest.warns(UserWarning):
+        results = scheduler([good, bad])
+
+    assert isinstance(results[bad], Exception)
+    assert not isinstance(results[good], Exception)
+    assert (tmp_path / "out" / "good_motion_corrected.isxd").exists()
@@ -0,0 +1,40 @@
+from onep_preprocessing.path_parcers.raw_data_dirs.session_dir import ISXDir, SessionScanner
+
+
+def make_session(tmp_path, names):
+    for name in names:
+        (tmp_path / name).touch()
+    return tmp_path
+
+
+def test_native_outputs_are_classified(tmp_path):
+    session_dir = make_session(
+        tmp_path,
+        [
+            "rec.isxd",
+            "rec.gpio",
+            "rec_downsampled.npy",
+            "rec_spatial_filtered.raw",
+            "rec_spatial_filtered.raw.json",
+            "rec_motion_corrected.npy",
+            "rec_motion_corrected.npy.f0.npz",
+            "rec_dff.npy",
+            "rec_motion_corrected_cnmfe_cellset.isxd",
+        ],
+    )
+    isx_dir = ISXDir.from_session_dir(session_dir)
+    assert isx_dir.raw_movie == tmp_path / "rec.isxd"
+    assert isx_dir.downsampled == tmp_path / "rec_downsampled.npy"
+    assert isx_dir.spatial_filtered == tmp_path / "rec_spatial_filtered.raw"
+    assert isx_dir.motion_corrected == tmp_path / "rec_motion_corrected.npy"
+    assert isx_dir.dff == tmp_path / "rec_dff.npy"
+    assert isx_dir.cnmfe_cellset == tmp_path / "rec_motion_corrected_cnmfe_cellset.isxd"
+
+
+def test_isxd_outputs_win_over_native_ones(tmp_path):
+    session_dir = make_session(
+        tmp_path, ["rec_downsampled.npy", "rec_downsampled.isxd", "rec_downsampled.raw", "rec.isxd"]
+    )
+    found = SessionScanner().scan(session_dir)
+    assert found["downsampled"] == tmp_path / "rec_downsampled.isxd"
+    assert found["raw_movie"] == tmp_path / "rec.isxd"
@@ -0,0 +1,78 @@
+import sys
+import pandas as pd
+import pytest
+from onep_preprocessing.exporting.table_io import (
+    ID_DTYPE,
+    TIME_DTYPE,
+    VALUE_DTYPE,
+    TableWriter,
+    read_table,
+    write_table,
+)
+
+DF = pd.DataFrame({"time": [0.0, 0.05], "session_cell_id": [0, 1], "value": [1.5, 2.5]})
+DTYPES = {"time": TIME_DTYPE, "session_cell_id": ID_DTYPE, "value": VALUE_DTYPE}
+
+
+@pytest.fixture
+def no_pyarrow(monkeypatch):
+    # a None entry makes the import fail as if pyarrow were not installed
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+
+
+@pytest.mark.parametrize("name", ["table.parquet", "table.feather"])
+def test_columnar_formats_need_pyarrow(tmp_path, no_pyarrow, name):
+    with pytest.raises(ImportError, match="onep_preprocessing\\[tables\\]"):
+        write_table(DF, tmp_path / name)
+    with pytest.raises(ImportError, match="pyarrow is required"):
+        TableWriter(tmp_path / name)
+    with pytest.raises(ImportError, match="pyarrow is required"):
+        read_table(tmp_path / name)
+
+
+def test_csv_works_without_pyarrow(tmp_path, no_pyarrow):
+    write_table(DF, tmp_path / "table.csv")
+    with TableWriter(tmp_path / "blocks.csv") as writer:
+        writer.write(DF.iloc[:1])
+        writer.write(DF.iloc[1:])
+    pd.testing.assert_frame_equal(read_table(tmp_path / "table.csv"), DF)
+    pd.testing.assert_frame_equal(read_table(tmp_path / "blocks.csv"), DF)
+
+
+@pytest.fixture
+def pyarrow():
+    return pytest.importorskip("pyarrow")
+
+
+@pytest.mark.parametrize("name", ["table.parquet", "table.feather"])
+def test_columnar_round_trip(tmp_path, pyarrow, name):
+    write_table(DF, tmp_path / name, dtypes=DTYPES)
+    table = read_table(tmp_path / name)
+    assert table.dtypes.astype(str).to_dict() == {
+        "time": "float64",
+        "session_cell_id": "int32",
+        "value": "float32",
+    }
+    pd.testing.assert_frame_equal(table, DF.astype(DTYPES))
+    pd.testing.assert_frame_equal(
+        read_table(tmp_path / name, columns=["value"]), DF[["value"]].astype(DTYPES["value"])
+    )
+
+
+@pytest.mark.parametrize("name", ["blocks.parquet", "blocks.feather"])
+def test_columnar_blocks_round_trip(tmp_path, pyarrow, name):
+    with TableWriter(tmp_path / name, dtypes=DTYPES) as writer:
+        writer.write(DF.iloc[:1])
+        writer.write(DF.iloc[1:])
+    pd.testing.assert_frame_equal(read_table(tmp_path / name), DF.astype(DTYPES))
+
+
+def test_csv_ignores_dtypes(tmp_path):
+    write_table(DF, tmp_path / "table.csv", dtypes=DTYPES)
+    with TableWriter(tmp_path / "blocks.csv", dtypes=DTYPES) as writer:
+        writer.write(DF.iloc[:1])
+        writer.write(DF.iloc[1:])
+    DF.to_csv(tmp_path / "expected.csv", index=False)
+    expected = (tmp_path / "expected.csv").read_text()
+    assert (tmp_path / "table.csv").read_text() == expected
+    assert (tmp_path / "blocks.csv").read_text() == expected
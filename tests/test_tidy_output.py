@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+from onep_preprocessing.exporting.tidy_output import LongRegTidier, PropsTidier, TraceTidier
+
+
+@pytest.mark.parametrize(
+    "tidier",
+    [
+        TraceTidier(on_exists="skip"),
+        PropsTidier(on_exists="skip"),
+        LongRegTidier(["ret", "ext"], on_exists="skip"),
+    ],
+)
+def test_skip_leaves_existing_output(tmp_path, tidier):
+    output = tmp_path / "tidy.csv"
+    output.write_text("existing\n")
+    # the source is never read when the output is skipped
+    tidier(tmp_path / "missing.csv", output)
+    assert output.read_text() == "existing\n"
+
+
+def test_long_reg_tidier_overwrites(tmp_path):
+    source = tmp_path / "longreg.csv"
+    pd.DataFrame(
+        {"global_cell_index": [0, 0], "local_cell_index": [3, 1], "local_cellset_index": [0, 1]}
+    ).to_csv(source, index=False)
+    output = tmp_path / "tidy.csv"
+    output.write_text("existing\n")
+    LongRegTidier(["ret", "ext"])(source, output)
+    tidy = pd.read_csv(output)
+    assert tidy["session"].tolist() == ["ret", "ext"]
+    assert tidy["session_cell_id"].tolist() == [3, 1]
+
+
+def write_wide_traces(path, n_times=7, cell_names=("C00", "C01", "C03", "C10")):
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(n_times, len(cell_names)))
+    values[2, 1] = np.nan
+    time = np.arange(n_times) * 0.05 + 0.00049
+    lines = [" ," + ",".join(f" {name}" for name in cell_names)]
+    lines.append(" Time(s)/Cell Status," + ",".join(" accepted" for _ in cell_names))
+    lines += [",".join(repr(float(v)) for v in (t, *row)) for t, row in zip(time, values)]
+    path.write_text("\n".join(lines) + "\n")
+
+
+def melt_traces(trace_file):
+    # the pandas melt TraceTidier was written as before it was streamed
+    df = pd.read_csv(trace_file, skiprows=[1]).rename(columns={" ": "time"})
+    df = df.melt(id_vars="time", var_name="session_cell_id", value_name="value")
+    df["session_cell_id"] = df["session_cell_id"].apply(lambda x: int(x.split("C")[1]))
+    df["time"] = df["time"].round(3)
+    return df
+
+
+@pytest.mark.parametrize("chunksize", [1, 3, 100])
+def test_trace_tidier_matches_melt(tmp_path, chunksize):
+    source = tmp_path / "traces.csv"
+    write_wide_traces(source)
+    expected = melt_traces(source)
+    tidier = TraceTidier(chunksize=chunksize)
+
+    tidy = tidier.tidy(source)
+    pd.testing.assert_frame_equal(tidy, expected)
+    assert len(tidy) == 7 * 4
+
+    output = tmp_path / "tidy.csv"
+    tidier(source, output)
+    expected.to_csv(tmp_path / "expected.csv", index=False)
+    assert output.read_text() == (tmp_path / "expected.csv").read_text()
@@ -0,0 +1,120 @@
+import pandas as pd
+import pytest
+from onep_preprocessing.exporting.id_view import IDView
+from onep_preprocessing.exporting.update_ids import IDUpdaterDataset, IDUpdaterMouse
+
+# session cell 0 is a different mouse cell in each session
+LONGREG = pd.DataFrame(
+    {
+        "session": ["ret", "ret", "ext", "ext"],
+        "session_cell_id": [0, 1, 0, 1],
+        "mouse_cell_id": [10, 11, 12, 10],
+    }
+)
+
+
+@pytest.fixture
+def longreg_file(tmp_path):
+    path = tmp_path / "longreg.csv"
+    LONGREG.to_csv(path, index=False)
+    return path
+
+
+@pytest.mark.parametrize("session, expected", [("ret", [10, 11]), ("ext", [12, 10])])
+def test_update_traces_and_props_use_the_session(tmp_path, longreg_file, session, expected):
+    traces = pd.DataFrame({"time": [0.0, 0.0], "session_cell_id": [0, 1], "value": [1.0, 2.0]})
+    traces.to_csv(tmp_path / "traces.csv", index=False)
+    props = pd.DataFrame({"session_cell_id": [0, 1], "size": [5, 6]})
+    props.to_csv(tmp_path / "props.csv", index=False)
+
+    updater = IDUpdaterMouse()
+    updater.update_traces(longreg_file, tmp_path / "traces.csv", tmp_path / "out_traces.csv", session)
+    updater.update_props(longreg_file, tmp_path / "props.csv", tmp_path / "out_props.csv", session)
+
+    out_traces = pd.read_csv(tmp_path / "out_traces.csv")
+    out_props = pd.read_csv(tmp_path / "out_props.csv")
+    assert out_traces["mouse_cell_id"].tolist() == expected
+    assert out_traces["value"].tolist() == [1.0, 2.0]
+    assert out_props["mouse_cell_id"].tolist() == expected
+    assert out_props["size"].tolist() == [5, 6]
+
+
+def test_write_lookup_per_session(tmp_path, longreg_file):
+    lookup = IDUpdaterMouse().write_lookup(longreg_file, tmp_path / "lookup.csv", session="ext")
+    assert lookup.to_dict("list") == {"session_cell_id": [0, 1], "mouse_cell_id": [12, 10]}
+    assert pd.read_csv(tmp_path / "lookup.csv").equals(lookup)
+
+
+def test_session_is_required(tmp_path, longreg_file):
+    with pytest.raises(TypeError):
+        IDUpdaterMouse().update_traces(longreg_file, tmp_path / "traces.csv", tmp_path / "out.csv")
+
+
+# per mouse long-reg tables; session cell 2 of every session is left unregistered
+MICE = {
+    "m1": LONGREG,
+    "m2": pd.DataFrame(
+        {
+            "session": ["ret", "ret", "ext"],
+            "session_cell_id": [1, 0, 0],
+            "mouse_cell_id": [4, 3, 3],
+        }
+    ),
+}
+
+
+def write_session_tables(session_dir):
+    session_dir.mkdir(parents=True)
+    traces = pd.DataFrame(
+        {
+            "time": [0.0, 0.0, 0.0, 0.05, 0.05, 0.05],
+            "session_cell_id": [0, 1, 2, 0, 1, 2],
+            "value": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+        }
+    )
+    traces.to_csv(session_dir / "traces.csv", index=False)
+    props = pd.DataFrame(
+        {"session_cell_id": [0, 1, 2], "size": [5.0, 6.0, 7.0], "status": ["accepted"] * 3}
+    )
+    props.to_csv(session_dir / "props.csv", index=False)
+
+
+@pytest.mark.parametrize("table", ["traces", "props"])
+def test_id_view_matches_the_updater_chain(tmp_path, table):
+    for mouse, longreg in MICE.items():
+        (tmp_path / mouse).mkdir()
+        longreg.to_csv(tmp_path / mouse / "longreg.csv", index=False)
+        for session in ("ret", "ext"):
+            write_session_tables(tmp_path / mouse / session)
+
+    mouse_updater, dataset_updater = IDUpdaterMouse(), IDUpdaterDataset()
+    master_cellset = dataset_updater.create_master_cellset(
+        [tmp_path / mouse / "longreg.csv" for mouse in MICE]
+    )
+    view = IDView()
+    for mouse in MICE:
+        longreg_file = tmp_path / mouse / "longreg.csv"
+        for session in ("ret", "ext"):
+            session_dir = tmp_path / mouse / session
+            source = session_dir / f"{table}.csv"
+            # the file chain of scripts 06 and 07
+            getattr(mouse_updater, f"update_{table}")(
+                longreg_file, source, session_dir / "mouse.csv", session
+            )
+            getattr(dataset_updater, f"update_{table}")(
+                master_cellset, mouse, session_dir / "mouse.csv", session_dir / "dataset.csv"
+            )
+            # the lookup tables read by IDView
+            lookup_file = session_dir / "lookup.csv"
+            mouse_updater.write_lookup(longreg_file, lookup_file, session)
+            mouse_view = view.read(source, lookup_file, level="mouse")
+            pd.testing.assert_frame_equal(mouse_view, pd.read_csv(session_dir / "mouse.csv"))
+
+            dataset_updater.update_lookup(master_cellset, mouse, lookup_file)
+            dataset_view = view.read(source, lookup_file)
+            expected = pd.read_csv(session_dir / "dataset.csv")
+            pd.testing.assert_frame_equal(dataset_view, expected)
+            # the unregistered cells are dropped by both
+            n_cells = 1 if (mouse, session) == ("m2", "ext") else 2
+            assert len(expected) == n_cells * (1 if table == "props" else 2)
+            assert set(expected["cell_id"]) <= set(master_cellset["cell_id"])